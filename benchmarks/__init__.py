@@ -0,0 +1,3 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks of dbsqlcli, run with ``python -m benchmarks`` from the root of
+the repository."""
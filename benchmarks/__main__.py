@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""Run the benchmarks and print the results as JSON.
+
+    python -m benchmarks
+    python -m benchmarks --only completion --tables 100 10000
+    python -m benchmarks --latency-ms 20 --output results.json
+"""
+import sys
+import json
+import argparse
+import platform
+
+from dbsqlcli import __version__
+from benchmarks import suite
+from benchmarks.fake_connection import (
+    DEFAULT_COLUMNS,
+    DEFAULT_COLUMNS_PER_TABLE,
+    DEFAULT_ROWS,
+)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks", description=__doc__.splitlines()[0]
+    )
+    parser.add_argument(
+        "--only",
+        nargs="+",
+        choices=sorted(suite.BENCHMARKS),
+        help="Run only these benchmarks.",
+    )
+    parser.add_argument("--repeat", type=int, default=suite.DEFAULT_REPEAT)
+    parser.add_argument(
+        "--rows", type=int, default=DEFAULT_ROWS, help="Rows of every query result."
+    )
+    parser.add_argument(
+        "--columns",
+        type=int,
+        default=DEFAULT_COLUMNS,
+        help="Columns of every query result.",
+    )
+    parser.add_argument(
+        "--latency-ms",
+        type=float,
+        default=0.0,
+        help="Latency of every round trip to the fake server.",
+    )
+    parser.add_argument(
+        "--tables",
+        type=int,
+        nargs="+",
+        default=list(suite.DEFAULT_CATALOG_SIZES),
+        help="Number of tables of the synthetic catalogs.",
+    )
+    parser.add_argument(
+        "--columns-per-table", type=int, default=DEFAULT_COLUMNS_PER_TABLE
+    )
+    parser.add_argument("--output", help="Write the results to this file.")
+    args = parser.parse_args(argv)
+
+    options = {
+        "repeat": args.repeat,
+        "rows": args.rows,
+        "columns": args.columns,
+        "latency": args.latency_ms / 1000,
+        "catalog_sizes": args.tables,
+        "columns_per_table": args.columns_per_table,
+    }
+    results = {
+        "dbsqlcli_version": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "options": options,
+        "results": {},
+    }
+    for name in args.only or suite.BENCHMARKS:
+        print("Running %s..." % name, file=sys.stderr)
+        results["results"][name] = suite.BENCHMARKS[name](**options)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+"""A local stand-in for `databricks.sql.connect`.
+
+The fake connection returns generated results of a configurable size, and
+sleeps for a configurable latency on every round trip to the "server", so
+the client side of dbsqlcli can be measured without a warehouse.
+"""
+import time
+from contextlib import contextmanager
+from unittest.mock import patch
+
+from databricks.sql.exc import ServerOperationError
+
+DEFAULT_ROWS = 10000
+DEFAULT_COLUMNS = 5
+DEFAULT_TABLES = 200
+DEFAULT_COLUMNS_PER_TABLE = 20
+DEFAULT_FUNCTIONS = 50
+
+# (name, type name in cursor.description) of the generated columns, repeated
+# as often as needed.
+COLUMN_TYPES = (
+    ("id", "bigint"),
+    ("name", "string"),
+    ("amount", "double"),
+    ("created_at", "timestamp"),
+    ("active", "boolean"),
+)
+
+# Statements that do not return a result set.
+NO_RESULT_PREFIXES = ("use", "set", "create", "drop", "alter", "insert", "delete")
+
+
+def generate_table(rows, columns):
+    """Return an Arrow table of *rows* generated rows with *columns* columns."""
+    import datetime
+
+    import pyarrow as pa
+
+    epoch = datetime.datetime(2023, 1, 1)
+    generators = {
+        "bigint": lambda: pa.array(range(rows), pa.int64()),
+        "string": lambda: pa.array(["name_%d" % i for i in range(rows)]),
+        "double": lambda: pa.array([i * 1.25 for i in range(rows)]),
+        "timestamp": lambda: pa.array(
+            [epoch + datetime.timedelta(seconds=i) for i in range(rows)]
+        ),
+        "boolean": lambda: pa.array([i % 2 == 0 for i in range(rows)]),
+    }
+
+    arrays, names = [], []
+    for name, type_name in column_description(columns):
+        arrays.append(generators[type_name]())
+        names.append(name)
+    return pa.Table.from_arrays(arrays, names=names)
+
+
+def column_description(columns):
+    """The (name, type name) of each of *columns* generated columns."""
+    description = []
+    for i in range(columns):
+        name, type_name = COLUMN_TYPES[i % len(COLUMN_TYPES)]
+        if i >= len(COLUMN_TYPES):
+            name = "%s_%d" % (name, i // len(COLUMN_TYPES))
+        description.append((name, type_name))
+    return description
+
+
+class Catalog(object):
+    """The names of the tables, columns and functions of a synthetic schema."""
+
+    def __init__(
+        self,
+        tables=DEFAULT_TABLES,
+        columns_per_table=DEFAULT_COLUMNS_PER_TABLE,
+        functions=DEFAULT_FUNCTIONS,
+        schemas=("default",),
+    ):
+        self.schemas = list(schemas)
+        self.tables = ["table_%d" % i for i in range(tables)]
+        self.columns = [
+            (table, "column_%d" % j)
+            for table in self.tables
+            for j in range(columns_per_table)
+        ]
+        self.functions = ["function_%d" % i for i in range(functions)]
+
+
+class FakeCursor(object):
+    def __init__(self, connection):
+        self.connection = connection
+        self.description = None
+        self.rowcount = -1
+        self._table = None
+        self._rows = None
+        self._position = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _round_trip(self):
+        if self.connection.latency:
+            time.sleep(self.connection.latency)
+
+    def execute(self, operation, parameters=None):
+        self._round_trip()
+        self._table = self._rows = None
+        self._position = 0
+        statement = operation.strip().lower()
+
+        if "information_schema" in statement:
+            if not self.connection.information_schema:
+                raise ServerOperationError(
+                    "[TABLE_OR_VIEW_NOT_FOUND] The table or view "
+                    "`information_schema`.`columns` cannot be found."
+                )
+            catalog = self.connection.catalog
+            if "information_schema.columns" in statement:
+                rows = [
+                    ("column", table, column, i)
+                    for i, (table, column) in enumerate(catalog.columns)
+                ]
+            else:
+                rows = [("table", table, None, 0) for table in catalog.tables]
+            rows.extend(("function", name, None, 0) for name in catalog.functions)
+            self._set_rows(["kind", "name", "column_name", "ordinal_position"], rows)
+        elif statement.startswith(NO_RESULT_PREFIXES):
+            self.description = None
+        else:
+            self._table = self.connection.result_table()
+            self.description = [
+                (name, type_name, None, None, None, None, None)
+                for name, type_name in column_description(self.connection.columns)
+            ]
+        return self
+
+    def _set_rows(self, names, rows):
+        self._rows = rows
+        self.description = [
+            (name, "string", None, None, None, None, None) for name in names
+        ]
+
+    def tables(self, schema_name=None, **kwargs):
+        self._round_trip()
+        self._set_rows(
+            ["catalog", "schema", "table_name"],
+            [(None, schema_name, table) for table in self.connection.catalog.tables],
+        )
+        return self
+
+    def columns(self, schema_name=None, table_name=None, **kwargs):
+        self._round_trip()
+        self._set_rows(
+            ["catalog", "schema", "table_name", "column_name"],
+            [
+                (None, schema_name, table, column)
+                for table, column in self.connection.catalog.columns
+                if table_name is None or table == table_name
+            ],
+        )
+        return self
+
+    def schemas(self, **kwargs):
+        self._round_trip()
+        self._set_rows(
+            ["schema_name"], [(name,) for name in self.connection.catalog.schemas]
+        )
+        return self
+
+    def fetchmany_arrow(self, size):
+        self._round_trip()
+        batch = self._table.slice(self._position, size)
+        self._position += batch.num_rows
+        return batch
+
+    def fetchall_arrow(self):
+        return self.fetchmany_arrow(self._table.num_rows)
+
+    def fetchmany(self, size):
+        if self._rows is not None:
+            rows = self._rows[self._position : self._position + size]
+            self._position += len(rows)
+            return rows
+        batch = self.fetchmany_arrow(size)
+        return list(zip(*(column.to_pylist() for column in batch.columns)))
+
+    def fetchall(self):
+        if self._rows is not None:
+            return self.fetchmany(len(self._rows))
+        return self.fetchmany(self._table.num_rows)
+
+    def cancel(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeConnection(object):
+    """A connection whose queries return *rows* generated rows of *columns*
+    columns, and whose metadata comes from *catalog*.
+
+    Every round trip (executing a statement, fetching a batch or listing
+    metadata) sleeps for *latency* seconds.
+    """
+
+    def __init__(
+        self,
+        rows=DEFAULT_ROWS,
+        columns=DEFAULT_COLUMNS,
+        latency=0.0,
+        catalog=None,
+        information_schema=True,
+    ):
+        self.rows = rows
+        self.columns = columns
+        self.latency = latency
+        self.catalog = catalog or Catalog()
+        self.information_schema = information_schema
+        self._result_table = None
+
+    def result_table(self):
+        # Generated once, every query returns the same result.
+        if self._result_table is None:
+            self._result_table = generate_table(self.rows, self.columns)
+        return self._result_table
+
+    def cursor(self, *args, **kwargs):
+        return FakeCursor(self)
+
+    def close(self):
+        pass
+
+
+@contextmanager
+def patch_connect(**options):
+    """Make `databricks.sql.connect` return fake connections, created with
+    *options*, for the duration of a `with` block.
+
+    The table of generated results is shared by all the connections.
+    """
+    template = FakeConnection(**options)
+
+    def connect(**kwargs):
+        if template.latency:
+            time.sleep(template.latency)
+        connection = FakeConnection(**dict(options, catalog=template.catalog))
+        connection.result_table = template.result_table
+        return connection
+
+    with patch("databricks.sql.connect", side_effect=connect):
+        yield template
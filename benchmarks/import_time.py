@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""Measure how long it takes to import dbsqlcli in a fresh interpreter.
+
+Every sample runs in a new process, so nothing is cached in sys.modules. The
+time of starting an interpreter that imports nothing is measured as well and
+subtracted. Results are printed as JSON. With --max-ms the script exits with
+status 1 if the median import time is above that budget, which makes it
+usable as a regression check:
+
+    python benchmarks/import_time.py --max-ms 250
+"""
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+DEFAULT_MODULE = "dbsqlcli.main"
+DEFAULT_REPEAT = 10
+# Modules that non-interactive use (-e) must not import.
+DEFERRED_MODULES = (
+    "prompt_toolkit",
+    "pygments.lexers",
+    "dbsqlcli.completer",
+    "databricks.sql.auth.auth",
+)
+
+
+def run_python(code):
+    """Return the wall time in seconds of running *code* in a new
+    interpreter, and what it printed."""
+    start = time.perf_counter()
+    output = subprocess.check_output([sys.executable, "-c", code], text=True)
+    return time.perf_counter() - start, output
+
+
+def measure(module=DEFAULT_MODULE, repeat=DEFAULT_REPEAT):
+    """Return a dict with the median import time of *module* in milliseconds,
+    and the deferred modules that it imported anyway."""
+    baseline = statistics.median(run_python("pass")[0] for _ in range(repeat))
+
+    samples = []
+    code = "import sys, %s; print(' '.join(m for m in %r if m in sys.modules))" % (
+        module,
+        DEFERRED_MODULES,
+    )
+    for _ in range(repeat):
+        elapsed, output = run_python(code)
+        samples.append(elapsed - baseline)
+
+    return {
+        "benchmark": "import_time",
+        "module": module,
+        "repeat": repeat,
+        "interpreter_ms": round(baseline * 1000, 1),
+        "median_ms": round(statistics.median(samples) * 1000, 1),
+        "min_ms": round(min(samples) * 1000, 1),
+        "max_ms": round(max(samples) * 1000, 1),
+        "deferred_modules_imported": output.split(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default=DEFAULT_MODULE)
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument(
+        "--max-ms",
+        type=float,
+        help="Fail if the median import time is above this many milliseconds.",
+    )
+    args = parser.parse_args(argv)
+
+    result = measure(args.module, args.repeat)
+    print(json.dumps(result, indent=2))
+
+    if result["deferred_modules_imported"]:
+        return 1
+    if args.max_ms is not None and result["median_ms"] > args.max_ms:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
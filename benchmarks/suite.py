@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+"""The benchmarks of dbsqlcli, run against a fake connection.
+
+Every benchmark returns a dict of plain values, so the results can be
+written out as JSON. Times are in milliseconds.
+"""
+import os
+import sys
+import time
+import tempfile
+import threading
+import statistics
+import subprocess
+
+from benchmarks import import_time
+from benchmarks.fake_connection import (
+    DEFAULT_COLUMNS,
+    DEFAULT_COLUMNS_PER_TABLE,
+    DEFAULT_ROWS,
+    Catalog,
+    patch_connect,
+)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_REPEAT = 5
+DEFAULT_CATALOG_SIZES = (100, 1000, 5000)
+QUERY = "SELECT * FROM fake_table"
+
+# Statements that are typed one character at a time to measure completion.
+TYPED_QUERIES = (
+    "SELECT * FROM table_12 WHERE column_3 = 1 AND column_4",
+    "SELECT t.column_1, u.column_2 FROM table_7 t JOIN table_8 u ON t.column_1 = u.",
+    "INSERT INTO table_5 (column_1) SELECT column_1 FROM table_6",
+    "SELECT function_1(column_2) FROM table_3 GROUP BY column_2 ORDER BY column_2",
+)
+
+CLIRC = """[main]
+log_file = {directory}/dbsqlcli.log
+history_file = {directory}/history
+enable_pager = False
+destructive_warning = False
+"""
+
+COLD_START = """
+import sys
+from benchmarks.fake_connection import patch_connect
+
+with patch_connect(rows=1):
+    from dbsqlcli.main import cli
+
+    try:
+        cli(sys.argv[1:])
+    except SystemExit as e:
+        sys.exit(e.code)
+"""
+
+
+def summarize(samples):
+    """The median, min, max and 95th percentile of *samples*, which are in
+    seconds, in milliseconds."""
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    return {
+        "median_ms": round(statistics.median(samples) * 1000, 3),
+        "min_ms": round(samples[0] * 1000, 3),
+        "max_ms": round(samples[-1] * 1000, 3),
+        "p95_ms": round(p95 * 1000, 3),
+        "samples": len(samples),
+    }
+
+
+def timed(function, repeat):
+    """Call *function* *repeat* times and return how long each call took."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def write_clirc(directory):
+    """Write a clirc that keeps logs and history in *directory*."""
+    path = os.path.join(directory, "dbsqlclirc")
+    with open(path, "w") as f:
+        f.write(CLIRC.format(directory=directory))
+    return path
+
+
+def make_cli(directory):
+    """A `DBSQLCli` connected to whatever `databricks.sql.connect` returns."""
+    from dbsqlcli.main import DBSQLCli
+
+    return DBSQLCli(
+        write_clirc(directory), "localhost", "/sql/fake", "token", "default"
+    )
+
+
+def make_executor():
+    from dbsqlcli.sqlexecute import SQLExecute
+
+    return SQLExecute(
+        "localhost", "/sql/fake", "token", "default", keepalive_interval=0
+    )
+
+
+def cold_start(repeat=DEFAULT_REPEAT, **_):
+    """Time importing dbsqlcli, and running `dbsqlcli -e` end to end in a new
+    interpreter.
+
+    The connector's own modules are not imported, but pyarrow and pandas
+    are, as building results needs them as much as the connector does.
+    """
+    result = {"import": import_time.measure(repeat=repeat)}
+
+    with tempfile.TemporaryDirectory() as directory:
+        command = [
+            sys.executable,
+            "-c",
+            COLD_START,
+            "--clirc",
+            write_clirc(directory),
+            "--hostname",
+            "localhost",
+            "--http-path",
+            "/sql/fake",
+            "--access-token",
+            "token",
+            "-e",
+            "SELECT 1",
+        ]
+        samples = timed(
+            lambda: subprocess.run(
+                command, cwd=ROOT, check=True, stdout=subprocess.DEVNULL
+            ),
+            repeat,
+        )
+    result["execute"] = summarize(samples)
+    return result
+
+
+def sqlexecute_run(
+    repeat=DEFAULT_REPEAT, rows=DEFAULT_ROWS, columns=DEFAULT_COLUMNS, latency=0.0, **_
+):
+    """Time running a query with `SQLExecute.run` and consuming its rows."""
+    with patch_connect(rows=rows, columns=columns, latency=latency) as connection:
+        connection.result_table()
+        executor = make_executor()
+
+        def run():
+            for _, result, _, _ in executor.run(QUERY):
+                for _ in result:
+                    pass
+
+        result = summarize(timed(run, repeat))
+
+    result["rows"] = rows
+    result["columns"] = columns
+    result["rows_per_second"] = round(rows / (result["median_ms"] / 1000))
+    return result
+
+
+def format_output(
+    repeat=DEFAULT_REPEAT, rows=DEFAULT_ROWS, columns=DEFAULT_COLUMNS, **_
+):
+    """Time `DBSQLCli.format_output` of a streamed result, for each table
+    format."""
+    results = {}
+    with tempfile.TemporaryDirectory() as directory, patch_connect(
+        rows=rows, columns=columns
+    ) as connection:
+        connection.result_table()
+        cli = make_cli(directory)
+        cli.formatter.query = QUERY
+
+        for format_name in cli.formatter.supported_formats:
+            cli.formatter.format_name = format_name
+
+            def run():
+                for title, result, headers, _ in cli.sqlexecute.run(QUERY):
+                    for _ in cli.format_output(title, result, headers):
+                        pass
+
+            try:
+                result = summarize(timed(run, repeat))
+            except Exception as e:
+                # Not every format can output every type of value.
+                results[format_name] = {"error": str(e)}
+                continue
+            result["rows_per_second"] = round(rows / (result["median_ms"] / 1000))
+            results[format_name] = result
+
+    return {"rows": rows, "columns": columns, "formats": results}
+
+
+def _clear_completion_caches():
+    from dbsqlcli.packages import completion_engine, parseutils, sqlscanner
+
+    completion_engine.suggest_type.cache_clear()
+    parseutils._extract_tables.cache_clear()
+    sqlscanner.tokenize.cache_clear()
+
+
+def make_completer(catalog):
+    """A `DBSQLCompleter` populated with *catalog*, as a refresh would."""
+    from dbsqlcli.completer import DBSQLCompleter
+    from dbsqlcli.packages.special.main import COMMANDS
+
+    completer = DBSQLCompleter(smart_completion=True)
+    completer.extend_schemata("default")
+    completer.set_dbname("default")
+    completer.extend_database_names(catalog.schemas)
+    completer.extend_relations([(table,) for table in catalog.tables], kind="tables")
+    completer.extend_columns(catalog.columns, kind="tables")
+    completer.extend_functions([(function,) for function in catalog.functions])
+    completer.extend_special_commands(COMMANDS.keys())
+    return completer
+
+
+def completion(
+    catalog_sizes=DEFAULT_CATALOG_SIZES,
+    columns_per_table=DEFAULT_COLUMNS_PER_TABLE,
+    **_
+):
+    """Time completing statements as they are typed, one character at a
+    time, against catalogs of *catalog_sizes* tables."""
+    from prompt_toolkit.completion import CompleteEvent
+    from prompt_toolkit.document import Document
+
+    results = {}
+    for tables in catalog_sizes:
+        completer = make_completer(Catalog(tables, columns_per_table))
+        _clear_completion_caches()
+
+        samples = []
+        for query in TYPED_QUERIES:
+            for end in range(1, len(query) + 1):
+                document = Document(query[:end])
+                start = time.perf_counter()
+                completer.get_completions(document, CompleteEvent())
+                samples.append(time.perf_counter() - start)
+
+        results[str(tables)] = summarize(samples)
+
+    return {"columns_per_table": columns_per_table, "tables": results}
+
+
+def refresh(
+    repeat=DEFAULT_REPEAT,
+    catalog_sizes=DEFAULT_CATALOG_SIZES,
+    columns_per_table=DEFAULT_COLUMNS_PER_TABLE,
+    latency=0.0,
+    **_
+):
+    """Time a completion refresh of catalogs of *catalog_sizes* tables, with
+    and without information_schema."""
+    from dbsqlcli.completion_refresher import CompletionRefresher
+
+    results = {}
+    for information_schema in (True, False):
+        source = "information_schema" if information_schema else "metadata_calls"
+        results[source] = {}
+        for tables in catalog_sizes:
+            with patch_connect(
+                catalog=Catalog(tables, columns_per_table),
+                information_schema=information_schema,
+                latency=latency,
+            ):
+                executor = make_executor()
+
+                def run():
+                    done = threading.Event()
+                    CompletionRefresher().refresh(executor, lambda _: done.set())
+                    done.wait()
+
+                results[source][str(tables)] = summarize(timed(run, repeat))
+
+    return {"columns_per_table": columns_per_table, "tables": results}
+
+
+BENCHMARKS = {
+    "cold_start": cold_start,
+    "sqlexecute_run": sqlexecute_run,
+    "format_output": format_output,
+    "completion": completion,
+    "refresh": refresh,
+}
@@ -4,8 +4,6 @@ import pygments.styles
 from pygments.token import string_to_tokentype, Token
 from pygments.style import Style as PygmentsStyle
 from pygments.util import ClassNotFound
-from prompt_toolkit.styles.pygments import style_from_pygments_cls
-from prompt_toolkit.styles import merge_styles, Style
 
 logger = logging.getLogger(__name__)
 
@@ -55,6 +53,10 @@ def parse_pygments_style(token_name, style_object, style_dict):
 
 
 def style_factory(name, cli_style):
+    # Only the interactive prompt needs prompt_toolkit, output styling does not.
+    from prompt_toolkit.styles.pygments import style_from_pygments_cls
+    from prompt_toolkit.styles import merge_styles, Style
+
     try:
         style = pygments.styles.get_style_by_name(name)
     except ClassNotFound:
@@ -2,6 +2,8 @@ from prompt_toolkit.key_binding.vi_state import InputMode
 from prompt_toolkit.application import get_app
 from prompt_toolkit.enums import EditingMode
 
+from dbsqlcli.packages.format_utils import format_execution
+
 
 def create_toolbar_tokens_func(cli, show_fish_help):
     """Return a function that generates the toolbar tokens."""
@@ -31,6 +33,12 @@ def create_toolbar_tokens_func(cli, show_fish_help):
 
         if cli.completion_refresher.is_refreshing():
             result.append(("class:bottom-toolbar", "     Refreshing completions..."))
+
+        execution = cli.sqlexecute.execution
+        if execution is not None:
+            result.append(
+                ("class:bottom-toolbar", "     " + format_execution(execution))
+            )
         return result
 
     return get_toolbar_tokens
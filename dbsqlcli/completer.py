@@ -1,5 +1,7 @@
+import time
 import logging
-from re import compile, escape
+import threading
+from re import compile
 from collections import Counter
 from itertools import chain
 
@@ -22,12 +24,17 @@ from .packages.completion_engine import (
     FavoriteQuery,
 )
 from .packages.parseutils import last_word
+from .packages.completion_index import CompletionIndex
 from .packages.filepaths import parse_path, complete_path, suggest_path
 from .packages.literals.main import get_literals
 from .packages.special.favoritequeries import favoritequeries
 
 _logger = logging.getLogger(__name__)
 
+# Seconds before the columns of a table are requested again, after loading
+# them failed.
+COLUMNS_RETRY_AFTER = 10
+
 
 class DBSQLCompleter(Completer):
     keywords_tree = get_literals("keywords", type_=dict)
@@ -35,10 +42,24 @@ class DBSQLCompleter(Completer):
     functions = get_literals("functions")
 
     def __init__(
-        self, smart_completion=True, supported_formats=(), keyword_casing="auto"
+        self,
+        smart_completion=True,
+        supported_formats=(),
+        keyword_casing="auto",
+        column_loader=None,
+        on_columns_loaded=None,
     ):
+        """If a *column_loader* is given, the columns of a table are only
+        loaded once they are needed for completion, by calling
+        ``column_loader(schema, table)`` in a background thread.
+        *on_columns_loaded* is called once they have been added."""
         super(self.__class__, self).__init__()
         self.smart_completion = smart_completion
+        self.column_loader = column_loader
+        self.on_columns_loaded = on_columns_loaded
+        self._requested_columns = set()
+        # The time loading the columns of a requested table last failed.
+        self._failed_columns = {}
         self.reserved_words = set()
         for x in self.keywords:
             self.reserved_words.update(x.split())
@@ -78,10 +99,12 @@ class DBSQLCompleter(Completer):
 
     def extend_database_names(self, databases):
         self.databases.extend(databases)
+        self.invalidate_indexes()
 
     def extend_keywords(self, additional_keywords):
         self.keywords.extend(additional_keywords)
         self.all_completions.update(additional_keywords)
+        self.invalidate_indexes()
 
     def extend_schemata(self, schema):
         if schema is None:
@@ -93,6 +116,7 @@ class DBSQLCompleter(Completer):
         for metadata in self.dbmetadata.values():
             metadata[schema] = {}
         self.all_completions.update(schema)
+        self.invalidate_indexes()
 
     def extend_relations(self, data, kind):
         """Extend metadata for tables or views
@@ -123,6 +147,7 @@ class DBSQLCompleter(Completer):
                     self.dbname,
                 )
             self.all_completions.add(relname[0])
+        self.invalidate_indexes()
 
     def extend_columns(self, column_data, kind):
         """Extend column metadata
@@ -133,16 +158,17 @@ class DBSQLCompleter(Completer):
         # 'column_data' is a generator object. It can throw an exception while
         # being consumed. This could happen if the user has launched the app
         # without specifying a database name. This exception must be handled to
-        # prevent crashing.
+        # prevent crashing. Columns are merged as they arrive, so the columns
+        # consumed before an exception are kept.
+        metadata = self.dbmetadata[kind]
         try:
-            column_data = [self.escaped_names(d, '"') for d in column_data]
+            for d in column_data:
+                relname, column = self.escaped_names(d, '"')
+                metadata[self.dbname][relname].append(column)
+                self.all_completions.add(column)
         except Exception:
-            column_data = []
-
-        metadata = self.dbmetadata[kind]
-        for relname, column in column_data:
-            metadata[self.dbname][relname].append(column)
-            self.all_completions.add(column)
+            _logger.debug("Error while extending columns.", exc_info=True)
+        self.invalidate_indexes()
 
     def extend_functions(self, func_data):
         # 'func_data' is a generator object. It can throw an exception while
@@ -161,15 +187,50 @@ class DBSQLCompleter(Completer):
         for func in func_data:
             metadata[self.dbname][func[0]] = None
             self.all_completions.add(func[0])
+        self.invalidate_indexes()
 
     def set_dbname(self, dbname):
         self.dbname = dbname
 
+    def metadata_snapshot(self):
+        """Return the database metadata as a JSON serializable dict."""
+        return {
+            "databases": self.databases,
+            "dbname": self.dbname,
+            "dbmetadata": self.dbmetadata,
+        }
+
+    def load_metadata_snapshot(self, snapshot):
+        """Restore the database metadata from a `metadata_snapshot`."""
+        self.databases = list(snapshot["databases"])
+        self.dbname = snapshot["dbname"]
+        self.dbmetadata = snapshot["dbmetadata"]
+        for kind in ("tables", "views", "functions"):
+            for objects in self.dbmetadata.setdefault(kind, {}).values():
+                for name, columns in objects.items():
+                    self.all_completions.add(name)
+                    self.all_completions.update(columns or ())
+        self.invalidate_indexes()
+
     def reset_completions(self):
         self.databases = []
         self.dbname = ""
         self.dbmetadata = {"tables": {}, "views": {}, "functions": {}}
         self.all_completions = set(self.keywords + self.functions)
+        self.invalidate_indexes()
+
+    def invalidate_indexes(self):
+        """Drop the completion indexes, after the metadata has changed."""
+        self._indexes = {}
+
+    def completion_index(self, key, items):
+        """Return the `CompletionIndex` of the collection identified by
+        *key*, building it from *items()* the first time it is needed."""
+        indexes = self._indexes
+        index = indexes.get(key)
+        if index is None:
+            index = indexes[key] = CompletionIndex(items())
+        return index
 
     @staticmethod
     def find_matches(text, collection, start_only=False, fuzzy=True, casing=None):
@@ -180,27 +241,16 @@ class DBSQLCompleter(Completer):
         If `start_only` is True, the text will match an available
         completion only at the beginning. Otherwise, a completion is
         considered a match if the text appears anywhere within it.
+        The collection may be a prebuilt `CompletionIndex`.
         yields prompt_toolkit Completion instances for any matches found
         in the collection of available completions.
         """
         last = last_word(text, include="most_punctuations")
         text = last.lower()
 
-        completions = []
-
-        if fuzzy:
-            regex = ".*?".join(map(escape, text))
-            pat = compile("(%s)" % regex)
-            for item in sorted(collection):
-                r = pat.search(item.lower())
-                if r:
-                    completions.append((len(r.group()), r.start(), item))
-        else:
-            match_end_limit = len(text) if start_only else None
-            for item in sorted(collection):
-                match_point = item.lower().find(text, 0, match_end_limit)
-                if match_point >= 0:
-                    completions.append((len(text), match_point, item))
+        if not isinstance(collection, CompletionIndex):
+            collection = CompletionIndex(collection)
+        completions = collection.match(text, start_only=start_only, fuzzy=fuzzy)
 
         if casing == "auto":
             casing = "lower" if last and last[-1].islower() else "upper"
@@ -223,8 +273,11 @@ class DBSQLCompleter(Completer):
         # If smart_completion is off then match any word that starts with
         # 'word_before_cursor'.
         if not smart_completion:
+            completions = self.completion_index(
+                "all_completions", lambda: self.all_completions
+            )
             return self.find_matches(
-                word_before_cursor, self.all_completions, start_only=True, fuzzy=False
+                word_before_cursor, completions, start_only=True, fuzzy=False
             )
 
         completions = []
@@ -268,7 +321,7 @@ class DBSQLCompleter(Completer):
         if not suggestion.schema:
             predefined_funcs = self.find_matches(
                 word_before_cursor,
-                self.functions,
+                self.completion_index("functions", lambda: self.functions),
                 start_only=True,
                 fuzzy=False,
                 casing=self.keyword_casing,
@@ -379,35 +432,71 @@ class DBSQLCompleter(Completer):
             # We don't know if schema.relname is a table or view. Since
             # tables and views cannot share the same name, we can check one
             # at a time
-            try:
-                columns.extend(meta["tables"][schema][relname])
-
-                # Table exists, so don't bother checking for a view
-                continue
-            except KeyError:
+            for kind, name in (
+                ("tables", relname),
+                ("tables", escaped_relname),
+                ("views", relname),
+            ):
                 try:
-                    columns.extend(meta["tables"][schema][escaped_relname])
-                    # Table exists, so don't bother checking for a view
-                    continue
+                    table_columns = meta[kind][schema][name]
                 except KeyError:
-                    pass
-
-            try:
-                columns.extend(meta["views"][schema][relname])
-            except KeyError:
-                pass
+                    continue
+                if table_columns == ["*"]:
+                    self.request_columns(kind, schema, name)
+                columns.extend(table_columns)
+                # Relation exists, so don't bother checking for a view
+                break
 
         return columns
 
+    def request_columns(self, kind, schema, relname):
+        """Load the columns of a table or view in the background, if there is
+        a column loader and they have not been requested yet."""
+        key = (kind, schema, relname)
+        if self.column_loader is None or key in self._requested_columns:
+            return
+        failed_at = self._failed_columns.get(key)
+        if failed_at is not None and time.time() - failed_at < COLUMNS_RETRY_AFTER:
+            return
+        self._requested_columns.add(key)
+
+        thread = threading.Thread(
+            target=self._load_columns, args=key, name="column_loader"
+        )
+        thread.daemon = True
+        thread.start()
+
+    def _load_columns(self, kind, schema, relname):
+        try:
+            columns = self.column_loader(schema, relname.strip("`"))
+        except Exception:
+            _logger.debug("Error loading columns of %r.", relname, exc_info=True)
+            # Request them again later, rather than never.
+            self._failed_columns[(kind, schema, relname)] = time.time()
+            self._requested_columns.discard((kind, schema, relname))
+            return
+
+        columns = self.escaped_names(columns, '"')
+        # Replace the list rather than extending it, as it may be read by the
+        # completion thread at the same time.
+        self.dbmetadata[kind][schema][relname] = ["*"] + columns
+        self.all_completions.update(columns)
+        self.invalidate_indexes()
+
+        if self.on_columns_loaded:
+            self.on_columns_loaded()
+
     def populate_schema_objects(self, schema, obj_type):
-        """Returns list of tables or functions for a (optional) schema"""
+        """Returns the `CompletionIndex` of the tables or functions of an
+        (optional) schema"""
         metadata = self.dbmetadata[obj_type]
         schema = schema or self.dbname
 
-        try:
-            objects = metadata[schema].keys()
-        except KeyError:
-            # schema doesn't exist
-            objects = []
+        def objects():
+            try:
+                return metadata[schema].keys()
+            except KeyError:
+                # schema doesn't exist
+                return []
 
-        return objects
+        return self.completion_index((obj_type, schema), objects)
@@ -2,7 +2,6 @@ import threading
 from collections import OrderedDict
 
 from dbsqlcli.completer import DBSQLCompleter
-from dbsqlcli.sqlexecute import SQLExecute
 from dbsqlcli.packages.special.main import COMMANDS
 
 import logging
@@ -14,24 +13,31 @@ class CompletionRefresher(object):
 
     refreshers = OrderedDict()
 
-    def __init__(self):
+    def __init__(self, metadata_cache=None):
         self._completer_thread = None
         self._restart_refresh = threading.Event()
+        self.metadata_cache = metadata_cache
 
     def refresh(self, executor, callbacks, completer_options=None):
         """Creates a SQLCompleter object and populates it with the relevant
         completion suggestions in a background thread.
 
-        executor - SQLExecute object, used to extract the credentials to connect
-                   to the database.
+        executor - SQLExecute object, which lends a pooled connection to the
+                   background refresh.
         callbacks - A function or a list of functions to call after the thread
                     has completed the refresh. The newly created completion
                     object will be passed in as an argument to each callback.
         completer_options - dict of options to pass to SQLCompleter.
+
+        If there is cached metadata for the executor's schema, the callbacks
+        are called right away with a completer populated from the cache, and
+        the cache is revalidated in the background.
         """
         if completer_options is None:
             completer_options = {}
 
+        self._load_cached(executor, callbacks, completer_options)
+
         if self.is_refreshing():
             self._restart_refresh.set()
             return [(None, None, None, "Auto-completion refresh restarted.")]
@@ -47,45 +53,61 @@ class CompletionRefresher(object):
                 (None, None, None, "Auto-completion refresh started in the background.")
             ]
 
+    def _load_cached(self, executor, callbacks, completer_options):
+        if self.metadata_cache is None:
+            return
+
+        snapshot = self.metadata_cache.load(executor)
+        if snapshot is None:
+            return
+
+        LOGGER.debug("Loaded completions for %r from cache.", executor.database)
+        completer = DBSQLCompleter(**completer_options)
+        completer.load_metadata_snapshot(snapshot)
+        refresh_special(completer, executor)
+        for callback in _as_list(callbacks):
+            callback(completer)
+
     def is_refreshing(self):
         return self._completer_thread and self._completer_thread.is_alive()
 
     def _bg_refresh(self, sqlexecute, callbacks, completer_options):
         completer = DBSQLCompleter(**completer_options)
 
-        # Create a new pgexecute method to popoulate the completions.
-        e = sqlexecute
-        executor = SQLExecute(
-            hostname=e.hostname,
-            http_path=e.http_path,
-            access_token=e.access_token,
-            database=e.database,
-            auth_type=e.auth_type,
-        )
-
-        # If callbacks is a single function then push it into a list.
-        if callable(callbacks):
-            callbacks = [callbacks]
-
-        while 1:
-            for refresher in self.refreshers.values():
-                refresher(completer, executor)
-                if self._restart_refresh.is_set():
-                    self._restart_refresh.clear()
+        # Borrow a session from the executor's pool rather than logging in
+        # again, as the executor's own connection is busy with user queries.
+        with sqlexecute.borrowed() as executor:
+            while 1:
+                for refresher in self.refreshers.values():
+                    refresher(completer, executor)
+                    if self._restart_refresh.is_set():
+                        self._restart_refresh.clear()
+                        break
+                else:
+                    # Break out of while loop if the for loop finishes natually
+                    # without hitting the break statement.
                     break
-            else:
-                # Break out of while loop if the for loop finishes natually
-                # without hitting the break statement.
-                break
 
-            # Start over the refresh from the beginning if the for loop hit the
-            # break statement.
-            continue
+                # Start over the refresh from the beginning if the for loop hit
+                # the break statement.
+                continue
+
+            # Key the snapshot on the executor that was refreshed: the user may
+            # have changed database on `sqlexecute` in the meantime.
+            if self.metadata_cache is not None:
+                self.metadata_cache.save(executor, completer.metadata_snapshot())
 
-        for callback in callbacks:
+        for callback in _as_list(callbacks):
             callback(completer)
 
 
+def _as_list(callbacks):
+    # If callbacks is a single function then push it into a list.
+    if callable(callbacks):
+        return [callbacks]
+    return callbacks
+
+
 def refresher(name, refreshers=CompletionRefresher.refreshers):
     """Decorator to add the decorated function to the dictionary of
     refreshers. Any function decorated with a @refresher will be executed as
@@ -115,7 +137,21 @@ def refresh_tables(completer, executor):
     # extend_relations adds to the list of table names
     # extend_columns adds to the list of columns
 
+    # Prefer a single information_schema query where it is available. Columns
+    # that are loaded on demand are not read up front.
+    metadata = executor.schema_metadata(columns=completer.column_loader is None)
+    if metadata is not None:
+        tables, columns, functions = metadata
+        completer.extend_relations([(table,) for table in tables], kind="tables")
+        completer.extend_columns(columns, kind="tables")
+        completer.extend_functions([(function,) for function in functions])
+        return
+
     completer.extend_relations(executor.tables(), kind="tables")
+    if completer.column_loader is not None:
+        # Columns are loaded on demand.
+        return
+
     # This fetches the columns added in the previous line
 
     current_tables = completer.dbmetadata["tables"][executor.database].keys()
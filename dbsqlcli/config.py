@@ -81,10 +81,10 @@ def write_default_config(source, destination, overwrite=False):
     shutil.copyfile(source, destination)
 
 
-def mkdir_p(path):
+def mkdir_p(path, mode=0o777):
     "like `mkdir -p`"
     try:
-        os.makedirs(path)
+        os.makedirs(path, mode)
     except OSError as exc:
         if exc.errno == errno.EEXIST and os.path.isdir(path):
             pass
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+from databricks.sql.exc import RequestError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 4
+# Idle connections are checked before they are handed out once they have been
+# idle for this long. They can also be pinged in the background to keep them
+# from timing out, which is off by default, as it keeps a SQL warehouse from
+# stopping automatically.
+HEALTH_CHECK_AFTER = 60
+KEEPALIVE_INTERVAL = 0
+
+
+class ConnectionPool(object):
+    """A small pool of warm connections opened with the same credentials.
+
+    Connections are keyed by the schema they were opened with. They are not
+    thread safe, so a connection is only ever used by whoever borrowed it.
+    Connections that raise a `RequestError` while borrowed are recycled
+    instead of going back to the pool.
+    """
+
+    def __init__(
+        self,
+        open_connection,
+        size=DEFAULT_POOL_SIZE,
+        health_check_after=HEALTH_CHECK_AFTER,
+        keepalive_interval=KEEPALIVE_INTERVAL,
+    ):
+        """*open_connection* is called with a schema name to open a new
+        connection. At most *size* idle connections are kept."""
+        self._open_connection = open_connection
+        self.size = size
+        self.health_check_after = health_check_after
+        self.keepalive_interval = keepalive_interval
+        self._idle = []  # (connection, database, last_used) tuples
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._keepalive_thread = None
+
+    def acquire(self, database):
+        """Borrow a healthy connection to *database*, opening one if needed."""
+        while True:
+            with self._lock:
+                entry = next((e for e in self._idle if e[1] == database), None)
+                if entry is None:
+                    break
+                self._idle.remove(entry)
+
+            conn, _, last_used = entry
+            if time.time() - last_used < self.health_check_after or self._ping(conn):
+                return conn
+            self.discard(conn)
+
+        logger.debug("Opening a new connection to %r.", database)
+        return self._open_connection(database)
+
+    def release(self, conn, database):
+        """Return a borrowed connection to the pool."""
+        with self._lock:
+            if len(self._idle) < self.size and not self._closed.is_set():
+                self._idle.append((conn, database, time.time()))
+                self._start_keepalive()
+                return
+        self.discard(conn)
+
+    def discard(self, conn):
+        """Close a connection instead of returning it to the pool."""
+        try:
+            conn.close()
+        except Exception as e:
+            logger.debug("Error closing connection: %r", e)
+
+    @contextmanager
+    def connection(self, database):
+        """Borrow a connection for the duration of a `with` block."""
+        conn = self.acquire(database)
+        try:
+            yield conn
+        except RequestError:
+            self.discard(conn)
+            raise
+        except BaseException:
+            self.release(conn, database)
+            raise
+        else:
+            self.release(conn, database)
+
+    def close(self):
+        """Close all idle connections."""
+        self._closed.set()
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _, _ in idle:
+            self.discard(conn)
+
+    def _ping(self, conn):
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+                cur.fetchall()
+            return True
+        except Exception as e:
+            logger.debug("Idle connection failed its health check: %r", e)
+            return False
+
+    def _start_keepalive(self):
+        if self._keepalive_thread is None and self.keepalive_interval:
+            self._keepalive_thread = threading.Thread(
+                target=self._keepalive, name="connection_keepalive"
+            )
+            self._keepalive_thread.daemon = True
+            self._keepalive_thread.start()
+
+    def _keepalive(self):
+        """Ping idle connections, so the SQL gateway does not time them out."""
+        while not self._closed.wait(self.keepalive_interval):
+            cutoff = time.time() - self.keepalive_interval
+            with self._lock:
+                stale = [e for e in self._idle if e[2] <= cutoff]
+                for entry in stale:
+                    self._idle.remove(entry)
+
+            for conn, database, _ in stale:
+                if self._ping(conn):
+                    self.release(conn, database)
+                else:
+                    self.discard(conn)
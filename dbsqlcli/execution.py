@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+import time
+
+RUNNING = "running"
+CANCELLING = "cancelling"
+CANCELLED = "cancelled"
+FINISHED = "finished"
+FAILED = "failed"
+
+
+class QueryCancelled(KeyboardInterrupt):
+    """Raised when a statement has been cancelled with Ctrl-C."""
+
+
+class Execution(object):
+    """The state of a statement executing on the server."""
+
+    def __init__(self, statement):
+        self.statement = statement
+        self.state = RUNNING
+        self.started = time.time()
+        self.ended = None
+
+    @property
+    def elapsed(self):
+        return (self.ended or time.time()) - self.started
+
+    @property
+    def is_running(self):
+        return self.state in (RUNNING, CANCELLING)
+
+    def finish(self, state):
+        self.state = state
+        self.ended = time.time()
@@ -14,38 +14,39 @@ from random import choice
 from collections import namedtuple
 import shutil
 
-from prompt_toolkit.completion import DynamicCompleter
-from prompt_toolkit.shortcuts import PromptSession, CompleteStyle
-from prompt_toolkit.styles.pygments import style_from_pygments_cls
-from prompt_toolkit.layout.menus import CompletionsMenu
-from prompt_toolkit.history import FileHistory
-from prompt_toolkit.document import Document
-from prompt_toolkit.layout.processors import (
-    HighlightMatchingBracketProcessor,
-    ConditionalProcessor,
-)
-from prompt_toolkit.lexers import PygmentsLexer
-from prompt_toolkit.filters import HasFocus, IsDone
-from prompt_toolkit.enums import DEFAULT_BUFFER, EditingMode
-from prompt_toolkit.auto_suggest import AutoSuggestFromHistory
-from pygments.lexers.sql import SqlLexer
 from cli_helpers.tabular_output import TabularOutputFormatter
 from cli_helpers.tabular_output import preprocessors
 from databricks.sql import OperationalError
-from databricks.sql.auth.auth import AuthType
 
 import dbsqlcli.packages.special as special
 from dbsqlcli.sqlexecute import SQLExecute
-from dbsqlcli.completer import DBSQLCompleter
-from dbsqlcli.completion_refresher import CompletionRefresher
+from dbsqlcli.execution import QueryCancelled
+from dbsqlcli.results import ResultStream, arrow_to_rows
+from dbsqlcli.result_buffer import ResultBuffer
+from dbsqlcli.metadata_cache import MetadataCache
+from dbsqlcli.result_cache import ResultCache
 from dbsqlcli.packages.tabular_output import sql_format
-from dbsqlcli.clistyle import style_factory, style_factory_output
+from dbsqlcli.packages.tabular_output.windowed import format_windows, iter_windows
+from dbsqlcli.packages.tabular_output.columnar import TEXT_FORMATS, iter_text_windows
+from dbsqlcli.packages.exporters import (
+    EXPORT_FORMATS,
+    check_compression,
+    export_result,
+    format_from_filename,
+)
+from dbsqlcli.packages.outputfile import (
+    COMPRESSIONS,
+    compression_from_filename,
+)
+from dbsqlcli.clistyle import style_factory_output
+from dbsqlcli.packages.format_utils import (
+    format_execution,
+    format_status,
+    humanize_size,
+    statistics,
+)
 from dbsqlcli.packages.prompt_utils import confirm, confirm_destructive_query
-from dbsqlcli.key_bindings import cli_bindings
-from dbsqlcli.clitoolbar import create_toolbar_tokens_func
-from dbsqlcli.lexer import Lexer
-from dbsqlcli.clibuffer import cli_is_multiline
-from dbsqlcli.sqlexecute import SQLExecute
+from dbsqlcli.packages.pager import open_pager
 from dbsqlcli.config import read_config_files, write_default_config, mkdir_p
 
 
@@ -56,6 +57,8 @@ LOGGER = logging.getLogger(__name__)
 PACKAGE_ROOT = os.path.abspath(os.path.dirname(__file__))
 DBSQLCLIRC = "~/.dbsqlcli/dbsqlclirc"
 DEFAULT_CONFIG_FILE = os.path.join(PACKAGE_ROOT, "dbsqlclirc")
+# Seconds a statement executes before its progress is shown.
+PROGRESS_DELAY = 1.0
 
 
 def apply_credentials_from_cfg(hostname, http_path, access_token, auth_type, cfg):
@@ -77,6 +80,9 @@ def apply_credentials_from_cfg(hostname, http_path, access_token, auth_type, cfg
 class DBSQLCli(object):
     DEFAULT_PROMPT = "\\d@\\r> "
     MAX_LEN_PROMPT = 45
+    # Number of rows formatted at a time. Column widths are decided by the
+    # first window of a result.
+    RENDER_WINDOW = 1000
 
     def __init__(
         self, clirc, hostname, http_path, access_token, database, auth_type=None
@@ -93,6 +99,8 @@ class DBSQLCli(object):
             hostname, http_path, access_token, auth_type, _cfg
         )
 
+        self.fetch_size = _cfg["main"].as_int("fetch_size")
+
         try:
             self.connect(hostname, http_path, access_token, database, auth_type)
         except Exception as e:
@@ -110,7 +118,12 @@ For more details about the error, you can check the log file: %s""" % (
             LOGGER.exception("error: %r", e)
             sys.exit(1)
 
-        special.set_timing_enabled(_cfg["main"].as_bool("timing"))
+        if _cfg["main"]["timing"].lower() == "verbose":
+            special.set_timing_enabled(True)
+            special.set_timing_verbose(True)
+        else:
+            special.set_timing_enabled(_cfg["main"].as_bool("timing"))
+        special.set_fetch_size(self.fetch_size)
         self.multi_line = _cfg["main"].as_bool("multi_line")
         self.key_bindings = _cfg["main"]["key_bindings"]
         self.prompt = _cfg["main"]["prompt"] or self.DEFAULT_PROMPT
@@ -125,11 +138,26 @@ For more details about the error, you can check the log file: %s""" % (
         self.cli_style = _cfg["colors"]
         self.output_style = style_factory_output(self.syntax_style, self.cli_style)
 
-        self.completer = DBSQLCompleter()
+        self.lazy_columns = _cfg["main"].as_bool("lazy_columns")
+
+        # The results that \last can show again, if enabled.
+        self.result_buffer = None
+        result_buffer_count = _cfg["main"].as_int("result_buffer_count")
+        result_buffer_size = _cfg["main"].as_int("result_buffer_size")
+        if result_buffer_count > 0 and result_buffer_size > 0:
+            self.result_buffer = ResultBuffer(
+                result_buffer_count, result_buffer_size * 1024 * 1024
+            )
+
+        # The completer and the prompt are only set up by run_cli, so that
+        # non-interactive use does not pay for importing prompt_toolkit.
+        self.completer = None
         self._completer_lock = threading.Lock()
-        self.completion_refresher = CompletionRefresher()
+        self.completion_refresher = None
 
         self.prompt_app = None
+        # Width of the progress line of the executing statement, if shown.
+        self._progress_width = 0
 
         self.query_history = []
         # Register custom special commands.
@@ -182,6 +210,20 @@ For more details about the error, you can check the log file: %s""" % (
             aliases=("\\R",),
             case_sensitive=True,
         )
+        special.register_special_command(
+            self.manage_result_cache,
+            "\\cache",
+            "\\cache [flush]",
+            "Show the statistics of the result cache, or flush it.",
+            case_sensitive=True,
+        )
+        special.register_special_command(
+            self.show_last_result,
+            "\\last",
+            "\\last [n] [format]",
+            "Show the n-th last result again, without running its query.",
+            case_sensitive=True,
+        )
         special.register_special_command(
             self.change_table_format,
             "tableformat",
@@ -201,6 +243,90 @@ For more details about the error, you can check the log file: %s""" % (
                 msg += "\n\t{}".format(table_type)
             yield (None, None, None, msg)
 
+    def manage_result_cache(self, arg, **_):
+        """Show the statistics of the result cache, or flush it."""
+        cache = self.sqlexecute.result_cache
+        if cache is None:
+            message = (
+                "The result cache is disabled. Set result_cache_size to enable it."
+            )
+            return [(None, None, None, message)]
+
+        arg = arg.strip().lower()
+        if arg == "flush":
+            flushed = cache.flush()
+            return [(None, None, None, "Flushed %d cached results." % flushed)]
+        if arg:
+            return [(None, None, None, "Syntax: \\cache [flush].")]
+
+        stats = cache.stats()
+        headers = ["Entries", "Size", "Limit", "TTL", "Hits", "Misses"]
+        rows = [
+            (
+                stats["entries"],
+                humanize_size(stats["bytes"]),
+                humanize_size(cache.max_bytes),
+                "%ds" % cache.ttl,
+                stats["hits"],
+                stats["misses"],
+            )
+        ]
+        return [(None, rows, headers, None)]
+
+    def show_last_result(self, arg, **_):
+        """Yield the n-th last kept result, in the table format given, if
+        any."""
+        usage = "Syntax: \\last [n] [format]."
+        if self.result_buffer is None:
+            message = (
+                "Results are not kept. "
+                "Set result_buffer_count and result_buffer_size to keep them."
+            )
+            yield (None, None, None, message)
+            return
+
+        n, format_name = 1, None
+        for word in arg.split():
+            if word.isdigit():
+                n = int(word)
+            elif format_name is None:
+                format_name = word
+            else:
+                yield (None, None, None, usage)
+                return
+
+        result = self.result_buffer.get(n)
+        if result is None:
+            kept = len(self.result_buffer)
+            message = "There is no result #{} to show. {} result{} kept.".format(
+                n, kept, " is" if kept == 1 else "s are"
+            )
+            yield (None, None, None, message)
+            return
+
+        previous_format = self.formatter.format_name
+        if format_name is not None:
+            try:
+                self.formatter.format_name = format_name
+            except ValueError:
+                message = "Table format {} not recognized.".format(format_name)
+                yield (None, None, None, message)
+                return
+        title = "> {}".format(result.query)
+        rows = list(arrow_to_rows(result.table))
+        try:
+            yield (title, rows, result.headers, format_status(len(rows)))
+        finally:
+            self.formatter.format_name = previous_format
+
+    def keep_result(self, title, rows, headers):
+        """Keep the result *rows* that was just output, if it was retained."""
+        table = rows.retained()
+        if table is None:
+            return
+        query = self.sqlexecute.execution.statement
+        self.result_buffer.add(query, title, headers, table)
+
     def change_prompt_format(self, arg, **_):
         """
         Change the prompt format.
@@ -214,7 +340,24 @@ For more details about the error, you can check the log file: %s""" % (
 
     def connect(self, hostname, http_path, access_token, database, auth_type):
         self.sqlexecute = SQLExecute(
-            hostname, http_path, access_token, database, auth_type
+            hostname,
+            http_path,
+            access_token,
+            database,
+            auth_type,
+            fetch_size=self.fetch_size,
+            metadata_workers=self.config["main"].as_int("metadata_workers"),
+            keepalive_interval=self.config["main"].as_int("connection_keepalive"),
+            result_cache=self.result_cache(),
+        )
+
+    def result_cache(self):
+        """The result cache configured in the config file, or None."""
+        size = self.config["main"].as_int("result_cache_size")
+        if size <= 0:
+            return None
+        return ResultCache(
+            size * 1024 * 1024, ttl=self.config["main"].as_int("result_cache_ttl")
         )
 
     def handle_editor_command(self, text):
@@ -245,25 +388,60 @@ For more details about the error, you can check the log file: %s""" % (
             continue
         return text
 
-    def run_query(self, query, new_line=True):
-        """Runs *query*."""
+    def run_query(self, query, new_line=True, parallel=1):
+        """Runs *query*, running up to *parallel* of its statements at a
+        time."""
         if self.destructive_warning and confirm_destructive_query(query) is False:
             message = "Wise choice. Command execution stopped."
             click.echo(message)
             return
 
-        results = self.sqlexecute.run(query)
+        if parallel > 1:
+            results = self.sqlexecute.run_parallel(query, parallel)
+        else:
+            results = self.sqlexecute.run(query)
         for result in results:
             title, rows, headers, _ = result
+            timing = self.sqlexecute.statement_timing
             self.formatter.query = query
             output = self.format_output(title, rows, headers)
-            for line in output:
-                click.echo(line, nl=new_line)
+            if timing:
+                output = timing.iterate(output, "format")
+                with timing.phase("render"):
+                    for line in output:
+                        click.echo(line, nl=new_line)
+                timing.log()
+            else:
+                for line in output:
+                    click.echo(line, nl=new_line)
+
+    def export_query(self, query, filename, format_name, compression=None):
+        """Runs *query* and streams its result set to *filename*, compressed
+        with *compression* if it is given."""
+        exported = False
+        for title, rows, headers, status in self.sqlexecute.run(query):
+            if not isinstance(rows, ResultStream):
+                continue
+            if exported:
+                raise RuntimeError("Only a single result set can be exported.")
+            export_result(rows, filename, format_name, compression)
+            exported = True
 
     def run_cli(self):
+        from prompt_toolkit.history import FileHistory
+        from dbsqlcli.completer import DBSQLCompleter
+        from dbsqlcli.completion_refresher import CompletionRefresher
+
         self.iterations = 0
         self.configure_pager()
+
+        self.completer = DBSQLCompleter()
+        self.completion_refresher = CompletionRefresher(
+            MetadataCache(ttl=self.config["main"].as_int("metadata_cache_ttl"))
+        )
         self.refresh_completions()
+        if sys.stderr.isatty():
+            self.sqlexecute.on_progress = self.show_progress
 
         history_file = os.path.expanduser(self.config["main"]["history_file"])
         history = FileHistory(history_file)
@@ -311,7 +489,8 @@ For more details about the error, you can check the log file: %s""" % (
                 result_count = 0
 
                 for title, rows, headers, status in res:
-                    if rows and len(rows) > threshold:
+                    timing = self.sqlexecute.statement_timing
+                    if rows and result_size(rows, threshold) > threshold:
                         self.echo(
                             "The result set has more than {} rows.".format(threshold),
                             fg="red",
@@ -320,30 +499,52 @@ For more details about the error, you can check the log file: %s""" % (
                             self.echo("Aborted!", err=True, fg="red")
                             break
 
+                    keep = self.result_buffer is not None and isinstance(
+                        rows, ResultStream
+                    )
+                    if keep:
+                        rows.retain(self.result_buffer.max_bytes)
+
                     formatted = self.format_output(
                         title, rows, headers, special.is_expanded_output(), None
                     )
+                    if timing:
+                        formatted = timing.iterate(formatted, "format")
 
                     t = time() - start
                     try:
                         if result_count > 0:
                             self.echo("")
                         try:
-                            self.output(formatted, status)
+                            if timing:
+                                with timing.phase("render"):
+                                    self.output(formatted, status)
+                            else:
+                                self.output(formatted, status)
                         except KeyboardInterrupt:
                             pass
 
-                        if special.is_timing_enabled():
+                        if timing:
+                            timing.log()
+                            self.echo(statistics(timing))
+                        elif special.is_timing_enabled():
                             self.echo("Time: %0.03fs" % t)
                     except KeyboardInterrupt:
                         pass
 
+                    if keep:
+                        self.keep_result(title, rows, headers)
+
                     start = time()
                     result_count += 1
+                    if callable(status):
+                        status = status()
                     mutating = mutating or is_mutating(status)
                 special.unset_once_if_written()
             except EOFError as e:
                 raise e
+            except QueryCancelled as e:
+                self.echo(str(e), err=True, fg="red")
             except KeyboardInterrupt:
                 pass
             except NotImplementedError:
@@ -370,7 +571,31 @@ For more details about the error, you can check the log file: %s""" % (
                 one_iteration()
                 self.iterations += 1
         except EOFError:
-            special.close_tee()
+            pass
+        finally:
+            self.close_output_files()
+            self.sqlexecute.close_connection()
+
+    def close_output_files(self):
+        """Close the tee and once files, so that the output their writer
+        threads have not written yet is not lost."""
+        for close in (special.close_tee, special.close_once):
+            try:
+                close()
+            except OSError as e:
+                self.echo(str(e), err=True, fg="red")
+
+    def show_progress(self, execution):
+        """Show how long the statement of *execution* has been executing, on
+        a line of stderr that is cleared once it is done. The bottom toolbar
+        is not drawn while a statement executes."""
+        if execution.is_running and execution.elapsed >= PROGRESS_DELAY:
+            line = format_execution(execution)
+            click.echo("\r" + line.ljust(self._progress_width), nl=False, err=True)
+            self._progress_width = len(line)
+        elif self._progress_width:
+            click.echo("\r%s\r" % (" " * self._progress_width), nl=False, err=True)
+            self._progress_width = 0
 
     def get_output_margin(self, status=None):
         """Get the output margin (number of rows for the prompt, footer and
@@ -380,18 +605,24 @@ For more details about the error, you can check the log file: %s""" % (
         )
         if special.is_timing_enabled():
             margin += 1
-        if status:
+        if callable(status):
+            # Streamed results report a single "N rows in set" line.
+            margin += 2
+        elif status:
             margin += 1 + status.count("\n")
 
         return margin
 
     def output(self, output, status=None):
         """Output text to stdout or a pager command.
-        The status text is not outputted to pager or files.
+        The status text is not outputted to pager or files. It may be a
+        callable, which is evaluated once all output has been written.
         The message will be logged in the audit log, if enabled. The
         message will be written to the tee file, if enabled. The
-        message will be written to the output file, if enabled.
+        message will be written to the output file, if enabled, and the
+        status says how much was written to them.
         """
+        truncated = False
         if output:
             size = self.prompt_app.output.get_size()
 
@@ -399,39 +630,66 @@ For more details about the error, you can check the log file: %s""" % (
 
             fits = True
             buf = []
+            pager = None
             output_via_pager = self.explicit_pager and special.is_pager_enabled()
-            for i, line in enumerate(output, 1):
-                special.write_tee(line)
-                special.write_once(line)
-
-                if fits or output_via_pager:
-                    # buffering
-                    buf.append(line)
-                    if len(line) > size.columns or i > (size.rows - margin):
-                        fits = False
-                        if not self.explicit_pager and special.is_pager_enabled():
-                            # doesn't fit, use pager
-                            output_via_pager = True
-
-                        if not output_via_pager:
-                            # doesn't fit, flush buffer
-                            for line in buf:
-                                click.secho(line)
+            try:
+                for i, line in enumerate(output, 1):
+                    special.write_tee(line)
+                    special.write_once(line)
+
+                    if pager:
+                        if not pager.write(line) and not special.is_output_to_file():
+                            # The pager was quit, stop producing output.
+                            truncated = True
+                            break
+                    elif fits or output_via_pager:
+                        # buffering
+                        buf.append(line)
+                        if len(line) > size.columns or i > (size.rows - margin):
+                            fits = False
+                            if not self.explicit_pager and special.is_pager_enabled():
+                                # doesn't fit, use pager
+                                output_via_pager = True
+
+                            if output_via_pager:
+                                # stream the rest of the output into the pager,
+                                # or to stdout if there is no terminal to page
+                                pager = open_pager()
+                                output_via_pager = pager is not None
+                            self._write_lines(buf, pager)
                             buf = []
-                else:
-                    click.secho(line)
-
-            if buf:
-                if output_via_pager:
-                    # sadly click.echo_via_pager doesn't accept generators
-                    click.echo_via_pager("\n".join(buf))
-                else:
-                    for line in buf:
+                    else:
                         click.secho(line)
 
+                if buf:
+                    if output_via_pager:
+                        pager = open_pager()
+                    self._write_lines(buf, pager)
+            finally:
+                if pager:
+                    pager.close()
+
+        written = special.flush_output_files()
+        if callable(status):
+            status = status()
+        if truncated and status:
+            status = "Output stopped when the pager was quit: {} so far".format(status)
+        if written and output:
+            status = "{}, {}".format(status, written) if status else written
         if status:
             click.secho(status)
 
+    def _write_lines(self, lines, pager=None):
+        """Write *lines* to *pager*, or to stdout if there is no pager."""
+        if pager:
+            for line in lines:
+                pager.write(line)
+            # Show the first screen right away.
+            pager.flush()
+        else:
+            for line in lines:
+                click.secho(line)
+
     def configure_pager(self):
         self.explicit_pager = False
 
@@ -453,44 +711,44 @@ For more details about the error, you can check the log file: %s""" % (
             output = itertools.chain(output, [title])
 
         if cur:
+            format_name = "vertical" if expanded else self.formatter.format_name
             column_types = None
+            windows = iter([cur])
             if hasattr(cur, "description"):
                 column_types = [str for col in cur.description]
-
-            if max_width is not None:
-                cur = list(cur)
-
-            formatted = self.formatter.format_output(
-                cur,
+                if format_name in TEXT_FORMATS:
+                    # The values are converted to text column by column. The
+                    # decimals are not aligned, as align_decimals only aligns
+                    # float columns.
+                    windows = iter_text_windows(cur, self.RENDER_WINDOW)
+                    output_kwargs["preprocessors"] = ()
+                else:
+                    windows = iter_windows(cur, self.RENDER_WINDOW)
+
+            # Column widths are decided by the first window of rows, which is
+            # also all that is needed to decide on the vertical format.
+            first_window = next(windows)
+            formatted = format_windows(
+                self.formatter,
+                itertools.chain([first_window], windows),
                 headers,
-                format_name="vertical" if expanded else None,
+                format_name,
                 column_types=column_types,
                 **output_kwargs
             )
 
-            if isinstance(formatted, str):
-                formatted = formatted.splitlines()
-            formatted = iter(formatted)
-
             first_line = next(formatted)
             formatted = itertools.chain([first_line], formatted)
 
-            if (
-                not expanded
-                and max_width
-                and headers
-                and cur
-                and len(first_line) > max_width
-            ):
-                formatted = self.formatter.format_output(
-                    cur,
+            if not expanded and max_width and headers and len(first_line) > max_width:
+                formatted = format_windows(
+                    self.formatter,
+                    itertools.chain([first_window], windows),
                     headers,
-                    format_name="vertical",
+                    "vertical",
                     column_types=column_types,
                     **output_kwargs
                 )
-                if isinstance(formatted, str):
-                    formatted = iter(formatted.splitlines())
 
             output = itertools.chain(output, formatted)
 
@@ -512,6 +770,9 @@ For more details about the error, you can check the log file: %s""" % (
             "supported_formats": self.formatter.supported_formats,
             "keyword_casing": self.completer.keyword_casing,
         }
+        if self.lazy_columns:
+            completer_options["column_loader"] = self.load_table_columns
+            completer_options["on_columns_loaded"] = self._on_columns_loaded
         self.completion_refresher.refresh(
             self.sqlexecute, self._on_completions_refreshed, completer_options
         )
@@ -526,7 +787,46 @@ For more details about the error, you can check the log file: %s""" % (
             # "Refreshing completions..." indicator
             self.prompt_app.app.invalidate()
 
+    def load_table_columns(self, schema, table):
+        """Fetch the column names of a table for the completer.
+
+        This runs in the completer's background threads, so it borrows a
+        pooled connection rather than the one running the user's queries.
+        """
+        with self.sqlexecute.borrowed() as executor:
+            return executor.columns(table, schema=schema)
+
+    def _on_columns_loaded(self):
+        """Update the completion menu with the columns that just arrived."""
+        if not self.prompt_app:
+            return
+
+        app = self.prompt_app.app
+        if app.is_running and app.loop is not None:
+            app.loop.call_soon_threadsafe(self._restart_completion)
+
+    def _restart_completion(self):
+        buffer = self.prompt_app.app.current_buffer
+        if buffer.complete_state is not None or buffer.text:
+            buffer.start_completion(select_first=False)
+
     def _build_prompt_app(self, history):
+        from prompt_toolkit.completion import DynamicCompleter
+        from prompt_toolkit.shortcuts import PromptSession, CompleteStyle
+        from prompt_toolkit.layout.processors import (
+            HighlightMatchingBracketProcessor,
+            ConditionalProcessor,
+        )
+        from prompt_toolkit.lexers import PygmentsLexer
+        from prompt_toolkit.filters import HasFocus, IsDone
+        from prompt_toolkit.enums import DEFAULT_BUFFER, EditingMode
+        from prompt_toolkit.auto_suggest import AutoSuggestFromHistory
+        from dbsqlcli.clistyle import style_factory
+        from dbsqlcli.key_bindings import cli_bindings
+        from dbsqlcli.clitoolbar import create_toolbar_tokens_func
+        from dbsqlcli.lexer import Lexer
+        from dbsqlcli.clibuffer import cli_is_multiline
+
         key_bindings = cli_bindings(self)
 
         def get_message():
@@ -605,6 +905,14 @@ For more details about the error, you can check the log file: %s""" % (
         return self.query_history[-1][0] if self.query_history else None
 
 
+def result_size(rows, limit):
+    """Return the number of rows in *rows*, counting at most up to *limit* + 1
+    rows of a streamed result."""
+    if isinstance(rows, ResultStream):
+        return rows.prefetch(limit + 1)
+    return len(rows)
+
+
 def need_completion_refresh(queries):
     """Determines if the completion needs a refresh by checking if the sql
     statement is an alter, create, drop or change db."""
@@ -674,12 +982,47 @@ def is_mutating(status):
 @click.option(
     "--table-format", type=str, default="csv", help="Table format used with -e option."
 )
+@click.option(
+    "--export",
+    type=click.Path(dir_okay=False),
+    help="Write the results of the -e option to a parquet, arrow or csv file.",
+)
+@click.option(
+    "--export-format",
+    type=click.Choice(EXPORT_FORMATS),
+    help="Format used with --export. Guessed from the file extension by default.",
+)
+@click.option(
+    "--compression",
+    type=click.Choice(COMPRESSIONS),
+    help="Compress the csv file of --export. Guessed from the file extension "
+    "(.gz, .zst) by default.",
+)
+@click.option(
+    "--parallel",
+    type=click.IntRange(min=1),
+    default=1,
+    help="Run up to this many statements of the -e option at the same time. "
+    "USE, SET, DDL statements and statements after a '-- barrier' comment "
+    "line wait for the statements before them.",
+)
 @click.option(
     "--oauth", is_flag=True, help="Use oauth for authentication", default=False
 )
 @click.argument("database", default="default", nargs=1)
 def cli(
-    execute, hostname, http_path, access_token, clirc, table_format, oauth, database
+    execute,
+    hostname,
+    http_path,
+    access_token,
+    clirc,
+    table_format,
+    export,
+    export_format,
+    compression,
+    parallel,
+    oauth,
+    database,
 ):
     """A DBSQL terminal querying client with auto-completion and syntax highlighting.
 
@@ -704,8 +1047,31 @@ def cli(
         write_default_config(DEFAULT_CONFIG_FILE, clirc)
         sys.exit(1)
 
+    if export:
+        if not execute:
+            raise click.UsageError("--export can only be used with -e.")
+        export_format = export_format or format_from_filename(export)
+        if not export_format:
+            raise click.UsageError(
+                "Cannot guess the export format of {}, use --export-format.".format(
+                    export
+                )
+            )
+        compression = compression or compression_from_filename(export)
+        try:
+            check_compression(export_format, compression)
+        except ValueError as e:
+            raise click.UsageError(str(e))
+    elif compression:
+        raise click.UsageError("--compression can only be used with --export.")
+
+    if parallel > 1 and (not execute or export):
+        raise click.UsageError("--parallel can only be used with -e, without --export.")
+
     optional_params = {}
     if oauth:
+        from databricks.sql.auth.auth import AuthType
+
         optional_params["auth_type"] = AuthType.DATABRICKS_OAUTH.value
 
     dbsqlcli = DBSQLCli(
@@ -737,12 +1103,20 @@ def cli(
         else:
             query = execute
         try:
-            dbsqlcli.formatter.format_name = table_format
-            dbsqlcli.run_query(query)
+            if export:
+                dbsqlcli.export_query(query, export, export_format, compression)
+            else:
+                dbsqlcli.formatter.format_name = table_format
+                dbsqlcli.run_query(query, parallel=parallel)
             exit(0)
+        except QueryCancelled as e:
+            click.secho(str(e), err=True, fg="red")
+            exit(1)
         except Exception as e:
             click.secho(str(e), err=True, fg="red")
             exit(1)
+        finally:
+            dbsqlcli.sqlexecute.close_connection()
 
     dbsqlcli.run_cli()
 
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import time
+import hashlib
+import logging
+
+from dbsqlcli.config import mkdir_p
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = "~/.dbsqlcli/metadata_cache"
+DEFAULT_TTL = 24 * 60 * 60
+
+
+class MetadataCache(object):
+    """Completion metadata persisted on disk, one file per host, http path
+    and schema.
+
+    Entries older than `ttl` seconds are ignored. A `ttl` of 0 disables the
+    cache.
+    """
+
+    VERSION = 1
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, ttl=DEFAULT_TTL):
+        self.directory = os.path.expanduser(directory)
+        self.ttl = ttl
+
+    def path(self, executor):
+        key = "|".join(
+            (executor.hostname or "", executor.http_path or "", executor.database)
+        )
+        name = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, name + ".json")
+
+    def load(self, executor):
+        """Return the cached metadata snapshot for *executor*, or None if there
+        is no usable entry."""
+        if not self.ttl:
+            return None
+
+        try:
+            with open(self.path(executor), encoding="utf-8") as f:
+                entry = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+        if entry.get("version") != self.VERSION:
+            return None
+        if time.time() - entry.get("timestamp", 0) > self.ttl:
+            _logger.debug("Metadata cache for %r expired.", executor.database)
+            return None
+        return entry["metadata"]
+
+    def save(self, executor, snapshot):
+        """Persist the metadata *snapshot* for *executor*."""
+        if not self.ttl:
+            return
+
+        entry = {
+            "version": self.VERSION,
+            "timestamp": time.time(),
+            "metadata": snapshot,
+        }
+        path = self.path(executor)
+        tmp_path = "{}.{}.tmp".format(path, os.getpid())
+        try:
+            mkdir_p(self.directory)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            # Replace atomically, so readers never see a partial file.
+            os.replace(tmp_path, path)
+        except (IOError, OSError) as e:
+            _logger.warning("Cannot write metadata cache %r: %r", path, e)
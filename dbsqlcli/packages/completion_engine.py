@@ -1,11 +1,19 @@
 import os
 import sys
-import sqlparse
 import logging
 from collections import namedtuple
-from sqlparse.sql import Comparison, Identifier, Where
-
-from dbsqlcli.packages.parseutils import last_word, extract_tables, find_prev_keyword
+from functools import lru_cache
+from dbsqlcli.packages.parseutils import (
+    last_word,
+    extract_tables,
+    find_prev_keyword,
+    parent_name,
+)
+from dbsqlcli.packages.sqlscanner import (
+    group_parentheses,
+    split_statements,
+    tokenize,
+)
 from dbsqlcli.packages.special import parse_special_command
 
 _logger = logging.getLogger(__name__)
@@ -32,79 +40,95 @@ TableFormat = namedtuple("TableFormat", [])
 FileName = namedtuple("FileName", [])
 FavoriteQuery = namedtuple("FavoriteQuery", [])
 
-
+# Keywords that end a WHERE clause.
+WHERE_END_KEYWORDS = (
+    "ORDER BY",
+    "GROUP BY",
+    "LIMIT",
+    "UNION",
+    "UNION ALL",
+    "EXCEPT",
+    "HAVING",
+    "RETURNING",
+    "INTO",
+)
+
+
+@lru_cache(maxsize=128)
 def suggest_type(full_text, text_before_cursor):
     """Takes the full_text that is typed so far and also the text before the
     cursor to suggest completion type and scope.
     Returns a tuple with a type of entity ('table', 'column' etc) and a scope.
     A scope for a column category will be a list of tables.
+
+    Suggestions are memoized, as completions are requested repeatedly for
+    the same text, and must not be modified. The tokens of the text before
+    the word being typed and the tables in scope are memoized too, so typing
+    a word only scans that word.
     """
 
     word_before_cursor = last_word(text_before_cursor, include="many_punctuations")
 
-    identifier = None
-
-    # here should be removed once sqlparse has been fixed
-    try:
-        # If we've partially typed a word then word_before_cursor won't be an empty
-        # string. In that case we want to remove the partially typed string before
-        # sending it to the sqlparser. Otherwise the last token will always be the
-        # partially typed string which renders the smart completion useless because
-        # it will always return the list of keywords as completion.
-        if word_before_cursor:
-            if word_before_cursor.endswith("(") or word_before_cursor.startswith("\\"):
-                parsed = sqlparse.parse(text_before_cursor)
-            else:
-                parsed = sqlparse.parse(text_before_cursor[: -len(word_before_cursor)])
+    parent = None
+    partial_word = ""
 
-                # word_before_cursor may include a schema qualification, like
-                # "schema_name.partial_name" or "schema_name.", so parse it
-                # separately
-                p = sqlparse.parse(word_before_cursor)[0]
+    # If we've partially typed a word then word_before_cursor won't be an empty
+    # string. In that case we want to remove the partially typed string before
+    # scanning the text. Otherwise the last token will always be the partially
+    # typed string which renders the smart completion useless because it will
+    # always return the list of keywords as completion.
+    if word_before_cursor and not (
+        word_before_cursor.endswith("(") or word_before_cursor.startswith("\\")
+    ):
+        partial_word = word_before_cursor
+        # word_before_cursor may include a schema qualification, like
+        # "schema_name.partial_name" or "schema_name."
+        parent = parent_name(word_before_cursor)
+
+    text = text_before_cursor[: len(text_before_cursor) - len(partial_word)]
+    statements = split_statements(tokenize(text))
+    if len(statements) > 1:
+        # Multiple statements being edited -- isolate the current one, which
+        # starts after the last semicolon before the cursor.
+        stmt_start = statements[-2][-1].end
+        text_before_cursor = text_before_cursor[stmt_start:]
+        full_text = full_text[stmt_start:]
+        text = text[stmt_start:]
+    statement = group_parentheses(text, tokenize(text))
 
-                if p.tokens and isinstance(p.tokens[0], Identifier):
-                    identifier = p.tokens[0]
-        else:
-            parsed = sqlparse.parse(text_before_cursor)
-    except (TypeError, AttributeError):
-        return (Keyword(),)
-
-    if len(parsed) > 1:
-        # Multiple statements being edited -- isolate the current one by
-        # cumulatively summing statement lengths to find the one that bounds the
-        # current position
-        current_pos = len(text_before_cursor)
-        stmt_start, stmt_end = 0, 0
-
-        for statement in parsed:
-            stmt_len = len(str(statement))
-            stmt_start, stmt_end = stmt_end, stmt_end + stmt_len
-
-            if stmt_end >= current_pos:
-                text_before_cursor = full_text[stmt_start:current_pos]
-                full_text = full_text[stmt_start:]
-                break
-
-    elif parsed:
-        # A single statement
-        statement = parsed[0]
+    # Check for special commands and handle those separately
+    if statement and statement[0].value.startswith("\\"):
+        return suggest_special(text_before_cursor)
+
+    # The tables in scope do not depend on the word being typed. Leave it out
+    # of the text they are extracted from, which then stays the same (and
+    # memoized) while the word is typed.
+    if partial_word and text_before_cursor.endswith(partial_word):
+        cursor = len(text_before_cursor)
+        full_text = full_text[: cursor - len(partial_word)] + full_text[cursor:]
+
+    if in_where_clause(statement):
+        # Look at the last keyword of the where clause to handle suggestions
+        # in complicated where clauses correctly, e.g. 'where foo > 5 and '.
+        prev_keyword, text_before_cursor = find_prev_keyword(text_before_cursor)
+        last_token = prev_keyword
     else:
-        # The empty string
-        statement = None
+        last_token = statement[-1] if statement else ""
 
-    # Check for special commands and handle those separately
-    if statement:
-        # Be careful here because trivial whitespace is parsed as a statement,
-        # but the statement won't have a first token
-        tok1 = statement.token_first()
-        if tok1 and tok1.value.startswith("\\"):
-            return suggest_special(text_before_cursor)
+    return tuple(
+        suggest_based_on_last_token(last_token, text_before_cursor, full_text, parent)
+    )
 
-    last_token = statement and statement.token_prev(len(statement.tokens))[1] or ""
 
-    return suggest_based_on_last_token(
-        last_token, text_before_cursor, full_text, identifier
-    )
+def in_where_clause(tokens):
+    """Whether the last of *tokens*, grouped with `group_parentheses`, is in
+    a WHERE clause."""
+    for token in reversed(tokens):
+        if token.match("WHERE"):
+            return True
+        if token.match(*WHERE_END_KEYWORDS):
+            return False
+    return False
 
 
 def suggest_special(text):
@@ -136,37 +160,24 @@ def suggest_special(text):
     return (Keyword(), Special())
 
 
-def suggest_based_on_last_token(token, text_before_cursor, full_text, identifier):
+def suggest_based_on_last_token(token, text_before_cursor, full_text, parent):
+    """Suggest completions after *token*, the last token before the cursor.
+    *parent* is the name qualifying the word being typed, if any."""
     if isinstance(token, str):
         token_v = token.lower()
-    elif isinstance(token, Comparison):
-        # If 'token' is a Comparison type such as
-        # 'select * FROM abc a JOIN def d ON a.id = d.'. Then calling
-        # token.value on the comparison type will only return the lhs of the
-        # comparison. In this case a.id. So we need to do token.tokens to get
-        # both sides of the comparison and pick the last token out of that
-        # list.
-        token_v = token.tokens[-1].value.lower()
-    elif isinstance(token, Where):
-        # sqlparse groups all tokens from the where clause into a single token
-        # list. This means that token.value may be something like
-        # 'where foo > 5 and '. We need to look "inside" token.tokens to handle
-        # suggestions in complicated where clauses correctly
-        prev_keyword, text_before_cursor = find_prev_keyword(text_before_cursor)
-        return suggest_based_on_last_token(
-            prev_keyword, text_before_cursor, full_text, identifier
-        )
+    elif token is None:
+        token_v = ""
     else:
-        token_v = token.value.lower()
+        token_v = token.normalized.lower()
 
     is_operand = lambda x: x and any([x.endswith(op) for op in ["+", "-", "*", "/"]])
 
     if not token:
         return (Keyword(), Special())
     elif token_v.endswith("("):
-        p = sqlparse.parse(text_before_cursor)[0]
+        p = group_parentheses(text_before_cursor, tokenize(text_before_cursor))
 
-        if p.tokens and isinstance(p.tokens[-1], Where):
+        if in_where_clause(p):
             # Four possibilities:
             #  1 - Parenthesized clause like "WHERE foo AND ("
             #        Suggest columns/functions
@@ -179,32 +190,25 @@ def suggest_based_on_last_token(token, text_before_cursor, full_text, identifier
             #        really fancy, we could suggest only array-typed columns)
 
             column_suggestions = suggest_based_on_last_token(
-                "where", text_before_cursor, full_text, identifier
+                "where", text_before_cursor, full_text, parent
             )
 
             # Check for a subquery expression (cases 3 & 4)
-            where = p.tokens[-1]
-            idx, prev_tok = where.token_prev(len(where.tokens) - 1)
-
-            if isinstance(prev_tok, Comparison):
-                # e.g. "SELECT foo FROM bar WHERE foo = ANY("
-                prev_tok = prev_tok.tokens[-1]
-
-            prev_tok = prev_tok.value.lower()
+            prev_tok = p[-2].value.lower() if len(p) > 1 else ""
             if prev_tok == "exists":
                 return (Keyword(),)
             else:
                 return column_suggestions
 
         # Get the token before the parens
-        idx, prev_tok = p.token_prev(len(p.tokens) - 1)
-        if prev_tok and prev_tok.value and prev_tok.value.lower() == "using":
+        prev_tok = p[-2] if len(p) > 1 else None
+        if prev_tok and prev_tok.value.lower() == "using":
             # tbl1 INNER JOIN tbl2 USING (col1, col2)
             tables = extract_tables(full_text)
 
             # suggest columns that are present in more than one table
             return (Column(tables=tables, drop_unique=True),)
-        elif p.token_first().value.lower() == "select":
+        elif p and p[0].value.lower() == "select":
             # If the lparen is preceeded by a space chances are we're about to
             # do a sub-select.
             if last_word(text_before_cursor, "all_punctuations").startswith("("):
@@ -219,8 +223,6 @@ def suggest_based_on_last_token(token, text_before_cursor, full_text, identifier
         return tuple()
     elif token_v in ("select", "where", "having"):
         # Check for a table alias or schema qualification
-        parent = (identifier and identifier.get_parent_name()) or []
-
         tables = extract_tables(full_text)
         if parent:
             tables = [t for t in tables if identifies(parent, *t)]
@@ -252,7 +254,7 @@ def suggest_based_on_last_token(token, text_before_cursor, full_text, identifier
             "partitions",
         )
     ):
-        schema = (identifier and identifier.get_parent_name()) or None
+        schema = parent
 
         # Suggest tables from either the currently-selected schema or the
         # public schema if no schema has been specified
@@ -277,7 +279,7 @@ def suggest_based_on_last_token(token, text_before_cursor, full_text, identifier
             "tblproperties": Table,
         }[token_v]
 
-        schema = (identifier and identifier.get_parent_name()) or None
+        schema = parent
         if schema:
             return (rel_type(schema=schema),)
         else:
@@ -285,7 +287,6 @@ def suggest_based_on_last_token(token, text_before_cursor, full_text, identifier
 
     elif token_v == "on":
         tables = extract_tables(full_text)  # [(schema, table, alias), ...]
-        parent = (identifier and identifier.get_parent_name()) or None
         if parent:
             # "ON parent.<suggestion>"
             # parent can be either a schema name or table alias
@@ -319,7 +320,7 @@ def suggest_based_on_last_token(token, text_before_cursor, full_text, identifier
         prev_keyword, text_before_cursor = find_prev_keyword(text_before_cursor)
         if prev_keyword:
             return suggest_based_on_last_token(
-                prev_keyword, text_before_cursor, full_text, identifier
+                prev_keyword, text_before_cursor, full_text, parent
             )
         else:
             return tuple()
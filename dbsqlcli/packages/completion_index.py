@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""An index of completion candidates, for matching them as the user types."""
+from bisect import bisect_left
+from functools import lru_cache
+from re import compile, escape
+
+# Below this size scanning all items is cheaper than building the index.
+MIN_INDEXED_SIZE = 500
+
+
+@lru_cache(maxsize=128)
+def fuzzy_pattern(text):
+    """The regex matching the characters of *text* in order, with anything
+    in between."""
+    return compile("(%s)" % ".*?".join(map(escape, text)))
+
+
+class CompletionIndex(object):
+    """Completion candidates, sorted and lower-cased once, for repeated
+    matching.
+
+    Prefix matches are found by bisecting the sorted names. For fuzzy and
+    substring matches, only the items that contain every character of the
+    text are scanned. As the user types, the text usually extends the
+    previous one, so only the previous matches are scanned again.
+    """
+
+    def __init__(self, items):
+        self.items = sorted(items)
+        self.lowered = [item.lower() for item in self.items]
+        self._sorted_lowered = None
+        self._postings = None
+        self._last = None
+
+    def __len__(self):
+        return len(self.items)
+
+    def match(self, text, start_only=False, fuzzy=True):
+        """Return a (match length, match start, item) tuple for every item
+        that matches the lower-cased *text*.
+
+        If `fuzzy` is True the characters of *text* match in order with
+        anything in between. Otherwise *text* has to appear in the item, at
+        the beginning if `start_only` is True.
+        """
+        if fuzzy and len(text) < 2:
+            # Fuzzy matching a single character is a substring search.
+            start_only = fuzzy = False
+        mode = (start_only, fuzzy)
+        positions = self._candidates(text, mode)
+
+        matches = []
+        lowered, items = self.lowered, self.items
+        if fuzzy:
+            search = fuzzy_pattern(text).search
+            for i in positions:
+                r = search(lowered[i])
+                if r:
+                    matches.append((i, (len(r.group()), r.start(), items[i])))
+        else:
+            match_end_limit = len(text) if start_only else None
+            for i in positions:
+                match_point = lowered[i].find(text, 0, match_end_limit)
+                if match_point >= 0:
+                    matches.append((i, (len(text), match_point, items[i])))
+
+        self._last = (text, mode, [i for i, _ in matches])
+        return [match for _, match in matches]
+
+    def _candidates(self, text, mode):
+        """Positions of the items that may match *text*, in order."""
+        last = self._last
+        if last is not None and last[1] == mode and text.startswith(last[0]):
+            # A longer text can only match a subset of the previous matches.
+            return last[2]
+
+        if not text or len(self.items) < MIN_INDEXED_SIZE:
+            return range(len(self.items))
+
+        start_only, fuzzy = mode
+        if start_only and not fuzzy:
+            return self._prefixed(text)
+
+        if self._postings is None:
+            postings = {}
+            for i, item in enumerate(self.lowered):
+                for char in set(item):
+                    postings.setdefault(char, []).append(i)
+            self._postings = {char: set(p) for char, p in postings.items()}
+
+        found = sorted((self._postings.get(char, set()) for char in set(text)), key=len)
+        return sorted(found[0].intersection(*found[1:]))
+
+    def _prefixed(self, text):
+        if self._sorted_lowered is None:
+            self._sorted_lowered = sorted(
+                (item, i) for i, item in enumerate(self.lowered)
+            )
+
+        positions = []
+        sorted_lowered = self._sorted_lowered
+        for j in range(bisect_left(sorted_lowered, (text,)), len(sorted_lowered)):
+            item, i = sorted_lowered[j]
+            if not item.startswith(text):
+                break
+            positions.append(i)
+        return sorted(positions)
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""Write query results straight to columnar files.
+
+The exporters consume the Arrow batches of a `ResultStream` one at a time
+and never render rows as text, so the export runs at I/O speed with memory
+bounded by the fetch size.
+"""
+import os
+import logging
+
+from dbsqlcli.packages.outputfile import (
+    BackgroundOutputFile,
+    compression_from_filename,
+)
+
+_logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ("parquet", "arrow", "csv")
+
+EXTENSIONS = {
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".arrow": "arrow",
+    ".feather": "arrow",
+    ".ipc": "arrow",
+    ".csv": "csv",
+}
+
+
+def format_from_filename(filename):
+    """Guess the export format from the extension of *filename*.
+    >>> format_from_filename('out.parquet')
+    'parquet'
+    >>> format_from_filename('out.csv.gz')
+    'csv'
+    >>> format_from_filename('out.txt') is None
+    True
+    """
+    root, ext = os.path.splitext(filename)
+    if compression_from_filename(filename):
+        _, ext = os.path.splitext(root)
+    return EXTENSIONS.get(ext.lower())
+
+
+def _parquet_writer(filename, schema):
+    import pyarrow.parquet
+
+    return pyarrow.parquet.ParquetWriter(filename, schema)
+
+
+def _arrow_writer(filename, schema):
+    import pyarrow.ipc
+
+    return pyarrow.ipc.new_file(filename, schema)
+
+
+def _csv_writer(filename, schema):
+    import pyarrow.csv
+
+    return pyarrow.csv.CSVWriter(filename, schema)
+
+
+class _CompressedCSVWriter(object):
+    """Writes CSV like `pyarrow.csv.CSVWriter`, to a `BackgroundOutputFile`
+    that compresses it on its writer thread, while the next batch is
+    fetched."""
+
+    def __init__(self, filename, schema, compression):
+        self.file = BackgroundOutputFile(filename, "w", compression)
+        self._write(schema.empty_table(), include_header=True)
+
+    def _write(self, table, include_header=False):
+        import pyarrow
+        import pyarrow.csv
+
+        sink = pyarrow.BufferOutputStream()
+        options = pyarrow.csv.WriteOptions(include_header=include_header)
+        pyarrow.csv.write_csv(table, sink, options)
+        self.file.write_bytes(sink.getvalue().to_pybytes())
+        self.file.flush()
+
+    def write_table(self, table):
+        self._write(table)
+
+    def close(self):
+        self.file.close()
+        self.file.check()
+
+
+WRITERS = {
+    "parquet": _parquet_writer,
+    "arrow": _arrow_writer,
+    "csv": _csv_writer,
+}
+
+
+def check_compression(format_name, compression):
+    """Raise a ValueError if files of *format_name* cannot be compressed
+    with *compression*, before any query runs."""
+    if compression and format_name != "csv":
+        raise ValueError("Only csv exports can be compressed.")
+
+
+def export_result(result, filename, format_name, compression=None):
+    """Stream *result* (a `ResultStream`) to *filename* in *format_name*,
+    compressed with *compression* if it is given. Parquet and arrow files
+    cannot be compressed as a whole.
+
+    Returns a (rows, bytes) tuple with the number of rows and bytes written.
+    """
+    if format_name not in WRITERS:
+        raise ValueError(
+            "Export format {} not recognized. Allowed formats: {}".format(
+                format_name, ", ".join(EXPORT_FORMATS)
+            )
+        )
+    check_compression(format_name, compression)
+
+    def open_writer(schema):
+        if compression:
+            return _CompressedCSVWriter(filename, schema, compression)
+        return WRITERS[format_name](filename, schema)
+
+    filename = os.path.expanduser(filename)
+    writer = None
+    rows = 0
+    try:
+        for batch in result.batches():
+            if writer is None:
+                writer = open_writer(batch.schema)
+            writer.write_table(batch)
+            rows += batch.num_rows
+
+        if writer is None:
+            # Empty result: still write a file with the result's schema.
+            writer = open_writer(result.schema)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    size = os.path.getsize(filename)
+    _logger.debug("Exported %d rows (%d bytes) to %r.", rows, size, filename)
+    return rows, size
@@ -1,8 +1,9 @@
 # -*- coding: utf-8 -*-
+from dbsqlcli.execution import CANCELLED, CANCELLING, FAILED, RUNNING
 
 
-def format_status(rows_length=None, cursor=None):
-    return rows_status(rows_length) + statistics(cursor)
+def format_status(rows_length=None):
+    return rows_status(rows_length)
 
 
 def rows_status(rows_length):
@@ -12,14 +13,39 @@ def rows_status(rows_length):
         return "Query OK"
 
 
-def statistics(cursor):
-    # if cursor:
-    #     return '\nExecution time: %d ms' % (
-    #             cursor.engine_execution_time_in_millis)
-    # else:
-    #     return ''
-    # TODO(arikfr): figure if we can bring back some of this somehow
-    return ""
+def statistics(timing):
+    """Describe where the time of a statement went, given its
+    `StatementTiming`."""
+    phases = ", ".join(
+        "%s %0.03fs" % (phase, seconds) for phase, seconds in timing.seconds.items()
+    )
+    lines = ["Time: %0.03fs (%s)" % (timing.total, phases)]
+    if timing.batches:
+        lines.append(
+            "Fetched %d row%s in %d batch%s, %s, %d rows/s"
+            % (
+                timing.rows,
+                "" if timing.rows == 1 else "s",
+                timing.batches,
+                "" if timing.batches == 1 else "es",
+                humanize_size(timing.bytes),
+                timing.rows_per_second,
+            )
+        )
+    return "\n".join(lines)
+
+
+def format_execution(execution):
+    """Describe the state of an `Execution`."""
+    if execution.state == RUNNING:
+        return "Executing for %0.01fs, Ctrl-C cancels" % execution.elapsed
+    if execution.state == CANCELLING:
+        return "Cancelling after %0.01fs..." % execution.elapsed
+    if execution.state == CANCELLED:
+        return "Last query cancelled after %0.03fs" % execution.elapsed
+    if execution.state == FAILED:
+        return "Last query failed after %0.03fs" % execution.elapsed
+    return "Last query took %0.03fs" % execution.elapsed
 
 
 def humanize_size(num_bytes):
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+import errno
+import queue
+import locale
+import threading
+
+import click
+
+from dbsqlcli.packages.format_utils import humanize_size
+
+# Bytes buffered before they are written to the file.
+BUFFER_SIZE = 1024 * 1024
+# Bytes of lines handed to the writer thread of a BackgroundOutputFile at a
+# time, and how many of those may be waiting before writing blocks.
+CHUNK_SIZE = 256 * 1024
+QUEUE_SIZE = 64
+# The writer thread flushes the file once this many seconds have passed, or
+# this many bytes have been written, since it last did.
+FLUSH_INTERVAL = 1.0
+FLUSH_SIZE = 4 * 1024 * 1024
+# Queued to have the writer thread flush the file.
+_FLUSH = object()
+
+COMPRESSIONS = ("gzip", "zstd")
+EXTENSIONS = {".gz": "gzip", ".gzip": "gzip", ".zst": "zstd", ".zstd": "zstd"}
+
+
+def compression_from_filename(filename):
+    """Guess the compression from the extension of *filename*.
+    >>> compression_from_filename('out.csv.gz')
+    'gzip'
+    >>> compression_from_filename('out.csv') is None
+    True
+    """
+    _, ext = os.path.splitext(filename)
+    return EXTENSIONS.get(ext.lower())
+
+
+class OutputFile(object):
+    """A file that output is written to line by line, e.g. by \\once.
+
+    The file stays open until it is closed, and lines are written through a
+    large buffer, so that the disk sees block writes. `flush` is called once
+    a result has been written, and reports how much it took.
+
+    With a *compression* (one of `COMPRESSIONS`), the file is a stream of
+    that format, and appending to it adds another stream, which readers
+    decompress as one.
+    """
+
+    def __init__(self, file, mode="a", compression=None):
+        self.filename = file
+        self.compression = compression
+        self.encoding = locale.getpreferredencoding(False)
+        self._file = self._open(file, mode, compression)
+        self.bytes_written = 0
+        self._flushed = 0
+
+    @staticmethod
+    def _open(file, mode, compression):
+        f = open(file, mode + "b", buffering=BUFFER_SIZE)
+        if compression is None:
+            return f
+
+        import pyarrow as pa
+
+        try:
+            return pa.CompressedOutputStream(f, compression)
+        except (ValueError, pa.ArrowException) as e:
+            f.close()
+            reason = "Cannot compress with {}: {}".format(compression, e)
+            raise OSError(errno.EINVAL, reason, file)
+
+    def write(self, line):
+        """Write *line*, followed by a newline."""
+        if "\x1b" in line:
+            # Like click.echo, do not write styles to files.
+            line = click.unstyle(line)
+        self.write_bytes((line + "\n").encode(self.encoding, "replace"))
+
+    def write_bytes(self, data):
+        """Write the encoded *data*."""
+        self._write(data)
+        self.bytes_written += len(data)
+
+    def _write(self, data):
+        self._file.write(data)
+
+    def flush(self):
+        """Flush the buffered lines to the file. Returns the number of bytes
+        written since the last flush."""
+        self._file.flush()
+        return self._handed_over()
+
+    def _handed_over(self):
+        written = self.bytes_written - self._flushed
+        self._flushed = self.bytes_written
+        return written
+
+    def close(self):
+        self._file.close()
+
+    def describe(self, written, queued=False):
+        """Describe *written* bytes written to this file, or only *queued*
+        to be written."""
+        description = "{} {} {}".format(
+            humanize_size(written),
+            "queued for" if queued else "written to",
+            self.filename,
+        )
+        if self.compression:
+            description += " (uncompressed)"
+        return description
+
+
+class BackgroundOutputFile(OutputFile):
+    """An `OutputFile` that is written to disk by a thread of its own.
+
+    Lines are collected into chunks of `CHUNK_SIZE` bytes, which are handed
+    to the writer thread through a bounded queue, so that output only waits
+    for the disk when `QUEUE_SIZE` chunks are already waiting. The writer
+    thread flushes the file every `FLUSH_INTERVAL` seconds or `FLUSH_SIZE`
+    bytes, and compresses it if it is compressed.
+    """
+
+    def __init__(self, file, mode="a", compression=None):
+        super(BackgroundOutputFile, self).__init__(file, mode, compression)
+        self.error = None
+        self._chunk = []
+        self._chunk_size = 0
+        self._queue = queue.Queue(QUEUE_SIZE)
+        self._thread = threading.Thread(
+            target=self._run, name="output-file", daemon=True
+        )
+        self._thread.start()
+
+    def _write(self, data):
+        self._chunk.append(data)
+        self._chunk_size += len(data)
+        if self._chunk_size >= CHUNK_SIZE:
+            self._hand_over()
+
+    def _hand_over(self):
+        if self._chunk:
+            self._queue.put(b"".join(self._chunk))
+            self._chunk = []
+            self._chunk_size = 0
+
+    def flush(self, wait=False):
+        """Hand the lines written since the last flush over to the writer
+        thread, and with *wait*, wait until it has written them and flushed
+        the file. Returns the number of bytes handed over, and raises the
+        error the writer thread ran into, if any."""
+        self._hand_over()
+        if wait:
+            self._queue.put(_FLUSH)
+            self._queue.join()
+        self.check()
+        return self._handed_over()
+
+    def check(self):
+        """Raise the error the writer thread ran into, if any."""
+        if self.error is not None:
+            reason = getattr(self.error, "strerror", None) or str(self.error)
+            error = OSError(
+                "Cannot write to file '{}': {}".format(self.filename, reason)
+            )
+            error.filename, error.strerror = self.filename, reason
+            raise error
+
+    def close(self):
+        """Write the remaining lines, and wait for the file to be closed.
+        Call `check` afterwards to know whether it was written."""
+        self._hand_over()
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        self._unflushed = 0
+        self._flushed_at = time.time()
+        while True:
+            try:
+                chunk = self._queue.get(timeout=FLUSH_INTERVAL)
+            except queue.Empty:
+                self._write_chunk(b"")
+                continue
+            try:
+                if chunk is None:
+                    break
+                self._write_chunk(chunk)
+            finally:
+                self._queue.task_done()
+        try:
+            self._file.close()
+        except (IOError, OSError, ValueError) as e:
+            self.error = self.error or e
+
+    def _write_chunk(self, chunk):
+        if self.error is not None:
+            # Keep taking chunks, so that output never blocks.
+            return
+        try:
+            if chunk is _FLUSH:
+                self._flush_file()
+                return
+            self._file.write(chunk)
+            self._unflushed += len(chunk)
+            if self._unflushed and (
+                self._unflushed >= FLUSH_SIZE
+                or time.time() - self._flushed_at >= FLUSH_INTERVAL
+            ):
+                self._flush_file()
+        except (IOError, OSError, ValueError) as e:
+            self.error = e
+
+    def _flush_file(self):
+        self._file.flush()
+        self._unflushed = 0
+        self._flushed_at = time.time()
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""Stream output into a pager process as it is produced."""
+import os
+import sys
+import shlex
+import shutil
+import logging
+import subprocess
+
+_logger = logging.getLogger(__name__)
+
+
+def get_pager_command():
+    """Get the pager command: $PAGER, or `less` / `more` if available."""
+    cmd = os.environ.get("PAGER", "").strip()
+    if cmd:
+        return cmd
+    for cmd in ("less", "more"):
+        if shutil.which(cmd):
+            return cmd
+    return None
+
+
+class Pager(object):
+    """A pager subprocess that lines are written to as they are produced.
+
+    Lines go through a buffered pipe, so writes block once the pager stops
+    reading (i.e. while the user looks at a screen) and producing more output
+    waits for the user. `write` returns False once the pager has been quit.
+    """
+
+    def __init__(self, cmd):
+        env = dict(os.environ)
+        # Let less display the colors of styled output, like click does.
+        if os.path.basename(shlex.split(cmd)[0]) == "less" and "LESS" not in env:
+            env["LESS"] = "-R"
+
+        self.process = subprocess.Popen(
+            cmd,
+            shell=True,
+            stdin=subprocess.PIPE,
+            env=env,
+            encoding=getattr(sys.stdout, "encoding", None) or "utf-8",
+            errors="replace",
+        )
+        self.closed = False
+
+    def write(self, line):
+        if self.closed:
+            return False
+        try:
+            self.process.stdin.write(line + "\n")
+        except OSError:  # BrokenPipeError: the user quit the pager.
+            self.closed = True
+        return not self.closed
+
+    def flush(self):
+        if self.closed:
+            return
+        try:
+            self.process.stdin.flush()
+        except OSError:
+            self.closed = True
+
+    def close(self):
+        """Close the pipe and wait for the user to quit the pager."""
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        self.closed = True
+
+        while True:
+            try:
+                self.process.wait()
+                break
+            except KeyboardInterrupt:
+                # The pager handles Ctrl-C itself.
+                pass
+
+
+def open_pager():
+    """Start a pager, or return None if output should not be paged because
+    there is no terminal or no pager available."""
+    if not (sys.stdin.isatty() and sys.stdout.isatty()):
+        return None
+
+    cmd = get_pager_command()
+    if not cmd:
+        return None
+
+    _logger.debug("Starting pager %r.", cmd)
+    return Pager(cmd)
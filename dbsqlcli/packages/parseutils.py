@@ -1,7 +1,9 @@
 import re
+from functools import lru_cache
+
 import sqlparse
-from sqlparse.sql import IdentifierList, Identifier, Function
-from sqlparse.tokens import Keyword, DML, Punctuation
+
+from dbsqlcli.packages import sqlscanner
 
 cleanup_regex = {
     # This matches only alphanumerics and underscores.
@@ -60,112 +62,149 @@ def last_word(text, include="alphanum_underscore"):
             return ""
 
 
-# This code is borrowed from sqlparse example script.
-# <url>
-def is_subselect(parsed):
-    if not parsed.is_group:
-        return False
-    for item in parsed.tokens:
-        if item.ttype is DML and item.value.upper() in (
-            "SELECT",
-            "INSERT",
-            "UPDATE",
-            "CREATE",
-            "DELETE",
-        ):
-            return True
-    return False
+# Keywords after which table names follow.
+TABLE_PREFIXES = ("COPY", "FROM", "INTO", "UPDATE", "TABLE", "JOIN")
+# Keywords that start a (sub)statement, after which tables may follow again.
+DML_KEYWORDS = ("SELECT", "INSERT", "UPDATE", "DELETE", "MERGE", "WITH")
+# States of the table scanner: looking for a table list, expecting a table
+# name, after a table name, in a join condition and after the table list.
+_SCAN, _TABLE, _AFTER_TABLE, _CONDITION, _DONE = range(5)
 
 
-def extract_from_part(parsed, stop_at_punctuation=True):
-    tbl_prefix_seen = False
-    for item in parsed.tokens:
-        if tbl_prefix_seen:
-            if is_subselect(item):
-                for x in extract_from_part(item, stop_at_punctuation):
-                    yield x
-            elif stop_at_punctuation and item.ttype is Punctuation:
-                return
-            # An incomplete nested select won't be recognized correctly as a
-            # sub-select. eg: 'SELECT * FROM (SELECT id FROM user'. This causes
-            # the second FROM to trigger this elif condition resulting in a
-            # StopIteration. So we need to ignore the keyword if the keyword
-            # FROM.
-            # Also 'SELECT * FROM abc JOIN def' will trigger this elif
-            # condition. So we need to ignore the keyword JOIN and its variants
-            # INNER JOIN, FULL OUTER JOIN, etc.
-            elif (
-                item.ttype is Keyword
-                and (not item.value.upper() == "FROM")
-                and (not item.value.upper().endswith("JOIN"))
-            ):
-                return
+def _is_table_prefix(token):
+    return token.is_keyword and (
+        token.normalized in TABLE_PREFIXES or token.normalized.endswith(" JOIN")
+    )
+
+
+def _unquote(name):
+    if len(name) > 1 and name[0] == name[-1] and name[0] in '`"':
+        return name[1:-1]
+    return name
+
+
+def _qualified_name(tokens, i):
+    """Read a dotted name starting at *tokens[i]*. Returns the (schema,
+    name) of the name and the index of the token after it."""
+    names = [_unquote(tokens[i].value)]
+    i += 1
+    while i < len(tokens) and tokens[i].value == ".":
+        i += 1
+        if i < len(tokens) and tokens[i].type == sqlscanner.NAME:
+            names.append(_unquote(tokens[i].value))
+            i += 1
+        else:
+            names.append(None)
+    schema = names[-2] if len(names) > 1 else None
+    return schema, names[-1], i
+
+
+def _alias(tokens, i):
+    """Read an optional alias at *tokens[i]*. Returns the alias (or None)
+    and the index of the token after it."""
+    if i < len(tokens) and tokens[i].match("AS"):
+        i += 1
+    if i < len(tokens) and tokens[i].type == sqlscanner.NAME:
+        return _unquote(tokens[i].value), i + 1
+    return None, i
+
+
+def _is_subselect(token):
+    inner = sqlscanner.tokenize(token.value[1:-1])
+    return bool(inner) and inner[0].match(*DML_KEYWORDS)
+
+
+def extract_table_references(sql, tokens, stop_at_punctuation=False):
+    """Yields (schema_name, table_name, table_alias) tuples for the tables
+    that *tokens* of *sql*, grouped with `group_parentheses`, refer to.
+
+    Tables are read from FROM, JOIN, INTO, UPDATE and similar clauses,
+    including those of sub-selects in these clauses and of sub-selects
+    that are not closed yet.
+    """
+    state = _SCAN
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+
+        if state == _TABLE and token.type == sqlscanner.NAME:
+            schema, name, i = _qualified_name(tokens, i)
+            if name is None:
+                # A schema qualified name that is being typed.
+                state = _AFTER_TABLE
+                continue
+            if i < len(tokens) and tokens[i].type == sqlscanner.PARENTHESIS:
+                # The columns of an INSERT, or a table valued function, which
+                # is referred to by its name.
+                yield (schema, name, None if schema else name)
+                if stop_at_punctuation:
+                    return
+                i += 1
             else:
-                yield item
+                alias, i = _alias(tokens, i)
+                yield (schema, name, alias)
+            state = _AFTER_TABLE
+            continue
+        elif state == _TABLE and token.type == sqlscanner.PARENTHESIS:
+            if _is_subselect(token):
+                inner_sql = token.value[1:-1]
+                inner = sqlscanner.group_parentheses(
+                    inner_sql, sqlscanner.tokenize(inner_sql)
+                )
+                for table in extract_table_references(inner_sql, inner):
+                    yield table
+            alias, i = _alias(tokens, i + 1)
+            if alias:
+                yield (None, alias, alias)
+            state = _AFTER_TABLE
+            continue
         elif (
-            item.ttype is Keyword or item.ttype is Keyword.DML
-        ) and item.value.upper() in (
-            "COPY",
-            "FROM",
-            "INTO",
-            "UPDATE",
-            "TABLE",
-            "JOIN",
+            stop_at_punctuation
+            and state != _SCAN
+            and token.type in (sqlscanner.PUNCTUATION, sqlscanner.PARENTHESIS)
         ):
-            tbl_prefix_seen = True
-        # 'SELECT a, FROM abc' will detect FROM as part of the column list.
-        # So this check here is necessary.
-        elif isinstance(item, IdentifierList):
-            for identifier in item.get_identifiers():
-                if identifier.ttype is Keyword and identifier.value.upper() == "FROM":
-                    tbl_prefix_seen = True
-                    break
-
-
-def extract_table_identifiers(token_stream):
-    """yields tuples of (schema_name, table_name, table_alias)"""
-
-    for item in token_stream:
-        if isinstance(item, IdentifierList):
-            for identifier in item.get_identifiers():
-                # Sometimes Keywords (such as FROM ) are classified as
-                # identifiers which don't have the get_real_name() method.
-                try:
-                    schema_name = identifier.get_parent_name()
-                    real_name = identifier.get_real_name()
-                except AttributeError:
-                    continue
-                if real_name:
-                    yield (schema_name, real_name, identifier.get_alias())
-        elif isinstance(item, Identifier):
-            real_name = item.get_real_name()
-            schema_name = item.get_parent_name()
-
-            if real_name:
-                yield (schema_name, real_name, item.get_alias())
+            return
+        elif token.value == "(":
+            # A sub-select that is not closed yet.
+            state = _SCAN
+        elif _is_table_prefix(token):
+            if state != _DONE and (
+                state != _CONDITION or token.normalized.endswith("JOIN")
+            ):
+                state = _TABLE
+        elif state in (_TABLE, _AFTER_TABLE) and token.is_keyword:
+            if token.match("ON", "USING"):
+                state = _CONDITION
+            elif token.match(*DML_KEYWORDS):
+                # e.g. INSERT INTO ... SELECT
+                state = _SCAN
             else:
-                name = item.get_name()
-                yield (None, name, item.get_alias() or name)
-        elif isinstance(item, Function):
-            yield (None, item.get_name(), item.get_name())
+                state = _DONE
+        elif state == _AFTER_TABLE and token.value == ",":
+            state = _TABLE
+        i += 1
 
 
-# extract_tables is inspired from examples in the sqlparse lib.
 def extract_tables(sql):
     """Extract the table names from an SQL statment.
     Returns a list of (schema, table, alias) tuples
     """
-    parsed = sqlparse.parse(sql)
-    if not parsed:
-        return []
+    return list(_extract_tables(sql))
+
+
+@lru_cache(maxsize=32)
+def _extract_tables(sql):
+    statement = sqlscanner.split_statements(sqlscanner.tokenize(sql))[0]
+    if not statement:
+        return ()
 
     # INSERT statements must stop looking for tables at the sign of first
     # Punctuation. eg: INSERT INTO abc (col1, col2) VALUES (1, 2)
     # abc is the table name, but if we don't stop at the first lparen, then
     # we'll identify abc, col1 and col2 as table names.
-    insert_stmt = parsed[0].token_first().value.lower() == "insert"
-    stream = extract_from_part(parsed[0], stop_at_punctuation=insert_stmt)
-    return list(extract_table_identifiers(stream))
+    insert_stmt = statement[0].value.lower() == "insert"
+    tokens = sqlscanner.group_parentheses(sql, statement)
+    return tuple(extract_table_references(sql, tokens, insert_stmt))
 
 
 def find_prev_keyword(sql):
@@ -176,33 +215,34 @@ def find_prev_keyword(sql):
     if not sql.strip():
         return None, ""
 
-    parsed = sqlparse.parse(sql)[0]
-    flattened = list(parsed.flatten())
+    statement = sqlscanner.split_statements(sqlscanner.tokenize(sql))[0]
 
     logical_operators = ("AND", "OR", "NOT", "BETWEEN")
 
-    for t in reversed(flattened):
-        if t.value == "(" or (
-            t.is_keyword and (t.value.upper() not in logical_operators)
-        ):
-            # Find the location of token t in the original parsed statement
-            # We can't use parsed.token_index(t) because t may be a child token
-            # inside a TokenList, in which case token_index thows an error
-            # Minimal example:
-            #   p = sqlparse.parse('select * from foo where bar')
-            #   t = list(p.flatten())[-3]  # The "Where" token
-            #   p.token_index(t)  # Throws ValueError: not in list
-            idx = flattened.index(t)
-
-            # Combine the string values of all tokens in the original list
-            # up to and including the target keyword token t, to produce a
-            # query string with everything after the keyword token removed
-            text = "".join(tok.value for tok in flattened[: idx + 1])
-            return t, text
+    for t in reversed(statement):
+        if t.value == "(" or (t.is_keyword and t.normalized not in logical_operators):
+            return t, sql[: t.end]
 
     return None, ""
 
 
+def parent_name(name):
+    """Return the name that qualifies the last part of a dotted *name*, e.g.
+    the schema of "schema.table" or the table of "table.column", or None.
+
+    >>> parent_name('sch.tbl')
+    'sch'
+    >>> parent_name('tbl.')
+    'tbl'
+    >>> parent_name('tbl') is None
+    True
+    """
+    names = name.split(".")
+    if len(names) < 2:
+        return None
+    return _unquote(names[-2]) or None
+
+
 def query_starts_with(query, prefixes):
     """Check if the query starts with any item from *prefixes*."""
     prefixes = [prefix.lower() for prefix in prefixes]
@@ -224,6 +264,63 @@ def is_destructive(queries):
     return queries_start_with(queries, keywords)
 
 
+# Statements that only read data. A statement that starts with common table
+# expressions only reads data if its main statement is a query.
+READ_ONLY_KEYWORDS = ("select", "values", "show", "describe", "desc", "explain")
+
+
+def is_read_only(query):
+    """Check if *query* only reads data, so that its result can be cached."""
+    if query_starts_with(query, ("with",)):
+        statements = sqlparse.parse(query)
+        return bool(statements) and statements[0].get_type() == "SELECT"
+    return query_starts_with(query, READ_ONLY_KEYWORDS)
+
+
+# Statements that change the session or the schema. Statements of a script
+# that is run in parallel do not overlap with these.
+BARRIER_KEYWORDS = (
+    "use",
+    "set",
+    "reset",
+    "create",
+    "drop",
+    "alter",
+    "truncate",
+    "msck",
+    "refresh",
+    "grant",
+    "revoke",
+)
+# A comment line that separates the statements before it from the ones after
+# it, in a script that is run in parallel.
+BARRIER_MARKER = re.compile(r"^\s*--\s*barrier\s*$", re.IGNORECASE | re.MULTILINE)
+TEMPORARY_OBJECT = re.compile(
+    r"^\s*create\s+(or\s+replace\s+)?temp(orary)?\s+(view|function)\b",
+    re.IGNORECASE,
+)
+
+
+def is_barrier(query):
+    """Check if *query* has to run on its own, after the statements before
+    it and before the ones after it."""
+    return query_starts_with(query, BARRIER_KEYWORDS)
+
+
+def has_barrier_marker(query):
+    """Check if *query* is preceded by a `-- barrier` comment line."""
+    return BARRIER_MARKER.search(query) is not None
+
+
+def is_session_statement(query):
+    """Check if *query* changes the state of the session it runs in, e.g.
+    the current schema, a setting or a temporary view."""
+    formatted_sql = sqlparse.format(query, strip_comments=True).strip()
+    return query_starts_with(query, ("use", "set", "reset")) or bool(
+        TEMPORARY_OBJECT.match(formatted_sql)
+    )
+
+
 if __name__ == "__main__":
     sql = "select * from (select t. from tabl t"
     print(extract_tables(sql))
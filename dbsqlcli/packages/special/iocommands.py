@@ -5,13 +5,27 @@ import logging
 import subprocess
 import shlex
 from io import open
-from time import sleep
+from time import sleep, strftime
+from collections import Counter
 
 import click
 import sqlparse
 
 from dbsqlcli.packages.prompt_utils import confirm_destructive_query
 from dbsqlcli.packages.special.favoritequeries import favoritequeries
+from dbsqlcli.packages.exporters import (
+    EXPORT_FORMATS,
+    check_compression,
+    export_result,
+)
+from dbsqlcli.packages.format_utils import humanize_size
+from dbsqlcli.results import ResultStream, DEFAULT_FETCH_SIZE
+from dbsqlcli.result_cache import CachingCursor
+from dbsqlcli.packages.outputfile import (
+    COMPRESSIONS,
+    BackgroundOutputFile,
+    compression_from_filename,
+)
 
 from . import export
 from .main import special_command, NO_QUERY, PARSED_QUERY
@@ -19,10 +33,14 @@ from .utils import handle_cd_command
 
 OUTPUT_LOCATION = None
 TIMING_ENABLED = False
+TIMING_VERBOSE = False
 use_expanded_output = False
 PAGER_ENABLED = True
+FETCH_SIZE = DEFAULT_FETCH_SIZE
 tee_file = None
-once_file = written_to_once_file = None
+# The arguments of the \once file, and the file once it has been written to.
+once_file = None
+once_output = None
 
 
 @export
@@ -48,6 +66,12 @@ def is_pager_enabled():
     return PAGER_ENABLED
 
 
+@export
+def set_fetch_size(val):
+    global FETCH_SIZE
+    FETCH_SIZE = val
+
+
 @export
 @special_command(
     "pager",
@@ -89,17 +113,30 @@ def disable_pager():
 
 @special_command(
     "\\timing",
-    "\\t",
-    "Toggle timing of commands.",
-    arg_type=NO_QUERY,
+    "\\t [on|off|verbose]",
+    "Toggle timing of commands. Verbose timing breaks it down by phase.",
+    arg_type=PARSED_QUERY,
     aliases=("\\t",),
     case_sensitive=True,
 )
-def toggle_timing():
-    global TIMING_ENABLED
-    TIMING_ENABLED = not TIMING_ENABLED
+def toggle_timing(arg, **_):
+    global TIMING_ENABLED, TIMING_VERBOSE
+    arg = arg.strip().lower()
+    if arg == "verbose":
+        TIMING_ENABLED = TIMING_VERBOSE = True
+    elif arg in ("on", "off"):
+        TIMING_ENABLED = arg == "on"
+        TIMING_VERBOSE = False
+    elif arg:
+        return [(None, None, None, "Syntax: \\timing [on|off|verbose].")]
+    else:
+        TIMING_ENABLED = not TIMING_ENABLED
+        TIMING_VERBOSE = False
     message = "Timing is "
-    message += "on." if TIMING_ENABLED else "off."
+    if TIMING_VERBOSE:
+        message += "verbose."
+    else:
+        message += "on." if TIMING_ENABLED else "off."
     return [(None, None, None, message)]
 
 
@@ -108,6 +145,17 @@ def is_timing_enabled():
     return TIMING_ENABLED
 
 
+@export
+def set_timing_verbose(val):
+    global TIMING_VERBOSE
+    TIMING_VERBOSE = val
+
+
+@export
+def is_timing_verbose():
+    return TIMING_VERBOSE
+
+
 @export
 def set_expanded_output(val):
     global use_expanded_output
@@ -365,42 +413,74 @@ def execute_system_command(arg, **_):
         return [(None, None, None, "OSError: %s" % e.strerror)]
 
 
+# The -o and -z options of tee and \once.
+OUTPUT_FILE_OPTION = re.compile(r"^(?:-o|-z\s+(\S+))\s+")
+
+
 def parseargfile(arg):
-    if arg.startswith("-o "):
-        mode = "w"
-        filename = arg[3:]
-    else:
-        mode = "a"
-        filename = arg
+    mode = "a"
+    compression = None
+    while True:
+        match = OUTPUT_FILE_OPTION.match(arg)
+        if not match:
+            break
+        if match.group(1):
+            compression = match.group(1)
+        else:
+            mode = "w"
+        arg = arg[match.end() :]
+    filename = arg
 
     if not filename:
         raise TypeError("You must provide a filename.")
+    compression = compression or compression_from_filename(filename)
+    if compression not in COMPRESSIONS + (None,):
+        raise TypeError(
+            "Compression must be one of {}.".format(", ".join(COMPRESSIONS))
+        )
 
-    return {"file": os.path.expanduser(filename), "mode": mode}
+    return {
+        "file": os.path.expanduser(filename),
+        "mode": mode,
+        "compression": compression,
+    }
 
 
 @special_command(
     "tee",
-    "tee [-o] filename",
-    "Append all results to an output file (overwrite using -o).",
+    "tee [-o] [-z gzip|zstd] filename",
+    "Append all results to an output file (overwrite using -o, compress using "
+    "-z or a .gz or .zst filename).",
 )
 def set_tee(arg, **_):
     global tee_file
 
+    close_tee()
+    tee_file = open_output_file(parseargfile(arg))
+
+    return [(None, None, None, "")]
+
+
+def open_output_file(args):
     try:
-        tee_file = open(**parseargfile(arg))
+        return BackgroundOutputFile(**args)
     except (IOError, OSError) as e:
         raise OSError("Cannot write to file '{}': {}".format(e.filename, e.strerror))
 
-    return [(None, None, None, "")]
-
 
 @export
 def close_tee():
+    """Close the tee file, and raise the error writing it ran into, if
+    any."""
     global tee_file
-    if tee_file:
-        tee_file.close()
-        tee_file = None
+    output_file, tee_file = tee_file, None
+    close_output_file(output_file)
+
+
+def close_output_file(output_file):
+    if output_file:
+        output_file.close()
+        output_file.check()
 
 
 @special_command("notee", "notee", "Stop writing results to an output file.")
@@ -411,22 +491,21 @@ def no_tee(arg, **_):
 
 @export
 def write_tee(output):
-    global tee_file
     if tee_file:
-        click.echo(output, file=tee_file, nl=False)
-        click.echo("\n", file=tee_file, nl=False)
-        tee_file.flush()
+        tee_file.write(output)
 
 
 @special_command(
     "\\once",
-    "\\o [-o] filename",
-    "Append next result to an output file (overwrite using -o).",
+    "\\o [-o] [-z gzip|zstd] filename",
+    "Append next result to an output file (overwrite using -o, compress using "
+    "-z or a .gz or .zst filename).",
     aliases=("\\o",),
 )
 def set_once(arg, **_):
     global once_file
 
+    close_once()
     once_file = parseargfile(arg)
 
     return [(None, None, None, "")]
@@ -434,46 +513,98 @@ def set_once(arg, **_):
 
 @export
 def write_once(output):
-    global once_file, written_to_once_file
+    global once_file, once_output
     if output and once_file:
+        if once_output is None:
+            try:
+                once_output = open_output_file(once_file)
+            except OSError:
+                once_file = None
+                raise
+        once_output.write(output)
+
+
+@export
+def close_once():
+    """Close the once file, and raise the error writing it ran into, if
+    any."""
+    global once_output
+    output_file, once_output = once_output, None
+    close_output_file(output_file)
+
+
+@export
+def flush_output_files():
+    """Flush the tee and once files once a result has been written to them.
+    Returns what was written to them for the result, or None.
+
+    The once file is flushed to disk, while the lines of the tee file may
+    only be queued to be written in the background."""
+    global tee_file, once_file, once_output
+    written = []
+    if tee_file:
         try:
-            f = open(**once_file)
-        except (IOError, OSError) as e:
-            once_file = None
-            raise OSError(
-                "Cannot write to file '{}': {}".format(e.filename, e.strerror)
-            )
+            size = tee_file.flush()
+        except OSError:
+            # The tee file cannot be written to any more.
+            output_file, tee_file = tee_file, None
+            output_file.close()
+            raise
+        if size:
+            written.append(tee_file.describe(size, queued=True))
+    if once_output:
+        try:
+            size = once_output.flush(wait=True)
+        except OSError:
+            output_file, once_output, once_file = once_output, None, None
+            output_file.close()
+            raise
+        if size:
+            written.append(once_output.describe(size))
+    return ", ".join(written) or None
+
 
-        with f:
-            click.echo(output, file=f, nl=False)
-            click.echo("\n", file=f, nl=False)
-        written_to_once_file = True
+@export
+def is_output_to_file():
+    """Is output being written to a tee or once file?"""
+    return bool(tee_file or once_file)
 
 
 @export
 def unset_once_if_written():
     """Unset the once file, if it has been written to."""
     global once_file
-    if written_to_once_file:
+    if once_output:
         once_file = None
+        close_once()
+
+
+# A quoted probe query at the start of the arguments of watch.
+WATCH_PROBE = re.compile(r"""^(["'])(.+?)\1(?:\s+|$)""", re.DOTALL)
 
 
 @special_command(
     "watch",
-    "watch [seconds] [-c] query",
+    "watch [seconds] [-c] [-d] [-p 'probe'] query",
     "Executes the query every [seconds] seconds (by default 5).",
 )
 def watch_query(arg, **kwargs):
-    usage = """Syntax: watch [seconds] [-c] query.
+    usage = """Syntax: watch [seconds] [-c] [-d] [-p 'probe'] query.
     * seconds: The interval at the query will be repeated, in seconds.
                By default 5.
     * -c: Clears the screen between every iteration.
+    * -d: Only shows the rows that were added (+), changed (~) or
+          removed (-) since the previous iteration.
+    * -p: A cheap query, e.g. 'select max(updated_at) from t', that is run
+          every iteration. The query is only repeated when its result changes.
 """
     if not arg:
         yield (None, None, None, usage)
         return
     seconds = 5
     clear_screen = False
+    differential = False
+    probe = None
     statement = None
     while statement is None:
         arg = arg.strip()
@@ -490,6 +621,17 @@ def watch_query(arg, **kwargs):
         if current_arg == "-c":
             clear_screen = True
             continue
+        if current_arg == "-d":
+            differential = True
+            continue
+        if current_arg == "-p":
+            match = WATCH_PROBE.match(arg.strip())
+            if not match:
+                yield (None, None, None, usage)
+                return
+            probe = match.group(2)
+            arg = arg.strip()[match.end() :]
+            continue
         statement = "{0!s} {1!s}".format(current_arg, arg)
     destructive_prompt = confirm_destructive_query(statement)
     if destructive_prompt is False:
@@ -501,26 +643,189 @@ def watch_query(arg, **kwargs):
     sql_list = [
         (sql.rstrip(";"), "> {0!s}".format(sql)) for sql in sqlparse.split(statement)
     ]
+    # The (headers, rows) of each statement, and the result of the probe, as
+    # of the last time they ran.
+    previous = {}
+    probed = None
+    executed = False
+    # Whether the in-place "No changes" line is on screen.
+    waiting = False
     old_pager_enabled = is_pager_enabled()
-    while True:
-        if clear_screen:
-            click.clear()
-        try:
-            # Somewhere in the code the pager its activated after every yield,
-            # so we disable it in every iteration
-            set_pager_enabled(False)
-            for (sql, title) in sql_list:
-                cur.execute(sql)
-                if cur.description:
-                    headers = [x[0] for x in cur.description]
-                    yield (title, cur.fetchall(), headers, None)
+    # Somewhere in the code the pager its activated after every yield, so it
+    # is disabled until watch is interrupted.
+    set_pager_enabled(False)
+    try:
+        while True:
+            unchanged = False
+            if probe is not None:
+                _execute_uncached(cur, probe)
+                probe_result = [tuple(map(repr, row)) for row in cur.fetchall()]
+                unchanged = executed and probe_result == probed
+                probed = probe_result
+
+            if unchanged:
+                results = []
+            elif differential:
+                # Whether anything changed is only known once all the
+                # statements ran.
+                results = []
+                for sql, title in sql_list:
+                    result = _watched_result(cur, sql, title)
+                    _, rows, headers, _ = result
+                    last = previous.get(sql)
+                    if headers is not None:
+                        previous[sql] = (headers, rows)
+                    if headers is None or last is None or last[0] != headers:
+                        results.append(result)
+                        continue
+                    changes = diff_rows(last[1], rows)
+                    if changes:
+                        results.append(
+                            (title, changes, [""] + headers, changes_status(changes))
+                        )
+            else:
+                # The results are shown as each statement finishes.
+                results = None
+            executed = True
+
+            if results == []:
+                click.echo("\rNo changes at {0}".format(strftime("%H:%M:%S")), nl=False)
+                waiting = True
+            else:
+                if waiting:
+                    click.echo("")
+                    waiting = False
+                if clear_screen:
+                    click.clear()
+                if results is None:
+                    for sql, title in sql_list:
+                        yield _watched_result(cur, sql, title)
                 else:
-                    yield (title, None, None, None)
+                    for result in results:
+                        yield result
             sleep(seconds)
-        except KeyboardInterrupt:
-            # This prints the Ctrl-C character in its own line, which prevents
-            # to print a line with the cursor positioned behind the prompt
-            click.secho("", nl=True)
-            return
-        finally:
-            set_pager_enabled(old_pager_enabled)
+    except KeyboardInterrupt:
+        # This prints the Ctrl-C character in its own line, which prevents
+        # to print a line with the cursor positioned behind the prompt
+        click.secho("", nl=True)
+        return
+    finally:
+        set_pager_enabled(old_pager_enabled)
+
+
+def _execute_uncached(cur, sql):
+    """Execute *sql* without serving it from the result cache, as watch is
+    about seeing results change."""
+    if isinstance(cur, CachingCursor):
+        cur.execute(sql, bypass_cache=True)
+    else:
+        cur.execute(sql)
+
+
+def _watched_result(cur, sql, title):
+    """Execute a statement of watch, and return its result."""
+    _execute_uncached(cur, sql)
+    if not cur.description:
+        return (title, None, None, None)
+    headers = [x[0] for x in cur.description]
+    return (title, cur.fetchall(), headers, None)
+
+
+def diff_rows(previous, rows):
+    """Return the rows of *rows* that are not in *previous*, each prefixed
+    with "+" if it was added, "~" if it changed and "-" if it was removed.
+
+    If the first column identifies the rows of both results, rows with the
+    same first value are compared, and the changed cells of a changed row
+    read "old -> new". Otherwise, rows are only added or removed.
+    """
+    old = _rows_by_key(previous)
+    new = _rows_by_key(rows)
+    if old is None or new is None:
+        old = Counter(tuple(map(repr, row)) for row in previous)
+        new = Counter(tuple(map(repr, row)) for row in rows)
+        removed, added = old - new, new - old
+        changes = []
+        for sign, result, counts in (("+", rows, added), ("-", previous, removed)):
+            for row in result:
+                identity = tuple(map(repr, row))
+                if counts[identity] > 0:
+                    counts[identity] -= 1
+                    changes.append((sign,) + tuple(row))
+        return changes
+
+    changes = []
+    for key, row in new.items():
+        if key not in old:
+            changes.append(("+",) + tuple(row))
+        elif tuple(map(repr, old[key])) != tuple(map(repr, row)):
+            cells = tuple(
+                value if repr(value) == repr(before) else "%s -> %s" % (before, value)
+                for before, value in zip(old[key], row)
+            )
+            changes.append(("~",) + cells)
+    for key, row in old.items():
+        if key not in new:
+            changes.append(("-",) + tuple(row))
+    return changes
+
+
+def _rows_by_key(rows):
+    """Return *rows* by the repr of their first value, or None if it does
+    not identify them."""
+    by_key = {}
+    for row in rows:
+        key = repr(row[0]) if len(row) else None
+        if key is None or key in by_key:
+            return None
+        by_key[key] = row
+    return by_key
+
+
+def changes_status(changes):
+    """Summarize the *changes* returned by `diff_rows`."""
+    counts = Counter(change[0] for change in changes)
+    return "{0} added, {1} changed, {2} removed".format(
+        counts["+"], counts["~"], counts["-"]
+    )
+
+
+@special_command(
+    "\\export",
+    "\\export format filename query",
+    "Export query results to a parquet, arrow or csv file (compressed if its "
+    "name ends with .gz or .zst).",
+    case_sensitive=True,
+)
+def export_query(cur, arg, **_):
+    """Stream the results of a query to a file, without formatting them."""
+    usage = "Syntax: \\export {} filename query.\n".format("|".join(EXPORT_FORMATS))
+
+    args = arg.split(None, 2)
+    if len(args) < 3 or args[0] not in EXPORT_FORMATS:
+        return [(None, None, None, usage)]
+
+    format_name, filename, query = args
+    compression = compression_from_filename(filename)
+    check_compression(format_name, compression)
+    cur.execute(query.rstrip(";"))
+    if not cur.description:
+        return [(None, None, None, "Query OK, nothing to export.")]
+
+    try:
+        rows, size = export_result(
+            ResultStream(cur, FETCH_SIZE),
+            filename,
+            format_name,
+            compression,
+        )
+    except (IOError, OSError) as e:
+        raise OSError("Cannot write to file '{}': {}".format(e.filename, e.strerror))
+
+    message = "Exported %d row%s (%s) to %s." % (
+        rows,
+        "" if rows == 1 else "s",
+        humanize_size(size),
+        filename,
+    )
+    return [(None, None, None, message)]
@@ -38,6 +38,13 @@ def parse_special_command(sql):
     return (command, verbose, arg.strip())
 
 
+@export
+def is_special_command(sql):
+    """Whether *sql* is a special command rather than SQL."""
+    command, _, _ = parse_special_command(sql)
+    return command in COMMANDS or command.lower() in COMMANDS
+
+
 @export
 def special_command(
     command,
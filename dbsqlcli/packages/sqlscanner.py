@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""A single pass SQL scanner for completion.
+
+Completion only needs to know the tokens around the cursor, which clause
+the cursor is in and which tables are in scope. This scanner finds those
+without building sqlparse's parse tree, which is the dominant cost of
+completion on long statements. It classifies words like sqlparse does, so
+both agree on what is a keyword.
+"""
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+from sqlparse import keywords as _keywords
+from sqlparse import tokens as _tokens
+
+KEYWORD = "keyword"
+NAME = "name"
+STRING = "string"
+NUMBER = "number"
+PUNCTUATION = "punctuation"
+OPERATOR = "operator"
+COMPARISON = "comparison"
+WILDCARD = "wildcard"
+COMMAND = "command"
+PARENTHESIS = "parenthesis"
+OTHER = "other"
+
+
+def _keyword_set():
+    words = {}
+    # The dictionaries of sqlparse's default lexer, in the same order.
+    for table in (
+        _keywords.KEYWORDS_COMMON,
+        _keywords.KEYWORDS_ORACLE,
+        _keywords.KEYWORDS_PLPGSQL,
+        _keywords.KEYWORDS_HQL,
+        _keywords.KEYWORDS_MSACCESS,
+        _keywords.KEYWORDS,
+    ):
+        for word, ttype in table.items():
+            words.setdefault(word, ttype)
+    return frozenset(word for word, ttype in words.items() if ttype in _tokens.Keyword)
+
+
+KEYWORDS = _keyword_set()
+
+_TOKEN_REGEX = re.compile(
+    r"""
+    (?P<comment>(?:--|\#\ ).*?(?:\r\n|\r|\n|$)|/\*[\s\S]*?\*/)
+    |(?P<whitespace>\s+)
+    |(?P<operator>:=)
+    |(?P<cast>::)
+    |(?P<wildcard>\*)
+    |(?P<quoted>`(?:``|[^`])*`)
+    |(?P<command>\\\w+)
+    |(?P<fixed_keyword>(?:CASE|IN|VALUES|USING|FROM|AS)\b)
+    |(?P<qualifier>[^\W\d]\w*(?=\s*\.))
+    |(?P<function>[^\W\d]\w*(?=\())
+    |(?P<number>-?\d+(?:\.\d*)?(?:E-?\d+)?(?![^\W\d])|-?\.\d+)
+    |(?P<string>'(?:''|\\'|[^'])*'|"(?:""|\\"|[^"])*")
+    |(?P<multi_keyword>
+        (?:(?:LEFT\s+|RIGHT\s+|FULL\s+)?(?:INNER\s+|OUTER\s+|STRAIGHT\s+)?
+        |(?:CROSS\s+|NATURAL\s+)?)JOIN\b
+        |END(?:\s+IF|\s+LOOP|\s+WHILE)?\b
+        |NOT\s+NULL\b
+        |NULLS\s+(?:FIRST|LAST)\b
+        |UNION\s+ALL\b
+        |CREATE(?:\s+OR\s+REPLACE)?\b
+        |GROUP\s+BY\b
+        |ORDER\s+BY\b)
+    |(?P<comparison>(?:NOT\s+)?(?:LIKE|ILIKE|RLIKE|REGEXP)\b|[<>=~!]+)
+    |(?P<word>\w[$\#\w]*)
+    |(?P<punctuation>[;:()\[\],.])
+    |(?P<arithmetic>[+/@\#%^&|-]+)
+    |(?P<other>.)
+    """,
+    re.IGNORECASE | re.VERBOSE,
+)
+
+_TOKEN_TYPES = {
+    "operator": OPERATOR,
+    "cast": PUNCTUATION,
+    "wildcard": WILDCARD,
+    "quoted": NAME,
+    "command": COMMAND,
+    "fixed_keyword": KEYWORD,
+    "qualifier": NAME,
+    "function": NAME,
+    "number": NUMBER,
+    "string": STRING,
+    "multi_keyword": KEYWORD,
+    "comparison": COMPARISON,
+    "punctuation": PUNCTUATION,
+    "arithmetic": OPERATOR,
+    "other": OTHER,
+}
+
+
+class Token(namedtuple("Token", ["type", "value", "start"])):
+    """A token of SQL text, starting at offset *start*."""
+
+    __slots__ = ()
+
+    @property
+    def is_keyword(self):
+        return self.type == KEYWORD
+
+    @property
+    def end(self):
+        return self.start + len(self.value)
+
+    @property
+    def normalized(self):
+        """The upper case value of a keyword, with single spaces."""
+        if self.type == KEYWORD:
+            return " ".join(self.value.upper().split())
+        return self.value
+
+    def match(self, *values):
+        """Whether the token is one of the keywords *values*."""
+        return self.type == KEYWORD and self.normalized in values
+
+
+@lru_cache(maxsize=32)
+def tokenize(sql):
+    """Split *sql* into a tuple of tokens, without whitespace and comments.
+
+    Tokenizing is memoized, as completion scans the same text (e.g. the text
+    before the word being typed) over and over again.
+    """
+    tokens = []
+    previous = None
+    for match in _TOKEN_REGEX.finditer(sql):
+        kind = match.lastgroup
+        if kind in ("comment", "whitespace"):
+            continue
+
+        value = match.group()
+        if kind == "word":
+            if (
+                previous is not None
+                and previous.value == "."
+                and (previous.end == match.start())
+            ):
+                # The name of e.g. a column, qualified by a table name.
+                token_type = NAME
+            elif value.upper() in KEYWORDS:
+                token_type = KEYWORD
+            else:
+                token_type = NAME
+        else:
+            token_type = _TOKEN_TYPES[kind]
+
+        previous = Token(token_type, value, match.start())
+        tokens.append(previous)
+    return tuple(tokens)
+
+
+def split_statements(tokens):
+    """Split *tokens* into lists of tokens per statement, at semicolons."""
+    statements = [[]]
+    for token in tokens:
+        statements[-1].append(token)
+        if token.value == ";":
+            statements.append([])
+    return statements
+
+
+def group_parentheses(sql, tokens):
+    """Replace the tokens between matching parentheses, including the
+    parentheses, by a single PARENTHESIS token.
+
+    Parentheses that are not closed yet are left alone, along with what
+    follows them, as is usual while a statement is being typed.
+    """
+    grouped = []
+    opened = []
+    for token in tokens:
+        if token.value == ")" and opened:
+            i = opened.pop()
+            start = grouped[i].start
+            grouped[i:] = [Token(PARENTHESIS, sql[start : token.end], start)]
+            continue
+        if token.value == "(":
+            opened.append(len(grouped))
+        grouped.append(token)
+    return grouped
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""Convert Arrow results to text column by column.
+
+The values of a column are converted to strings in one pass with Arrow
+compute or numpy, according to the Arrow type of the column, instead of one
+cell at a time. The strings are the same as `str` of the Python values the
+rows would hold. Nulls stay None, so that they are shown as the missing
+value.
+"""
+from cli_helpers.tabular_output import (
+    delimited_output_adapter,
+    tabulate_adapter,
+    tsv_output_adapter,
+    vertical_table_adapter,
+)
+
+# Formats that only ever output the text of the values, for which results can
+# be converted to text up front.
+TEXT_FORMATS = (
+    set(tabulate_adapter.supported_formats)
+    | set(delimited_output_adapter.supported_formats)
+    | set(tsv_output_adapter.supported_formats)
+    | set(vertical_table_adapter.supported_formats)
+)
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def column_to_text(column):
+    """Return the values of the Arrow *column* as a list of strings (or
+    None for nulls), or as a list of Python values if its type has no
+    columnar conversion."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.types as types
+
+    column_type = column.type
+    if types.is_string(column_type) or types.is_large_string(column_type):
+        pass
+    elif types.is_boolean(column_type):
+        column = pc.if_else(column, "True", "False")
+    elif types.is_integer(column_type) or types.is_date(column_type):
+        column = pc.cast(column, pa.string())
+    elif types.is_floating(column_type):
+        return _floats_to_text(column)
+    elif types.is_decimal(column_type):
+        # Arrow writes e.g. 1E-10 as "1.E-10".
+        column = pc.replace_substring_regex(
+            pc.cast(column, pa.string()), r"^(-?\d)\.E", r"\1E"
+        )
+    elif types.is_timestamp(column_type):
+        column = _timestamps_to_text(column)
+    return column.to_pylist()
+
+
+def _floats_to_text(column):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if isinstance(column, pa.ChunkedArray):
+        column = column.combine_chunks()
+    # numpy writes float64 values the way str() does. Smaller floats are
+    # widened first, as they are when converted to Python floats.
+    column = pc.cast(column, pa.float64())
+    text = column.fill_null(0).to_numpy(zero_copy_only=False).astype(str).tolist()
+    if column.null_count:
+        nulls = column.is_null().to_numpy(zero_copy_only=False)
+        for i in nulls.nonzero()[0]:
+            text[i] = None
+    return text
+
+
+def _timestamps_to_text(column):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    column_type = column.type
+    # Python datetimes only have microseconds.
+    column = pc.cast(column, pa.timestamp("us", column_type.tz), safe=False)
+    if column_type.tz is None:
+        text = pc.strftime(column, TIMESTAMP_FORMAT)
+    else:
+        text = pc.strftime(column, TIMESTAMP_FORMAT + "%z")
+        text = pc.replace_substring_regex(text, r"([+-]\d\d)(\d\d)$", r"\1:\2")
+    # Like str(datetime), only show the microseconds if there are any.
+    return pc.replace_substring_regex(text, r"\.000000($|[+-])", r"\1")
+
+
+def table_to_rows(table):
+    """Return the rows of the Arrow *table* as tuples of text."""
+    return list(zip(*(column_to_text(column) for column in table.columns)))
+
+
+def iter_text_windows(stream, size):
+    """Yield lists of *size* rows of text (fewer for the last one) from the
+    batches of the `ResultStream` *stream*, however many rows the batches
+    hold."""
+    import pyarrow as pa
+
+    pending = []
+    pending_rows = 0
+    for batch in stream.batches():
+        pending.append(batch)
+        pending_rows += batch.num_rows
+        if pending_rows < size:
+            continue
+
+        table = pa.concat_tables(pending)
+        offset = 0
+        while table.num_rows - offset >= size:
+            yield table_to_rows(table.slice(offset, size))
+            offset += size
+        pending = [table.slice(offset)]
+        pending_rows = table.num_rows - offset
+
+    if pending_rows:
+        yield table_to_rows(pa.concat_tables(pending))
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""Format results window by window, with memory bounded by the window size.
+
+Each window of rows is formatted on its own and the pieces are stitched
+together into one continuous table: only the header and the footer of the
+first window are kept. For table formats that align columns, the column
+widths are decided by the first window, so that all windows line up. Values
+that are wider than that in later windows widen their own lines only.
+"""
+from itertools import islice
+
+from cli_helpers.tabular_output import tabulate_adapter
+from cli_helpers.tabular_output.output_formatter import MISSING_VALUE
+
+# Formats whose column widths depend on the data.
+ALIGNED_FORMATS = set(tabulate_adapter.supported_formats) - set(
+    tabulate_adapter.supported_markup_formats
+)
+
+
+def iter_windows(rows, size):
+    """Yield lists of at most *size* rows from *rows*."""
+    rows = iter(rows)
+    while True:
+        window = list(islice(rows, size))
+        if not window:
+            return
+        yield window
+
+
+class RowTitle(object):
+    """Title for the separators of the vertical format, numbering rows from
+    *offset* + 1 instead of 1."""
+
+    def __init__(self, offset=0):
+        self.offset = offset
+
+    def format(self, n):
+        return "{}. row".format(n + self.offset)
+
+
+def _lines(formatted):
+    if isinstance(formatted, str):
+        return formatted.splitlines()
+    return list(formatted)
+
+
+def _common_prefix_length(a, b):
+    n = 0
+    while n < min(len(a), len(b)) and a[n] == b[n]:
+        n += 1
+    return n
+
+
+def _pin_widths(rows, headers, missing_value=MISSING_VALUE):
+    """Pad *headers* to the width of the widest value in their column, which
+    forces the column to (at least) that width in every window."""
+    widths = [len(h) for h in headers]
+    for row in rows:
+        for i, value in enumerate(row):
+            if value is None:
+                value = missing_value
+            width = max(len(line) for line in str(value).splitlines() or [""])
+            if width > widths[i]:
+                widths[i] = width
+    return [h.ljust(w) for h, w in zip(headers, widths)]
+
+
+def _table_frame(render, columns):
+    """Find the number of header and footer lines of a table format and the
+    lines it puts between rows, by formatting two one-row probe tables."""
+    a, b = ["a"] * columns, ["b"] * columns
+    table_a, table_b, table_ab = render([a]), render([b]), render([a, b])
+
+    head = _common_prefix_length(table_a, table_b)
+    foot = _common_prefix_length(table_a[head:][::-1], table_b[head:][::-1])
+    row = len(table_a) - head - foot
+    separator = table_ab[head + row : len(table_ab) - foot - row]
+    return head, separator, foot
+
+
+def _row_layout(render, widths, head, foot):
+    """Return a function that lays out a window of rows of text as *render*
+    would, by padding the values of each column to its width in *widths*.
+    Returns None if the format cannot be laid out that way.
+
+    The function returns None for windows whose values do not all fit their
+    column on a single line, which have to be rendered instead.
+    """
+    # Find where each column goes in rows of values as wide as the column.
+    fillers = ["ab"[i % 2] * width for i, width in enumerate(widths)]
+    table = render([fillers, fillers])
+    rows = table[head : len(table) - foot]
+    if len(rows) < 2 or rows[0] != rows[-1] or not all(fillers):
+        return None
+    line, separator = rows[0], rows[1:-1]
+    pieces, position = [], 0
+    for filler in fillers:
+        start = line.find(filler, position)
+        if start < 0:
+            return None
+        pieces.append(line[position:start])
+        position = start + len(filler)
+    pieces.append(line[position:])
+
+    def layout(window):
+        lines = []
+        for row in window:
+            if lines:
+                lines.extend(separator)
+            cells = []
+            for piece, value, width in zip(pieces, row, widths):
+                if (
+                    type(value) is not str
+                    or len(value) > width
+                    or not (value.isascii() and value.isprintable())
+                ):
+                    return None
+                cells.append(piece)
+                cells.append(value.ljust(width))
+            cells.append(pieces[-1])
+            lines.append("".join(cells))
+        return lines
+
+    # Check the layout against the format, with values that are shorter than
+    # their column too.
+    probe = [
+        ["c" * (width // 2) for width in widths],
+        ["d" * width for width in widths],
+    ]
+    table = render(probe)
+    if layout(probe) != table[head : len(table) - foot]:
+        return None
+    return layout
+
+
+def _window_widths(window, widths):
+    """The width of each column of a *window* of rows of text, which is at
+    least the one in *widths*, or None if not all values are text."""
+    widths = list(widths)
+    for row in window:
+        for i, value in enumerate(row):
+            if type(value) is not str:
+                return None
+            if len(value) > widths[i]:
+                widths[i] = len(value)
+    return tuple(widths)
+
+
+def format_windows(formatter, windows, headers, format_name, **kwargs):
+    """Format an iterator of row *windows* as a single table, one window at a
+    time. Yields the lines of the table.
+
+    The next window is only taken from *windows* once all lines of the
+    previous one have been consumed.
+    """
+    if format_name == "vertical":
+        offset = 0
+        for window in windows:
+            formatted = formatter.format_output(
+                window,
+                headers,
+                format_name=format_name,
+                sep_title=RowTitle(offset),
+                **kwargs
+            )
+            for line in _lines(formatted):
+                yield line
+            offset += len(window)
+        return
+
+    first = next(windows, None)
+    if first is None:
+        return
+
+    if format_name in ALIGNED_FORMATS:
+        headers = _pin_widths(
+            first, headers, kwargs.get("missing_value", MISSING_VALUE)
+        )
+
+    def render(rows):
+        return _lines(
+            formatter.format_output(rows, headers, format_name=format_name, **kwargs)
+        )
+
+    head, separator, foot = _table_frame(render, len(headers))
+
+    lines = render(first)
+    for line in lines[: len(lines) - foot]:
+        yield line
+
+    # The footer closes the table with the widths of the header, whatever
+    # the widths of the last window.
+    footer = lines[len(lines) - foot :]
+    # Rows of text are laid out without rendering them, with the layout for
+    # the widths of their window.
+    layouts = {}
+    missing_value = kwargs.get("missing_value", MISSING_VALUE)
+    pinned_widths = [len(h) for h in headers]
+
+    for window in windows:
+        rows = None
+        if format_name in ALIGNED_FORMATS:
+            window = [
+                [missing_value if value is None else value for value in row]
+                for row in window
+            ]
+            widths = _window_widths(window, pinned_widths)
+            if widths is not None and widths not in layouts:
+                layouts[widths] = _row_layout(render, widths, head, foot)
+            if layouts.get(widths) is not None:
+                rows = layouts[widths](window)
+        if rows is None:
+            lines = render(window)
+            rows = lines[head : len(lines) - foot]
+        for line in separator + rows:
+            yield line
+
+    for line in footer:
+        yield line
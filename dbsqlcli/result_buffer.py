@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+import logging
+from collections import OrderedDict, namedtuple
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_RESULTS = 10
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+
+# A result kept in a `ResultBuffer`, with its rows in an Arrow table.
+KeptResult = namedtuple("KeptResult", ["number", "query", "title", "headers", "table"])
+
+
+class ResultBuffer(object):
+    """The results of the last statements, kept in memory as Arrow tables.
+
+    Results are numbered in the order they were added. At most
+    `max_results` of them, taking at most `max_bytes`, are kept: the least
+    recently used are removed first.
+    """
+
+    def __init__(self, max_results=DEFAULT_MAX_RESULTS, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_results = max_results
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._results = OrderedDict()
+        self._count = 0
+
+    def add(self, query, title, headers, table):
+        """Keep the result *table* of *query*."""
+        if table.nbytes > self.max_bytes:
+            return
+        self._count += 1
+        self._results[self._count] = KeptResult(
+            self._count, query, title, headers, table
+        )
+        self.size += table.nbytes
+        while len(self._results) > self.max_results or self.size > self.max_bytes:
+            _, result = self._results.popitem(last=False)
+            self.size -= result.table.nbytes
+            _logger.debug("Dropped kept result #%d.", result.number)
+
+    def get(self, n=1):
+        """Return the *n*-th last result that is still kept, or None."""
+        numbers = sorted(self._results, reverse=True)
+        if not 0 < n <= len(numbers):
+            return None
+        result = self._results[numbers[n - 1]]
+        self._results.move_to_end(result.number)
+        return result
+
+    def __len__(self):
+        return len(self._results)
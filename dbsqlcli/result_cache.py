@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+
+import sqlparse
+
+from dbsqlcli.config import mkdir_p
+from dbsqlcli.results import arrow_to_rows
+from dbsqlcli.packages.parseutils import is_read_only, is_session_statement
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = "~/.dbsqlcli/result_cache"
+DEFAULT_TTL = 5 * 60
+SUFFIX = ".arrow"
+COMPRESSION = "zstd"
+DIRECTORY_MODE = 0o700
+FILE_MODE = 0o600
+# Keys of the schema metadata of a cached result.
+DESCRIPTION = b"dbsqlcli.description"
+CREATED = b"dbsqlcli.created"
+
+
+def normalize(sql):
+    """Return *sql* without comments, with upper case keywords and without
+    redundant whitespace, so that equivalent statements share a cache
+    entry."""
+    return sqlparse.format(
+        sql, strip_comments=True, keyword_case="upper", strip_whitespace=True
+    ).strip()
+
+
+def cached_status(status, cached_at):
+    """Wrap the *status* callable of a result that was saved in the cache at
+    *cached_at*, to say how old it is."""
+    age = time.time() - cached_at
+
+    def status_of_cached_result():
+        return "%s (cached %ds ago)" % (status(), age)
+
+    return status_of_cached_result
+
+
+class ResultCache(object):
+    """Results of read-only statements persisted on disk, one compressed
+    Arrow file per warehouse, schema, session state and statement.
+
+    Entries older than `ttl` seconds are ignored. Once the entries take more
+    than `max_bytes` on disk, the least recently used ones are removed.
+    """
+
+    def __init__(self, max_bytes, directory=DEFAULT_CACHE_DIR, ttl=DEFAULT_TTL):
+        self.max_bytes = max_bytes
+        self.directory = os.path.expanduser(directory)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def warehouse_prefix(self, executor):
+        """The prefix of the names of the entries of *executor*'s warehouse."""
+        key = "|".join((executor.hostname or "", executor.http_path or ""))
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16] + "-"
+
+    def prefix(self, executor):
+        """The prefix of the names of the entries of *executor*'s warehouse
+        and credentials, so that users with different grants never share
+        results."""
+        identity = "|".join(
+            (
+                getattr(executor, "auth_type", None) or "",
+                getattr(executor, "access_token", None) or "",
+            )
+        )
+        digest = hashlib.sha1(identity.encode("utf-8")).hexdigest()[:16]
+        return self.warehouse_prefix(executor) + digest + "-"
+
+    def path(self, executor, statement):
+        key = "\n".join([executor.database] + executor.session + [statement])
+        name = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, self.prefix(executor) + name + SUFFIX)
+
+    def load(self, path):
+        """Return the (table, description, created) of the entry at *path*,
+        or None if there is no usable entry."""
+        import pyarrow as pa
+
+        try:
+            with pa.OSFile(path) as source:
+                table = pa.ipc.open_file(source).read_all()
+        except (IOError, OSError, pa.ArrowException):
+            self._count(hit=False)
+            return None
+
+        metadata = table.schema.metadata or {}
+        created = float(metadata.get(CREATED, 0))
+        if time.time() - created > self.ttl:
+            _logger.debug("Result cache entry %r expired.", path)
+            self._remove(path)
+            self._count(hit=False)
+            return None
+
+        try:
+            # Touch the entry, which is what least recently used means here.
+            os.utime(path)
+        except OSError:
+            pass
+        self._count(hit=True)
+        description = [tuple(column) for column in json.loads(metadata[DESCRIPTION])]
+        return table.replace_schema_metadata(None), description, created
+
+    def save(self, path, table, description):
+        """Persist the result *table* of a statement, with the *description*
+        of its cursor, at *path*."""
+        import pyarrow as pa
+
+        table = table.replace_schema_metadata(
+            {
+                DESCRIPTION: json.dumps(description, default=str),
+                CREATED: repr(time.time()),
+            }
+        )
+        options = pa.ipc.IpcWriteOptions(
+            compression=COMPRESSION if pa.Codec.is_available(COMPRESSION) else None
+        )
+        tmp_path = "{}.{}.tmp".format(path, os.getpid())
+        try:
+            # Results are only readable by the user who ran the statement.
+            mkdir_p(self.directory, DIRECTORY_MODE)
+            os.chmod(self.directory, DIRECTORY_MODE)
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, FILE_MODE)
+            with os.fdopen(fd, "wb") as sink:
+                with pa.ipc.new_file(sink, table.schema, options=options) as writer:
+                    writer.write_table(table)
+            # Replace atomically, so readers never see a partial file.
+            os.replace(tmp_path, path)
+        except (IOError, OSError, pa.ArrowException) as e:
+            _logger.warning("Cannot write result cache %r: %r", path, e)
+            self._remove(tmp_path)
+            return
+        self.evict()
+
+    def entries(self, prefix=""):
+        """Return the (last used, size, path) of the entries whose names
+        start with *prefix*."""
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+
+        entries = []
+        for name in names:
+            if not (name.startswith(prefix) and name.endswith(SUFFIX)):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits in
+        `max_bytes`."""
+        entries = sorted(self.entries())
+        size = sum(entry[1] for entry in entries)
+        for _, entry_size, path in entries:
+            if size <= self.max_bytes:
+                break
+            self._remove(path)
+            size -= entry_size
+
+    def invalidate(self, executor):
+        """Remove the entries of *executor*'s warehouse, whichever credentials
+        they were saved with."""
+        for _, _, path in self.entries(self.warehouse_prefix(executor)):
+            self._remove(path)
+
+    def flush(self):
+        """Remove all the entries. Returns how many there were."""
+        entries = self.entries()
+        for _, _, path in entries:
+            self._remove(path)
+        return len(entries)
+
+    def stats(self):
+        """Return the number of entries, their size on disk, and the hits and
+        misses of this session."""
+        entries = self.entries()
+        return {
+            "entries": len(entries),
+            "bytes": sum(entry[1] for entry in entries),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def cursor(self, cursor, executor):
+        """Wrap *cursor*, on a connection of *executor*, with this cache."""
+        return CachingCursor(self, cursor, executor)
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class CachingCursor(object):
+    """A cursor that serves the results of read-only statements from a
+    `ResultCache`, and saves those it fetches to it.
+
+    A result is only saved once it has been fetched completely, as Arrow
+    tables. Statements that change the session are recorded in the
+    executor's `session`, which is part of the key of an entry. Any other
+    statement may write, so it invalidates the entries of the warehouse.
+    """
+
+    def __init__(self, cache, cursor, executor):
+        self.cache = cache
+        self.cursor = cursor
+        self.executor = executor
+        self.description = None
+        # The time the result being served from the cache was saved, or None.
+        self.cached_at = None
+        self._table = None
+        self._position = 0
+        self._path = None
+        self._batches = None
+        self._size = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+    def execute(self, operation, parameters=None, bypass_cache=False):
+        """Execute *operation*, or serve its result from the cache. With
+        *bypass_cache*, a cached result is not used, but the fresh result
+        replaces it."""
+        self.cached_at = self._table = self._path = self._batches = None
+        self._position = self._size = 0
+
+        if parameters is None and is_read_only(operation):
+            self._path = self.cache.path(self.executor, normalize(operation))
+            entry = None if bypass_cache else self.cache.load(self._path)
+            if entry is not None:
+                _logger.debug("Serving %r from the result cache.", operation)
+                self._table, self.description, self.cached_at = entry
+                return self
+            self._batches = []
+        elif is_session_statement(operation):
+            self.executor.session.append(normalize(operation))
+        else:
+            self.cache.invalidate(self.executor)
+
+        if parameters is None:
+            self.cursor.execute(operation)
+        else:
+            self.cursor.execute(operation, parameters)
+        self.description = self.cursor.description
+        if self.description is None:
+            self._batches = None
+        return self
+
+    def _record(self, batch, last=False):
+        if self._batches is None:
+            return
+        self._batches.append(batch)
+        self._size += batch.nbytes
+        if self._size > self.cache.max_bytes:
+            _logger.debug("Result too large for the result cache.")
+            self._batches = None
+        elif last:
+            import pyarrow as pa
+
+            self.cache.save(
+                self._path, pa.concat_tables(self._batches), self.description
+            )
+            self._batches = None
+
+    def fetchmany_arrow(self, size):
+        if self.cached_at is not None:
+            batch = self._table.slice(self._position, size)
+            self._position += batch.num_rows
+            return batch
+        batch = self.cursor.fetchmany_arrow(size)
+        self._record(batch, last=batch.num_rows == 0)
+        return batch
+
+    def fetchall_arrow(self):
+        if self.cached_at is not None:
+            return self.fetchmany_arrow(self._table.num_rows)
+        table = self.cursor.fetchall_arrow()
+        self._record(table, last=True)
+        return table
+
+    def fetchmany(self, size):
+        if self.cached_at is not None:
+            return list(arrow_to_rows(self.fetchmany_arrow(size)))
+        # Rows fetched this way are not recorded.
+        self._batches = None
+        return self.cursor.fetchmany(size)
+
+    def fetchall(self):
+        return list(arrow_to_rows(self.fetchall_arrow()))
+
+    def cancel(self):
+        self.cursor.cancel()
+
+    def close(self):
+        self._table = self._batches = None
+        self.cursor.close()
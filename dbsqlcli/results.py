@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+import logging
+
+from dbsqlcli.packages.format_utils import format_status
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FETCH_SIZE = 10000
+
+
+def arrow_to_rows(table):
+    """Convert an Arrow table (or record batch) to row tuples.
+
+    Values are converted column by column, which is much cheaper than the
+    connector's per-row `Row` objects.
+    """
+    return zip(*(column.to_pylist() for column in table.columns))
+
+
+class ResultStream(object):
+    """A lazily fetched query result.
+
+    Results are pulled from the cursor with ``fetchmany_arrow`` as Arrow
+    tables of up to ``fetch_size`` rows, so at most one batch is held in
+    memory at any time no matter how large the result set is. The number of
+    rows seen so far is tracked in ``rowcount`` and the Arrow schema of the
+    result in ``schema``, once the first batch has been fetched.
+
+    Consumers that can work on columnar data (e.g. exporters) should use
+    `batches`. Iterating over the stream yields row tuples, which are only
+    built for the rows that are actually consumed.
+
+    If a `StatementTiming` is given, fetches are timed and counted in it.
+    """
+
+    def __init__(self, cursor, fetch_size=DEFAULT_FETCH_SIZE, timing=None):
+        self.cursor = cursor
+        self.description = cursor.description
+        self.fetch_size = fetch_size
+        self.timing = timing
+        self.rowcount = 0
+        self.schema = None
+        self._buffer = []
+        self._buffered_rows = 0
+        self._exhausted = False
+        self._retained = None
+        self._retained_bytes = 0
+        self._max_retained_bytes = 0
+
+    def _fetch(self):
+        if self._exhausted:
+            return None
+
+        if self.timing is None:
+            batch = self.cursor.fetchmany_arrow(self.fetch_size)
+        else:
+            with self.timing.phase("fetch"):
+                batch = self.cursor.fetchmany_arrow(self.fetch_size)
+        self.schema = batch.schema
+        if batch.num_rows == 0:
+            self._exhausted = True
+            return None
+        self.rowcount += batch.num_rows
+        if self.timing is not None:
+            self.timing.add_batch(batch)
+        return batch
+
+    def prefetch(self, n):
+        """Buffer at least *n* rows (if available) without consuming them.
+
+        Returns the number of rows buffered. This is used to peek at the
+        size of a result, e.g. to ask for confirmation on large results.
+        """
+        while self._buffered_rows < n:
+            batch = self._fetch()
+            if batch is None:
+                break
+            self._buffer.append(batch)
+            self._buffered_rows += batch.num_rows
+        return self._buffered_rows
+
+    def batches(self):
+        """Yield the remaining results as Arrow tables."""
+        while True:
+            if self._buffer:
+                batch = self._buffer.pop(0)
+                self._buffered_rows -= batch.num_rows
+            else:
+                batch = self._fetch()
+            if batch is None:
+                return
+            if self._retained is not None:
+                self._retain(batch)
+            yield batch
+
+    def retain(self, max_bytes):
+        """Keep the batches that are consumed from now on, as long as they
+        take at most *max_bytes*, so that the whole result can be kept with
+        `retained` once it has been consumed."""
+        self._retained = []
+        self._retained_bytes = 0
+        self._max_retained_bytes = max_bytes
+
+    def _retain(self, batch):
+        self._retained_bytes += batch.nbytes
+        if self._retained_bytes > self._max_retained_bytes:
+            logger.debug("Result too large to be kept.")
+            self._retained = None
+        else:
+            self._retained.append(batch)
+
+    def retained(self):
+        """The result as a single Arrow table, if it was retained and has been
+        consumed completely, or None."""
+        if self._retained is None or not self._exhausted or self._buffer:
+            return None
+
+        import pyarrow as pa
+
+        if not self._retained:
+            return self.schema.empty_table()
+        return pa.concat_tables(self._retained).combine_chunks()
+
+    def status(self):
+        """The status line for the rows fetched so far."""
+        return format_status(rows_length=self.rowcount)
+
+    def __bool__(self):
+        return self.prefetch(1) > 0
+
+    def __iter__(self):
+        for batch in self.batches():
+            for row in arrow_to_rows(batch):
+                yield row
@@ -1,15 +1,37 @@
 # encoding: utf-8
 from typing import Optional
+import re
+import copy
 import logging
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FutureTimeoutError
 import sqlparse, click
 from databricks import sql as dbsql
 
 from dbsqlcli.packages import special
 from dbsqlcli.packages.format_utils import format_status
-from databricks.sql.exc import RequestError
+from dbsqlcli.packages.parseutils import (
+    has_barrier_marker,
+    is_barrier,
+    is_session_statement,
+)
+from dbsqlcli.results import ResultStream, DEFAULT_FETCH_SIZE
+from dbsqlcli.timing import StatementTiming
+from dbsqlcli.execution import (
+    CANCELLED,
+    CANCELLING,
+    FAILED,
+    FINISHED,
+    Execution,
+    QueryCancelled,
+)
+from dbsqlcli.result_cache import CachingCursor, cached_status
+from dbsqlcli.connection_pool import ConnectionPool, KEEPALIVE_INTERVAL
+from databricks.sql.exc import RequestError, ServerOperationError
 
 from databricks.sql.experimental.oauth_persistence import OAuthPersistence, OAuthToken
-from databricks.sql.auth.auth import AuthType
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +42,8 @@ USER_AGENT_STRING = f"DBSQLCLI/{CURRENT_VERSION}"
 DBSQL_CLI_OAUTH_CLIENT_ID = "databricks-cli"
 DBSQL_CLI_OAUTH_PORT = 8020
 
+DEFAULT_METADATA_WORKERS = 4
+
 
 class OAuthPersistenceCache(OAuthPersistence):
     def __init__(self):
@@ -35,20 +59,97 @@ class OAuthPersistenceCache(OAuthPersistence):
 oauth_token_cache = OAuthPersistenceCache()
 
 
+def _execute(cursor, sql):
+    cursor.execute(sql)
+
+
 class SQLExecute(object):
     DATABASES_QUERY = "SHOW DATABASES"
-
-    def __init__(self, hostname, http_path, access_token, database, auth_type=None):
+    # Seconds between progress reports while a statement executes.
+    PROGRESS_INTERVAL = 0.1
+    # Tables, columns and functions of a schema in a single round trip. Only
+    # available on Unity Catalog. Schema names are not case sensitive.
+    SCHEMA_METADATA_QUERY = """
+        {relations}
+        UNION ALL
+        SELECT 'function' AS kind, routine_name AS name, NULL, 0
+        FROM information_schema.routines
+        WHERE lower(routine_schema) = lower(%(schema)s)
+        ORDER BY kind, name, ordinal_position
+    """
+    SCHEMA_COLUMNS = """
+        SELECT 'column' AS kind, table_name AS name, column_name, ordinal_position
+        FROM information_schema.columns
+        WHERE lower(table_schema) = lower(%(schema)s)
+    """
+    SCHEMA_TABLES = """
+        SELECT 'table' AS kind, table_name AS name, NULL AS column_name,
+            0 AS ordinal_position
+        FROM information_schema.tables
+        WHERE lower(table_schema) = lower(%(schema)s)
+    """
+    # Errors of the schema metadata query that mean information_schema cannot
+    # be used, as opposed to failing this time.
+    SCHEMA_METADATA_UNAVAILABLE = re.compile(
+        r"NOT_FOUND|not found|does not exist|PERMISSION|permission|"
+        r"UC_NOT_ENABLED|Unity Catalog",
+    )
+
+    def __init__(
+        self,
+        hostname,
+        http_path,
+        access_token,
+        database,
+        auth_type=None,
+        fetch_size=DEFAULT_FETCH_SIZE,
+        metadata_workers=DEFAULT_METADATA_WORKERS,
+        keepalive_interval=KEEPALIVE_INTERVAL,
+        result_cache=None,
+    ):
         self.hostname = hostname
         self.http_path = http_path
         self.access_token = access_token
         self.database = database or "default"
         self.auth_type = auth_type
+        self.fetch_size = fetch_size
+        self.metadata_workers = metadata_workers
+        self.information_schema_available = True
+        # A `ResultCache` for the results of read-only statements, if enabled.
+        self.result_cache = result_cache
+        # The statements that changed the state of the current session.
+        self.session = []
+        # The timing of the statement whose result was yielded last by `run`,
+        # if timing is verbose.
+        self.statement_timing = None
+        # The statement executing on the server, or the one that executed
+        # last, and a callable that is passed it while it executes.
+        self.execution = None
+        self.on_progress = None
+        self._worker = None
+        # Sessions for the completion refresher and other background work.
+        self.pool = ConnectionPool(
+            self.open_connection, keepalive_interval=keepalive_interval
+        )
 
         self.connect(database=self.database)
 
     def connect(self, database=None):
-        self.close_connection()
+        self._close_session()
+
+        # Take a warm session from the pool if there is one. It is not returned
+        # to the pool, as statements like USE change the state of the session.
+        conn = self.pool.acquire(database)
+
+        self.database = database or self.database
+        self.session = []
+
+        self.conn = conn
+
+    def open_connection(self, database=None):
+        """Open a new connection with this executor's credentials."""
+        # The auth module pulls in requests, which connecting imports anyway.
+        from databricks.sql.auth.auth import AuthType
 
         oauth_params = {}
         if self.auth_type == AuthType.DATABRICKS_OAUTH.value:
@@ -59,7 +160,7 @@ class SQLExecute(object):
                 "oauth_redirect_port": DBSQL_CLI_OAUTH_PORT,
             }
 
-        conn = dbsql.connect(
+        return dbsql.connect(
             server_hostname=self.hostname,
             http_path=self.http_path,
             access_token=self.access_token,
@@ -68,16 +169,17 @@ class SQLExecute(object):
             **oauth_params,
         )
 
-        self.database = database or self.database
-
-        self.conn = conn
-
     def reconnect(self):
 
-        self.close_connection()
+        self._close_session()
         self.connect(database=self.database)
 
     def close_connection(self):
+        """Close any open connection, and the idle connections of the pool"""
+        self._close_session()
+        self.pool.close()
+
+    def _close_session(self):
         """Close any open connection and remove the `conn` attribute"""
 
         if not hasattr(self, "conn"):
@@ -95,11 +197,27 @@ class SQLExecute(object):
         finally:
             delattr(self, "conn")
 
+    @contextmanager
+    def borrowed(self):
+        """Yield a copy of this executor that runs on a connection borrowed
+        from the pool, for use in a background thread.
+
+        The connection is returned to the pool afterwards, or recycled if it
+        raised a `RequestError`.
+        """
+        executor = copy.copy(self)
+        with self.pool.connection(self.database) as conn:
+            executor.conn = conn
+            yield executor
+        self.information_schema_available = executor.information_schema_available
+
     def run(self, statement):
         """Execute the sql in the database and return the results.
 
         The results are a list of tuples. Each tuple has 4 values
-        (title, rows, headers, status).
+        (title, rows, headers, status). The rows of a result must be consumed
+        before advancing to the next result, as they are streamed from the
+        cursor.
         """
         # Remove spaces and EOL
 
@@ -119,17 +237,20 @@ class SQLExecute(object):
                 special.set_expanded_output(True)
                 sql = sql[:-2].strip()
 
+            self.statement_timing = None
             attempts = 0
             while attempts in [0, 1]:
-                with self.conn.cursor() as cur:
+                with self._cursor(self.conn.cursor()) as cur:
                     try:
                         try:
                             for result in special.execute(cur, sql):
                                 yield result
                             break
                         except special.CommandNotFound:  # Regular SQL
-                            cur.execute(sql)
-                            yield self.get_result(cur)
+                            self.statement_timing = self._execute(
+                                cur, sql, cancellable=True
+                            )
+                            yield self.get_result(cur, self.statement_timing)
                             break
                     except EOFError as e:  # User enters `exit`
                         raise e
@@ -140,22 +261,231 @@ class SQLExecute(object):
                         attempts += 1
                         self.reconnect()
 
-    def get_result(self, cursor):
-        """Get the current result's data from the cursor."""
+    def run_parallel(self, statement, workers):
+        """Execute the statements of a script, up to *workers* of them at a
+        time, and return their results in statement order, like `run`.
+
+        Statements run on connections of a pool of their own. Barriers, i.e.
+        special commands and statements that change the session or the
+        schema, run on this executor's connection instead, once the
+        statements before them have finished and before the statements after
+        them start. A `-- barrier` comment line before a statement makes it
+        wait for the statements before it too. Statements that change the
+        session, like USE and SET, are replayed on the pooled connections.
+
+        If a statement fails, up to *workers* - 1 statements after it may
+        have run already.
+        """
+        pool = ConnectionPool(self.open_connection, size=workers, keepalive_interval=0)
+        threads = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="parallel_run"
+        )
+        session = []  # Statements to replay on every pooled connection.
+        replayed = {}  # The number of them that ran on each connection.
+        pending = deque()
+
+        def execute(sql, session):
+            conn = pool.acquire(self.database)
+            cursor = conn.cursor()
+            try:
+                for session_sql in session[replayed.get(conn, 0) :]:
+                    cursor.execute(session_sql)
+                replayed[conn] = len(session)
+                cursor = self._cursor(cursor)
+                timing = self._execute(cursor, sql)
+                result = self.get_result(cursor, timing)
+                if result[1] is not None:
+                    # Fetch the first batch while waiting for our turn.
+                    result[1].prefetch(1)
+                return conn, cursor, timing, result
+            except Exception:
+                cursor.close()
+                pool.discard(conn)
+                raise
+
+        def results(future):
+            conn, cursor, timing, result = future.result()
+            try:
+                self.statement_timing = timing
+                yield result
+            finally:
+                cursor.close()
+                pool.release(conn, self.database)
+
+        try:
+            for sql in sqlparse.split(statement.strip()):
+                sql = sql.rstrip(";")
+                stripped = sqlparse.format(sql, strip_comments=True).strip()
+                if not stripped:
+                    continue
+
+                barrier = (
+                    is_barrier(stripped)
+                    or special.is_special_command(stripped)
+                    or stripped.endswith("\\G")
+                )
+                if barrier or has_barrier_marker(sql):
+                    while pending:
+                        for result in results(pending.popleft()):
+                            yield result
+
+                if barrier:
+                    for result in self.run(sql):
+                        yield result
+                    if is_session_statement(stripped):
+                        session.append(stripped)
+                    continue
+
+                pending.append(threads.submit(execute, sql, tuple(session)))
+                if len(pending) == workers:
+                    for result in results(pending.popleft()):
+                        yield result
+
+            while pending:
+                for result in results(pending.popleft()):
+                    yield result
+        finally:
+            for future in pending:
+                if future.cancel():
+                    continue
+                try:
+                    conn, cursor, _, _ = future.result()
+                except Exception:
+                    continue
+                cursor.close()
+                pool.discard(conn)
+            threads.shutdown(wait=True)
+            pool.close()
+
+    def _cursor(self, cursor):
+        """Return *cursor*, wrapped with the result cache if it is enabled."""
+        if self.result_cache is None:
+            return cursor
+        return self.result_cache.cursor(cursor, self)
+
+    def _execute(self, cursor, sql, cancellable=False):
+        """Execute *sql* on *cursor*. Returns its `StatementTiming` if timing
+        is verbose.
+
+        If *cancellable*, the statement executes on a worker thread, so that
+        Ctrl-C can cancel it on the server while it runs.
+        """
+        execute = self._execute_cancellable if cancellable else _execute
+        if not special.is_timing_verbose():
+            execute(cursor, sql)
+            return None
+
+        timing = StatementTiming(sql)
+        with timing.phase("execute"):
+            execute(cursor, sql)
+        return timing
+
+    def _execute_cancellable(self, cursor, sql):
+        """Execute *sql* on a worker thread, reporting its progress to
+        `on_progress` while waiting for it. On Ctrl-C, the statement is
+        cancelled on the server and `QueryCancelled` is raised."""
+        if self._worker is None:
+            self._worker = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="execute"
+            )
+
+        execution = self.execution = Execution(sql)
+        future = self._worker.submit(cursor.execute, sql)
+        try:
+            while True:
+                try:
+                    future.result(timeout=self.PROGRESS_INTERVAL)
+                    break
+                except FutureTimeoutError:
+                    self._report_progress(execution)
+        except KeyboardInterrupt:
+            execution.state = CANCELLING
+            self._report_progress(execution)
+            logger.debug("Cancelling %r.", sql)
+            cursor.cancel()
+            # The statement fails on the worker once it has been cancelled.
+            try:
+                future.result()
+            except Exception as e:
+                logger.debug("Cancelled statement raised: %r", e)
+            execution.finish(CANCELLED)
+            self._report_progress(execution)
+            raise QueryCancelled("Query cancelled after %0.03fs." % execution.elapsed)
+        except Exception:
+            execution.finish(FAILED)
+            self._report_progress(execution)
+            raise
+
+        execution.finish(FINISHED)
+        self._report_progress(execution)
+
+    def _report_progress(self, execution):
+        if self.on_progress is not None:
+            self.on_progress(execution)
+
+    def get_result(self, cursor, timing=None):
+        """Get the current result's data from the cursor.
+
+        Rows are returned as a lazy `ResultStream`, whose fetches are timed in
+        *timing* if given. Its row count is only known once it has been
+        consumed, so the status is returned as a callable to be evaluated
+        after the rows have been output.
+        """
         title = headers = None
 
         # cursor.description is not None for queries that return result sets,
         # e.g. SELECT or SHOW.
         if cursor.description is not None:
             headers = [x[0] for x in cursor.description]
-            rows = cursor.fetchall()
-            status = format_status(rows_length=len(rows), cursor=cursor)
+            rows = ResultStream(cursor, self.fetch_size, timing)
+            status = rows.status
+            if isinstance(cursor, CachingCursor) and cursor.cached_at is not None:
+                status = cached_status(status, cursor.cached_at)
         else:
             logger.debug("No rows in result.")
             rows = None
-            status = format_status(rows_length=None, cursor=cursor)
+            status = format_status(rows_length=None)
         return (title, rows, headers, status)
 
+    def schema_metadata(self, columns=True):
+        """Returns the (tables, columns, functions) of the current schema,
+        read from information_schema in one query. tables and functions are
+        lists of names, columns a list of (table_name, column_name) tuples.
+        Without *columns*, e.g. when they are loaded lazily, the columns are
+        not read and the list is empty.
+
+        Returns None if information_schema is not available, or cannot be
+        read, in which case `tables` and `table_columns` have to be used
+        instead. Other errors are raised.
+        """
+        if not self.information_schema_available:
+            return None
+
+        try:
+            with self.conn.cursor() as cur:
+                query = self.SCHEMA_METADATA_QUERY.format(
+                    relations=self.SCHEMA_COLUMNS if columns else self.SCHEMA_TABLES
+                )
+                cur.execute(query, {"schema": self.database})
+                data = cur.fetchall()
+        except ServerOperationError as e:
+            if not self.SCHEMA_METADATA_UNAVAILABLE.search(str(e)):
+                raise
+            logger.debug(f"information_schema is not available: {e}")
+            self.information_schema_available = False
+            return None
+
+        tables, table_columns, functions = [], [], []
+        for kind, name, column_name, _ in data:
+            if kind == "function":
+                functions.append(name)
+                continue
+            if not tables or tables[-1] != name:
+                tables.append(name)
+            if kind == "column":
+                table_columns.append((name, column_name))
+        return tables, table_columns, functions
+
     def tables(self):
         """Yields table names."""
 
@@ -168,19 +498,25 @@ class SQLExecute(object):
             yield (row,)
 
     def table_columns(self, tables):
-        """Yields column names."""
+        """Yields column names.
+
+        For large schemas the columns are fetched table by table, on up to
+        `metadata_workers` connections in parallel. The columns of each table
+        are yielded as soon as they arrive.
+        """
 
         TABLE_NAME = 2
         COLUMN_NAME = 3
 
-        _all_tables = [i for i in self.tables()]
-
-        with self.conn.cursor() as cur:
-            if len(_all_tables) < 100:
+        if len(tables) < 100:
+            with self.conn.cursor() as cur:
                 data = cur.columns(schema_name=self.database).fetchall()
                 _columns = [(i[TABLE_NAME], i[COLUMN_NAME]) for i in data]
-            else:
-                _columns = []
+        elif self.metadata_workers > 1:
+            _columns = self._parallel_table_columns(tables)
+        else:
+            _columns = []
+            with self.conn.cursor() as cur:
                 for table in tables:
                     try:
                         data = cur.columns(
@@ -195,6 +531,49 @@ class SQLExecute(object):
             if row[0] in tables:
                 yield row[0], row[1]
 
+    def _parallel_table_columns(self, tables):
+        """Yields (table, column) tuples, fetching the columns of *tables* on a
+        bounded pool of connections."""
+
+        TABLE_NAME = 2
+        COLUMN_NAME = 3
+
+        # Connections are not thread safe, so every worker borrows its own.
+        def fetch(table):
+            with self.pool.connection(self.database) as conn:
+                with conn.cursor() as cur:
+                    data = cur.columns(
+                        schema_name=self.database, table_name=table
+                    ).fetchall()
+                    return [(i[TABLE_NAME], i[COLUMN_NAME]) for i in data]
+
+        pool = ThreadPoolExecutor(
+            max_workers=self.metadata_workers, thread_name_prefix="table_columns"
+        )
+        futures = {pool.submit(fetch, table): table for table in tables}
+        try:
+            for future in as_completed(futures):
+                try:
+                    for row in future.result():
+                        yield row
+                except Exception as e:
+                    logger.debug(f"Error fetching columns for {futures[future]}: {e}")
+        finally:
+            for future in futures:
+                future.cancel()
+            pool.shutdown(wait=True)
+
+    def columns(self, table, schema=None):
+        """Returns the column names of a single table."""
+
+        COLUMN_NAME = 3
+
+        with self.conn.cursor() as cur:
+            data = cur.columns(
+                schema_name=schema or self.database, table_name=table
+            ).fetchall()
+            return [i[COLUMN_NAME] for i in data]
+
     def databases(self):
         with self.conn.cursor() as cur:
             _databases = cur.schemas().fetchall()
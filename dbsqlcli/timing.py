@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+from contextlib import contextmanager
+from time import perf_counter
+
+logger = logging.getLogger(__name__)
+
+PHASES = ("execute", "fetch", "format", "render")
+
+
+class StatementTiming(object):
+    """The time spent in each phase of running a statement, and what was
+    fetched.
+
+    Phases nest: e.g. formatting pulls rows from the stream, which fetches
+    them from the server. The time of a phase never includes the time of the
+    phases nested in it, so the phases add up to the total time.
+    """
+
+    def __init__(self, statement):
+        self.statement = statement
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.rows = 0
+        self.bytes = 0
+        self.batches = 0
+        self._running = []  # [phase, started] of the running phases
+
+    @contextmanager
+    def phase(self, name):
+        """Time the `with` block as phase *name*."""
+        now = perf_counter()
+        if self._running:
+            parent = self._running[-1]
+            self.seconds[parent[0]] += now - parent[1]
+        running = [name, now]
+        self._running.append(running)
+        try:
+            yield
+        finally:
+            now = perf_counter()
+            self._running.pop()
+            self.seconds[name] += now - running[1]
+            if self._running:
+                self._running[-1][1] = now
+
+    def iterate(self, iterable, name):
+        """Yield the items of *iterable*, timing the production of each item
+        as phase *name*."""
+        iterator = iter(iterable)
+        while True:
+            with self.phase(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def add_batch(self, batch):
+        """Count a batch of rows (an Arrow table) fetched from the server."""
+        self.batches += 1
+        self.rows += batch.num_rows
+        self.bytes += batch.nbytes
+
+    @property
+    def total(self):
+        return sum(self.seconds.values())
+
+    @property
+    def rows_per_second(self):
+        total = self.total
+        return self.rows / total if total else 0.0
+
+    def as_record(self):
+        """The timing as a dict of plain values."""
+        record = {"statement": self.statement}
+        for phase in PHASES:
+            record[phase + "_seconds"] = round(self.seconds[phase], 6)
+        record.update(
+            total_seconds=round(self.total, 6),
+            rows=self.rows,
+            bytes=self.bytes,
+            batches=self.batches,
+            rows_per_second=round(self.rows_per_second, 1),
+        )
+        return record
+
+    def log(self):
+        """Log the timing as a JSON record."""
+        logger.info("statement timing: %s", json.dumps(self.as_record()))
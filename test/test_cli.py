@@ -1,4 +1,10 @@
-from dbsqlcli.main import apply_credentials_from_cfg
+import sys
+import subprocess
+from unittest.mock import patch
+
+from click.testing import CliRunner
+
+from dbsqlcli.main import apply_credentials_from_cfg, cli
 
 from databricks.sql.auth.auth import AuthType
 
@@ -15,6 +21,14 @@ HTTP_PATH = "arg/path/to/endpoint"
 HOST_NAME = "arg.cloud.databricks.com"
 ACCESS_TOKEN = "dapi_argRandomAccessKey"
 
+# Modules that are only imported once the interactive prompt starts.
+DEFERRED_MODULES = (
+    "prompt_toolkit",
+    "pygments.lexers",
+    "dbsqlcli.completer",
+    "databricks.sql.auth.auth",
+)
+
 
 def test_clirc_credentials_are_used():
     """When no credentials are passed to the CLI, read credentials from the config file"""
@@ -70,3 +84,30 @@ def test_passthrough_with_empty_config():
     assert http_path == HTTP_PATH
     assert access_token == ACCESS_TOKEN
     assert auth_type == AuthType.DATABRICKS_OAUTH.value
+
+
+def test_non_interactive_startup_skips_interactive_imports():
+    """Importing the CLI for -e must not import the interactive prompt."""
+
+    code = (
+        "import sys, dbsqlcli.main; "
+        "print(' '.join(m for m in %r if m in sys.modules))" % (DEFERRED_MODULES,)
+    )
+    output = subprocess.check_output([sys.executable, "-c", code], text=True)
+
+    assert output.split() == []
+
+
+@patch("databricks.sql.connect")
+def test_compressed_non_csv_export_is_a_usage_error(mock_connect, tmp_path):
+    clirc = tmp_path / "dbsqlclirc"
+    clirc.write_text("")
+    args = ["--clirc", str(clirc), "-e", "select 1"]
+
+    for export in (["--export", "out.parquet.gz"], ["--export", "out.arrow"]):
+        compression = [] if export[1].endswith(".gz") else ["--compression", "zstd"]
+        result = CliRunner().invoke(cli, args + export + compression)
+
+        assert result.exit_code == 2
+        assert "Only csv exports can be compressed." in result.output
+    mock_connect.assert_not_called()
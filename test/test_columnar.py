@@ -0,0 +1,72 @@
+import datetime
+import decimal
+from unittest.mock import MagicMock
+
+import pyarrow
+
+from dbsqlcli.packages.tabular_output.columnar import (
+    column_to_text,
+    iter_text_windows,
+    table_to_rows,
+)
+from dbsqlcli.results import ResultStream
+
+
+def python_text(column):
+    return [None if value is None else str(value) for value in column.to_pylist()]
+
+
+def test_values_are_converted_like_str():
+    columns = [
+        pyarrow.array([1, None, -(10**12)], pyarrow.int64()),
+        pyarrow.array([1.0, None, 0.1 + 0.2]),
+        pyarrow.array([1.1, 2.5, None], pyarrow.float32()),
+        pyarrow.array(
+            [decimal.Decimal("1.50"), decimal.Decimal(0), None],
+            pyarrow.decimal128(20, 10),
+        ),
+        pyarrow.array([True, False, None]),
+        pyarrow.array([datetime.date(2023, 1, 2), None, datetime.date(1, 1, 1)]),
+        pyarrow.array(
+            [
+                datetime.datetime(2023, 1, 1),
+                datetime.datetime(2023, 1, 1, 0, 0, 1, 500),
+                None,
+            ],
+            pyarrow.timestamp("us"),
+        ),
+        pyarrow.array(
+            [datetime.datetime(2023, 6, 1, 12, tzinfo=datetime.timezone.utc)] * 3,
+            pyarrow.timestamp("us", tz="America/New_York"),
+        ),
+    ]
+
+    for column in columns:
+        assert column_to_text(column) == python_text(column), column.type
+
+
+def test_other_types_are_left_to_the_formatter():
+    column = pyarrow.array([[1, 2], None])
+
+    assert column_to_text(column) == [[1, 2], None]
+
+
+def test_table_to_rows():
+    table = pyarrow.table({"id": [1, 2], "name": ["a", None]})
+
+    assert table_to_rows(table) == [("1", "a"), ("2", None)]
+
+
+def test_text_windows_span_batches():
+    cursor = MagicMock()
+    cursor.fetchmany_arrow.side_effect = [
+        pyarrow.table({"id": list(range(start, min(start + 100, 2500)))})
+        for start in range(0, 2600, 100)
+    ]
+    stream = ResultStream(cursor, fetch_size=100)
+
+    windows = list(iter_text_windows(stream, 1000))
+
+    assert [len(window) for window in windows] == [1000, 1000, 500]
+    assert windows[1][0] == ("1000",)
+    assert windows[2][-1] == ("2499",)
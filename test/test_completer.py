@@ -1,3 +1,7 @@
+import time
+import threading
+from unittest.mock import Mock, patch
+
 from dbsqlcli.completer import DBSQLCompleter
 from dbsqlcli.packages.completion_engine import Table
 
@@ -20,3 +24,46 @@ def test_completer():
         completer.get_completions(document, None)
     except Exception:
         assert False, "get_compeltions shouldn't raise"
+
+
+def test_columns_are_loaded_on_demand():
+    loaded = threading.Event()
+    loader = Mock(return_value=["id", "name"])
+    completer = DBSQLCompleter(column_loader=loader, on_columns_loaded=loaded.set)
+    completer.extend_schemata("db")
+    completer.set_dbname("db")
+    completer.extend_relations([("users",)], kind="tables")
+
+    assert completer.populate_scoped_cols([(None, "users", None)]) == ["*"]
+    assert loaded.wait(5)
+    loader.assert_called_once_with("db", "users")
+    assert completer.populate_scoped_cols([(None, "users", None)]) == [
+        "*",
+        "id",
+        "name",
+    ]
+    assert loader.call_count == 1
+
+
+def test_failed_column_loads_are_retried():
+    loaded = threading.Event()
+    loader = Mock(side_effect=[RuntimeError("timed out"), ["id"]])
+    completer = DBSQLCompleter(column_loader=loader, on_columns_loaded=loaded.set)
+    completer.extend_schemata("db")
+    completer.set_dbname("db")
+    completer.extend_relations([("users",)], kind="tables")
+    scoped = [(None, "users", None)]
+
+    completer.populate_scoped_cols(scoped)
+    for _ in range(500):
+        if ("tables", "db", "users") not in completer._requested_columns:
+            break
+        time.sleep(0.01)
+    # Not again right away.
+    completer.populate_scoped_cols(scoped)
+    assert loader.call_count == 1
+
+    with patch("dbsqlcli.completer.COLUMNS_RETRY_AFTER", 0):
+        completer.populate_scoped_cols(scoped)
+    assert loaded.wait(5)
+    assert completer.populate_scoped_cols(scoped) == ["*", "id"]
@@ -82,3 +82,15 @@ def test_where_suggests_columns_functions(expression):
         Alias(aliases=["tabl"]),
         Keyword(last_token="WHERE"),
     )
+
+
+def test_multiple_statements_suggest_for_the_current_one():
+    expression = "SELECT * FROM abc; SELECT * FROM def d WHERE d."
+    suggestions = suggest_type(expression, expression)
+
+    assert suggestions == (
+        Column(tables=[(None, "def", "d")], drop_unique=None),
+        Table(schema="d"),
+        View(schema="d"),
+        Function(schema="d", filter=None),
+    )
@@ -0,0 +1,44 @@
+from dbsqlcli.packages import completion_index
+from dbsqlcli.packages.completion_index import CompletionIndex
+
+NAMES = ["user_id", "users", "Orders", "order_items", "customer_id", "id"]
+
+
+def test_fuzzy_matches_are_ranked_by_length_and_position():
+    index = CompletionIndex(NAMES)
+
+    assert sorted(index.match("uid")) == [
+        (7, 0, "user_id"),
+        (10, 1, "customer_id"),
+    ]
+
+
+def test_prefix_matches(monkeypatch):
+    # Index even small collections, so the bisection is used.
+    monkeypatch.setattr(completion_index, "MIN_INDEXED_SIZE", 0)
+    index = CompletionIndex(NAMES)
+
+    assert sorted(index.match("or", start_only=True, fuzzy=False)) == [
+        (2, 0, "Orders"),
+        (2, 0, "order_items"),
+    ]
+    assert index.match("ord", start_only=True, fuzzy=False) == [
+        (3, 0, "Orders"),
+        (3, 0, "order_items"),
+    ]
+
+
+def test_narrowing_and_widening_the_text(monkeypatch):
+    monkeypatch.setattr(completion_index, "MIN_INDEXED_SIZE", 0)
+    index = CompletionIndex(NAMES)
+
+    assert len(index.match("i")) == 4
+    assert [m[2] for m in index.match("id")] == ["customer_id", "id", "user_id"]
+    assert [m[2] for m in index.match("ids")] == []
+    assert [m[2] for m in index.match("s")] == [
+        "Orders",
+        "customer_id",
+        "order_items",
+        "user_id",
+        "users",
+    ]
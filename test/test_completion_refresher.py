@@ -1,6 +1,6 @@
 import time
 import pytest
-from unittest.mock import Mock, patch
+from unittest.mock import MagicMock, Mock, patch
 
 
 @pytest.fixture
@@ -77,12 +77,126 @@ def test_refresh_with_callbacks(refresher):
 
     """
     callbacks = [Mock()]
-    sqlexecute_class = Mock()
-    sqlexecute = Mock()
+    sqlexecute = MagicMock()
 
-    with patch("dbsqlcli.completion_refresher.SQLExecute", sqlexecute_class):
-        # Set refreshers to 0: we're not testing refresh logic here
-        refresher.refreshers = {}
-        refresher.refresh(sqlexecute, callbacks)
-        time.sleep(1)  # Wait for the thread to work.
-        assert callbacks[0].call_count == 1
+    # Set refreshers to 0: we're not testing refresh logic here
+    refresher.refreshers = {}
+    refresher.refresh(sqlexecute, callbacks)
+    time.sleep(1)  # Wait for the thread to work.
+    assert callbacks[0].call_count == 1
+    # The refresh runs on a connection borrowed from the executor's pool.
+    assert sqlexecute.borrowed.call_count == 1
+
+
+def test_refresh_loads_cached_metadata(tmp_path):
+    """Cached metadata must be passed to the callbacks before the background
+    refresh, which then updates the cache.
+
+    :param tmp_path:
+
+    """
+    from dbsqlcli.completer import DBSQLCompleter
+    from dbsqlcli.completion_refresher import CompletionRefresher
+    from dbsqlcli.metadata_cache import MetadataCache
+
+    cache = MetadataCache(directory=str(tmp_path), ttl=60)
+    sqlexecute = MagicMock(hostname="host", http_path="path", database="db")
+    sqlexecute.borrowed.return_value.__enter__.return_value = sqlexecute
+    cached = DBSQLCompleter()
+    cached.set_dbname("db")
+    cached.dbmetadata["tables"]["db"] = {"users": ["*", "id", "name"]}
+    cache.save(sqlexecute, cached.metadata_snapshot())
+
+    refresher = CompletionRefresher(metadata_cache=cache)
+    refresher.refreshers = {}
+    callbacks = [Mock()]
+    refresher.refresh(sqlexecute, callbacks)
+    completer = callbacks[0].call_args_list[0][0][0]
+    assert completer.dbmetadata["tables"]["db"]["users"] == ["*", "id", "name"]
+    assert "users" in completer.all_completions
+
+    time.sleep(1)  # Wait for the thread to work.
+    assert callbacks[0].call_count == 2
+    assert cache.load(sqlexecute)["dbmetadata"]["tables"] == {}
+
+
+def test_refresh_caches_metadata_of_the_refreshed_database(tmp_path):
+    """Changing database while a refresh runs must not store the refreshed
+    metadata under the new database.
+
+    :param tmp_path:
+
+    """
+    from dbsqlcli.completion_refresher import CompletionRefresher
+    from dbsqlcli.metadata_cache import MetadataCache
+
+    cache = MetadataCache(directory=str(tmp_path), ttl=60)
+    sqlexecute = Mock(hostname="host", http_path="path", database="db")
+    executor = Mock(hostname="host", http_path="path", database="db")
+    sqlexecute.borrowed.return_value.__enter__ = Mock(return_value=executor)
+    sqlexecute.borrowed.return_value.__exit__ = Mock(return_value=False)
+
+    def use_other_database(completer, executor):
+        completer.set_dbname(executor.database)
+        sqlexecute.database = "other"
+
+    refresher = CompletionRefresher(metadata_cache=cache)
+    refresher.refreshers = {"use": use_other_database}
+    callbacks = [Mock()]
+    refresher.refresh(sqlexecute, callbacks)
+
+    time.sleep(1)  # Wait for the thread to work.
+    assert callbacks[0].call_count == 1
+    assert cache.load(executor)["dbname"] == "db"
+    assert cache.load(sqlexecute) is None
+
+
+def test_metadata_cache_ttl(tmp_path):
+    from dbsqlcli.metadata_cache import MetadataCache
+
+    sqlexecute = Mock(hostname="host", http_path="path", database="db")
+    MetadataCache(directory=str(tmp_path), ttl=60).save(sqlexecute, {"a": 1})
+
+    assert MetadataCache(directory=str(tmp_path), ttl=60).load(sqlexecute) == {"a": 1}
+    assert MetadataCache(directory=str(tmp_path), ttl=0).load(sqlexecute) is None
+    with patch("time.time", return_value=time.time() + 120):
+        assert MetadataCache(directory=str(tmp_path), ttl=60).load(sqlexecute) is None
+
+
+def test_refresh_tables_from_information_schema():
+    from dbsqlcli.completer import DBSQLCompleter
+    from dbsqlcli.completion_refresher import refresh_tables
+
+    completer = DBSQLCompleter()
+    completer.extend_schemata("db")
+    completer.set_dbname("db")
+    executor = Mock(database="db")
+    executor.schema_metadata.return_value = (
+        ["users"],
+        [("users", "id"), ("users", "name")],
+        ["to_cents"],
+    )
+
+    refresh_tables(completer, executor)
+
+    assert completer.dbmetadata["tables"]["db"] == {"users": ["*", "id", "name"]}
+    assert "to_cents" in completer.dbmetadata["functions"]["db"]
+    executor.tables.assert_not_called()
+    executor.table_columns.assert_not_called()
+
+
+def test_refresh_tables_falls_back_to_thrift_metadata():
+    from dbsqlcli.completer import DBSQLCompleter
+    from dbsqlcli.completion_refresher import refresh_tables
+
+    completer = DBSQLCompleter()
+    completer.extend_schemata("db")
+    completer.set_dbname("db")
+    executor = Mock(database="db")
+    executor.schema_metadata.return_value = None
+    executor.tables.return_value = [("users",)]
+    executor.table_columns.return_value = [("users", "id")]
+
+    refresh_tables(completer, executor)
+
+    assert completer.dbmetadata["tables"]["db"] == {"users": ["*", "id"]}
@@ -0,0 +1,56 @@
+from unittest.mock import MagicMock, Mock
+
+import pytest
+from databricks.sql.exc import RequestError
+
+from dbsqlcli.connection_pool import ConnectionPool
+
+
+@pytest.fixture
+def pool():
+    return ConnectionPool(Mock(side_effect=lambda database: MagicMock()))
+
+
+def test_connections_are_reused_per_database(pool):
+    with pool.connection("default") as conn:
+        pass
+
+    with pool.connection("other") as other:
+        assert other is not conn
+    with pool.connection("default") as again:
+        assert again is conn
+
+    assert pool._open_connection.call_count == 2
+
+
+def test_connection_is_recycled_on_request_error(pool):
+    with pytest.raises(RequestError):
+        with pool.connection("default") as conn:
+            raise RequestError("session timed out")
+
+    assert conn.close.call_count == 1
+    with pool.connection("default") as new:
+        assert new is not conn
+
+
+def test_unhealthy_idle_connection_is_replaced():
+    pool = ConnectionPool(
+        Mock(side_effect=lambda database: MagicMock()), health_check_after=0
+    )
+    with pool.connection("default") as conn:
+        cur = conn.cursor.return_value.__enter__.return_value
+        cur.execute.side_effect = RequestError("session timed out")
+
+    assert pool.acquire("default") is not conn
+    assert conn.close.call_count == 1
+
+
+def test_pool_keeps_at_most_size_idle_connections():
+    pool = ConnectionPool(Mock(side_effect=lambda database: MagicMock()), size=1)
+    first, second = pool.acquire("default"), pool.acquire("default")
+    pool.release(first, "default")
+    pool.release(second, "default")
+
+    assert second.close.call_count == 1
+    pool.close()
+    assert first.close.call_count == 1
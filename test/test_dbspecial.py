@@ -1,3 +1,12 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pyarrow
+import pytest
+
+from dbsqlcli.result_cache import ResultCache
+from dbsqlcli.packages.special import iocommands
+from dbsqlcli.packages.special.iocommands import diff_rows, watch_query
 from dbsqlcli.packages.special.utils import format_uptime
 from dbsqlcli.packages.completion_engine import (
     suggest_type,
@@ -38,3 +47,146 @@ def test_format_uptime():
 
     seconds = 522600
     assert "6 days 1 hour 10 min 0 sec" == format_uptime(seconds)
+
+
+def test_diff_rows_by_first_column():
+    previous = [(1, "a", 10), (2, "b", 20), (3, "c", 30)]
+    rows = [(1, "a", 10), (2, "b", 25), (4, "d", 40)]
+
+    assert diff_rows(previous, rows) == [
+        ("~", 2, "b", "20 -> 25"),
+        ("+", 4, "d", 40),
+        ("-", 3, "c", 30),
+    ]
+
+
+def test_diff_rows_without_key():
+    previous = [("a", 1), ("a", 2), ("b", 1)]
+    rows = [("a", 1), ("b", 1), ("b", 1)]
+
+    assert diff_rows(previous, rows) == [("+", "b", 1), ("-", "a", 2)]
+
+
+def test_watch_only_shows_changes_when_probe_changes():
+    probes = iter([[(1,)], [(1,)], [(2,)]])
+    results = iter([[(1, "a")], [(1, "b")]])
+    cur = MagicMock()
+    cur.description = [("id",), ("value",)]
+
+    def execute(sql):
+        cur.fetchall.return_value = next(probes if "max" in sql else results)
+
+    cur.execute.side_effect = execute
+    iterations = [1, 2]
+
+    def sleep(seconds):
+        # Stop watching after the third iteration.
+        if not iterations:
+            raise KeyboardInterrupt
+        iterations.pop()
+
+    with patch("dbsqlcli.packages.special.iocommands.sleep", side_effect=sleep):
+        output = list(
+            watch_query("1 -d -p 'select max(id) from t' select * from t", cur=cur)
+        )
+
+    assert output == [
+        ("> select * from t", [(1, "a")], ["id", "value"], None),
+        (
+            "> select * from t",
+            [("~", 1, "a -> b")],
+            ["", "id", "value"],
+            "0 added, 1 changed, 0 removed",
+        ),
+    ]
+    # The statement is not repeated while the probe is unchanged.
+    assert cur.execute.call_count == 5
+
+
+def test_once_file_is_written_in_one_go(tmp_path):
+    path = tmp_path / "out.txt"
+    path.write_text("old\n")
+    iocommands.set_once("-o {}".format(path))
+    try:
+        for line in ("\x1b[1mid\x1b[0m", "1", "2"):
+            iocommands.write_once(line)
+        # Lines are buffered until the result is complete.
+        assert path.read_text() == ""
+
+        written = iocommands.flush_output_files()
+        iocommands.unset_once_if_written()
+    finally:
+        iocommands.close_once()
+
+    assert path.read_text() == "id\n1\n2\n"
+    assert written == "7 B written to {}".format(path)
+    assert not iocommands.is_output_to_file()
+
+
+def test_output_file_arguments():
+    assert iocommands.parseargfile("-o -z zstd out.txt") == {
+        "file": "out.txt",
+        "mode": "w",
+        "compression": "zstd",
+    }
+    assert iocommands.parseargfile("out.csv.gz")["compression"] == "gzip"
+    assert iocommands.parseargfile("out.csv")["compression"] is None
+    with pytest.raises(TypeError):
+        iocommands.parseargfile("-z bzip2 out.txt")
+
+
+def test_once_file_write_errors_are_raised(tmp_path):
+    path = tmp_path / "out.txt"
+    iocommands.set_once(str(path))
+    try:
+        iocommands.write_once("1")
+        with patch.object(
+            iocommands.once_output._file, "write", side_effect=OSError(28, "No space")
+        ):
+            with pytest.raises(OSError, match="No space"):
+                iocommands.flush_output_files()
+    finally:
+        iocommands.close_once()
+
+    assert not iocommands.is_output_to_file()
+
+
+def test_watch_shows_each_result_as_it_finishes():
+    cur = MagicMock()
+    cur.description = [("id",)]
+    cur.fetchall.return_value = [(1,)]
+
+    watch = watch_query("1 select 1; select 2", cur=cur)
+    first = next(watch)
+
+    assert first == ("> select 1;", [(1,)], ["id"], None)
+    # The second statement only runs once the first result has been shown.
+    assert cur.execute.call_count == 1
+    assert next(watch)[0] == "> select 2"
+    watch.close()
+
+
+def test_watch_bypasses_the_result_cache(tmp_path):
+    tables = iter(
+        [pyarrow.table({"id": [1], "value": ["a"]})]
+        + [pyarrow.table({"id": [1], "value": ["b"]})] * 2
+    )
+    underlying = MagicMock()
+    underlying.description = [("id", "bigint"), ("value", "string")]
+    underlying.fetchall_arrow.side_effect = lambda: next(tables)
+    executor = SimpleNamespace(
+        hostname="host", http_path="/sql/1", database="default", session=[]
+    )
+    cur = ResultCache(1024 * 1024, directory=str(tmp_path)).cursor(underlying, executor)
+    iterations = [1]
+
+    def sleep(seconds):
+        if not iterations:
+            raise KeyboardInterrupt
+        iterations.pop()
+
+    with patch("dbsqlcli.packages.special.iocommands.sleep", side_effect=sleep):
+        output = list(watch_query("1 -d select * from t", cur=cur))
+
+    assert output[1][1] == [("~", 1, "a -> b")]
+    assert underlying.execute.call_count == 2
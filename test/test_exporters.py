@@ -0,0 +1,81 @@
+import os
+from unittest.mock import MagicMock
+
+import pyarrow
+import pyarrow.csv
+import pyarrow.ipc
+import pyarrow.parquet
+import pytest
+
+from dbsqlcli.packages.exporters import export_result, format_from_filename
+from dbsqlcli.results import ResultStream
+
+SCHEMA = pyarrow.schema([("id", pyarrow.int64()), ("name", pyarrow.string())])
+
+
+def result_stream(*batches):
+    cursor = MagicMock()
+    cursor.fetchmany_arrow.side_effect = [
+        pyarrow.table({"id": ids, "name": ["n%d" % i for i in ids]}, schema=SCHEMA)
+        for ids in batches + ([],)
+    ]
+    return ResultStream(cursor, fetch_size=2)
+
+
+def test_format_from_filename():
+    assert format_from_filename("out.parquet") == "parquet"
+    assert format_from_filename("OUT.CSV") == "csv"
+    assert format_from_filename("out.feather") == "arrow"
+    assert format_from_filename("out.csv.zst") == "csv"
+    assert format_from_filename("out") is None
+
+
+@pytest.mark.parametrize(
+    "format_name, read",
+    [
+        ("parquet", pyarrow.parquet.read_table),
+        ("arrow", lambda f: pyarrow.ipc.open_file(f).read_all()),
+        ("csv", pyarrow.csv.read_csv),
+    ],
+)
+def test_export_result(tmp_path, format_name, read):
+    filename = str(tmp_path / "out")
+
+    rows, size = export_result(result_stream([1, 2], [3]), filename, format_name)
+
+    assert rows == 3
+    assert size > 0
+    table = read(filename)
+    assert table.column("id").to_pylist() == [1, 2, 3]
+    assert table.column("name").to_pylist() == ["n1", "n2", "n3"]
+
+
+def test_export_empty_result_keeps_schema(tmp_path):
+    filename = str(tmp_path / "out.parquet")
+
+    rows, _ = export_result(result_stream(), filename, "parquet")
+
+    assert rows == 0
+    assert pyarrow.parquet.read_schema(filename).names == ["id", "name"]
+
+
+def test_export_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        export_result(result_stream([1]), str(tmp_path / "out"), "xlsx")
+
+
+@pytest.mark.parametrize("compression", ["gzip", "zstd"])
+def test_export_compressed_csv(tmp_path, compression):
+    filename = str(tmp_path / "out.csv")
+
+    rows, size = export_result(result_stream([1, 2], [3]), filename, "csv", compression)
+
+    assert rows == 3
+    assert size == os.path.getsize(filename)
+    with pyarrow.CompressedInputStream(pyarrow.OSFile(filename), compression) as f:
+        assert f.read() == b'"id","name"\n1,"n1"\n2,"n2"\n3,"n3"\n'
+
+
+def test_export_compressed_parquet(tmp_path):
+    with pytest.raises(ValueError):
+        export_result(result_stream([1]), str(tmp_path / "out"), "parquet", "gzip")
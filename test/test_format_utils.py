@@ -2,7 +2,14 @@
 
 
 from collections import namedtuple
-from dbsqlcli.packages.format_utils import format_status, humanize_size
+from dbsqlcli.execution import CANCELLED, CANCELLING, Execution
+from dbsqlcli.packages.format_utils import (
+    format_execution,
+    format_status,
+    humanize_size,
+    statistics,
+)
+from dbsqlcli.timing import StatementTiming
 
 
 def test_format_status_plural():
@@ -14,6 +21,39 @@ def test_format_status_no_results():
     assert format_status(rows_length=None) == "Query OK"
 
 
+def test_statistics():
+    timing = StatementTiming("select 1")
+    timing.seconds.update(execute=1.5, fetch=0.25, format=0.125, render=0.125)
+    timing.rows, timing.batches, timing.bytes = 4000, 2, 2048
+
+    assert statistics(timing) == (
+        "Time: 2.000s (execute 1.500s, fetch 0.250s, format 0.125s, render 0.125s)\n"
+        "Fetched 4000 rows in 2 batches, 2 KB, 2000 rows/s"
+    )
+
+
+def test_statistics_without_rows():
+    timing = StatementTiming("drop table t")
+    timing.seconds["execute"] = 0.5
+
+    assert statistics(timing).splitlines() == [
+        "Time: 0.500s (execute 0.500s, fetch 0.000s, format 0.000s, render 0.000s)"
+    ]
+
+
+def test_format_execution():
+    execution = Execution("select 1")
+    execution.started -= 12.34
+    assert format_execution(execution) == "Executing for 12.3s, Ctrl-C cancels"
+
+    execution.state = CANCELLING
+    assert format_execution(execution).startswith("Cancelling after 12.3s")
+
+    execution.finish(CANCELLED)
+    execution.ended = execution.started + 12.5
+    assert format_execution(execution) == "Last query cancelled after 12.500s"
+
+
 def test_humanize_size():
     assert humanize_size(20) == "20 B"
     assert humanize_size(2000) == "1.95 KB"
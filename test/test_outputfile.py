@@ -0,0 +1,67 @@
+import gzip
+from unittest.mock import patch
+
+import pytest
+
+from dbsqlcli.packages import outputfile
+from dbsqlcli.packages.outputfile import BackgroundOutputFile, OutputFile
+
+
+def test_background_file_is_written_in_chunks(tmp_path):
+    path = tmp_path / "tee.txt"
+    lines = ["line %d" % i for i in range(1000)]
+
+    with patch.object(outputfile, "CHUNK_SIZE", 1024):
+        output_file = BackgroundOutputFile(str(path), "w")
+        with patch.object(output_file._file, "write", wraps=output_file._file.write):
+            for line in lines:
+                output_file.write(line)
+            assert output_file.flush() == len("\n".join(lines)) + 1
+            output_file.close()
+            chunks = [call.args[0] for call in output_file._file.write.call_args_list]
+
+    assert path.read_text() == "\n".join(lines) + "\n"
+    assert len(chunks) < len(lines) / 10
+    assert all(len(chunk) >= 1024 for chunk in chunks[:-1])
+
+
+def test_background_write_errors_are_raised_on_flush(tmp_path):
+    output_file = BackgroundOutputFile(str(tmp_path / "tee.txt"))
+    with patch.object(output_file._file, "write", side_effect=OSError(28, "No space")):
+        output_file.write("line")
+        output_file.close()
+
+        with pytest.raises(OSError, match="No space"):
+            output_file.check()
+
+
+def test_appending_to_compressed_file(tmp_path):
+    path = str(tmp_path / "tee.txt.gz")
+    for line in ("first", "second"):
+        output_file = BackgroundOutputFile(path, "a", "gzip")
+        output_file.write(line)
+        output_file.close()
+
+    with gzip.open(path, "rt") as f:
+        assert f.read() == "first\nsecond\n"
+
+
+def test_flush_can_wait_for_the_writer_thread(tmp_path):
+    path = tmp_path / "once.txt"
+    output_file = BackgroundOutputFile(str(path))
+    try:
+        output_file.write("line")
+        assert output_file.flush(wait=True) == 5
+        assert path.read_text() == "line\n"
+    finally:
+        output_file.close()
+
+
+def test_unknown_compression_names_the_file(tmp_path):
+    path = str(tmp_path / "out.txt")
+
+    with pytest.raises(OSError) as error:
+        OutputFile(path, "w", "nope")
+
+    assert error.value.filename == path
+    assert error.value.strerror.startswith("Cannot compress with nope")
@@ -0,0 +1,77 @@
+import os
+from unittest.mock import MagicMock, patch
+
+from prompt_toolkit.data_structures import Size
+
+from dbsqlcli.main import DBSQLCli
+from dbsqlcli.packages.pager import Pager, get_pager_command
+
+
+def make_cli():
+    """A stand-in for the CLI, with a terminal of 5 rows."""
+    cli = MagicMock()
+    cli.explicit_pager = False
+    cli.get_output_margin.return_value = 1
+    cli.prompt_app.output.get_size.return_value = Size(rows=5, columns=80)
+    cli._write_lines = lambda lines, pager=None: DBSQLCli._write_lines(
+        cli, lines, pager
+    )
+    return cli
+
+
+def test_get_pager_command_from_env():
+    with patch.dict(os.environ, {"PAGER": "most"}):
+        assert get_pager_command() == "most"
+
+
+def test_pager_streams_lines(tmp_path):
+    paged = tmp_path / "paged.txt"
+    pager = Pager("cat > {}".format(paged))
+
+    for i in range(3):
+        assert pager.write("line %d" % i)
+    pager.close()
+
+    assert paged.read_text() == "line 0\nline 1\nline 2\n"
+
+
+def test_pager_write_fails_after_quit():
+    pager = Pager("head -n 1 > /dev/null")
+
+    written = 0
+    while pager.write("x" * 100) and written < 100000:
+        written += 1
+    pager.close()
+
+    assert written < 100000
+    assert not pager.write("more")
+
+
+def test_output_opens_the_pager_once_without_terminal(capsys):
+    lines = ["line %d" % i for i in range(20)]
+
+    with patch("dbsqlcli.main.open_pager", return_value=None) as open_pager:
+        DBSQLCli.output(make_cli(), iter(lines), "20 rows in set")
+
+    open_pager.assert_called_once_with()
+    assert capsys.readouterr().out == "\n".join(lines + ["20 rows in set"]) + "\n"
+
+
+def test_output_says_when_the_pager_was_quit(capsys):
+    pager = MagicMock()
+    # The user quits after the first screen and a line.
+    pager.write.side_effect = lambda line: line != "line 6"
+    consumed = []
+
+    def lines():
+        for i in range(20):
+            consumed.append(i)
+            yield "line %d" % i
+
+    with patch("dbsqlcli.main.open_pager", return_value=pager):
+        DBSQLCli.output(make_cli(), lines(), lambda: "%d rows in set" % len(consumed))
+
+    pager.close.assert_called_once_with()
+    assert capsys.readouterr().out == (
+        "Output stopped when the pager was quit: 7 rows in set so far\n"
+    )
@@ -1,9 +1,14 @@
 import pytest
 from dbsqlcli.packages.parseutils import (
     extract_tables,
+    find_prev_keyword,
     query_starts_with,
     queries_start_with,
     is_destructive,
+    is_barrier,
+    has_barrier_marker,
+    is_read_only,
+    is_session_statement,
 )
 
 
@@ -106,6 +111,34 @@ def test_join_as_table():
     assert tables == [(None, "my_table", "m")]
 
 
+def test_join_after_join_condition():
+    tables = extract_tables(
+        "SELECT * FROM abc a JOIN def d ON a.id = d.num LEFT JOIN ghi g ON g.x = a.x"
+    )
+    assert tables == [(None, "abc", "a"), (None, "def", "d"), (None, "ghi", "g")]
+
+
+def test_subselect_in_from():
+    tables = extract_tables("SELECT * FROM (SELECT id FROM abc a) sub JOIN def d")
+    assert tables == [(None, "abc", "a"), (None, "sub", "sub"), (None, "def", "d")]
+
+
+def test_incomplete_subselect():
+    tables = extract_tables("SELECT * FROM abc WHERE id IN (SELECT id FROM def d")
+    assert tables == [(None, "abc", None), (None, "def", "d")]
+
+
+def test_quoted_table_name():
+    tables = extract_tables("SELECT * FROM `my schema`.`my table` t")
+    assert tables == [("my schema", "my table", "t")]
+
+
+def test_find_prev_keyword():
+    token, text = find_prev_keyword("SELECT * FROM abc WHERE a = 1 AND b > ")
+    assert token.value == "WHERE"
+    assert text == "SELECT * FROM abc WHERE"
+
+
 def test_query_starts_with():
     query = "USE test;"
     assert query_starts_with(query, ("use",)) is True
@@ -129,3 +162,44 @@ def test_queries_start_with():
 def test_is_destructive():
     sql = "use test;\n" "show databases;\n" "drop database foo;"
     assert is_destructive(sql) is True
+
+
+@pytest.mark.parametrize(
+    ("sql", "barrier"),
+    [
+        ("USE sales", True),
+        ("set spark.sql.ansi.enabled = true", True),
+        ("CREATE TABLE t (id INT)", True),
+        ("drop view v", True),
+        ("INSERT INTO t SELECT * FROM s", False),
+        ("-- use\nSELECT 1", False),
+    ],
+)
+def test_is_barrier(sql, barrier):
+    assert is_barrier(sql) is barrier
+
+
+def test_has_barrier_marker():
+    assert has_barrier_marker("-- barrier\nselect 1")
+    assert has_barrier_marker("-- load\n  --  BARRIER \nselect 1")
+    assert not has_barrier_marker("select 1 -- barrier")
+    assert not has_barrier_marker("-- barriers\nselect 1")
+
+
+def test_is_session_statement():
+    assert is_session_statement("use sales")
+    assert is_session_statement("SET x = 1")
+    assert is_session_statement("create or replace temp view v as select 1")
+    assert not is_session_statement("create view v as select 1")
+    assert not is_session_statement("select 1")
+
+
+def test_is_read_only():
+    assert is_read_only("select 1")
+    assert is_read_only("with a as (select 1) select * from a")
+    assert not is_read_only("with a as (select 1) insert into t select * from a")
+    assert not is_read_only(
+        "WITH a AS (SELECT 1 AS id) MERGE INTO t USING a ON t.id = a.id "
+        "WHEN MATCHED THEN DELETE"
+    )
+    assert not is_read_only("insert into t values (1)")
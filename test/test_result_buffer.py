@@ -0,0 +1,37 @@
+import pyarrow
+
+from dbsqlcli.result_buffer import ResultBuffer
+
+
+def table(rows):
+    return pyarrow.table({"id": pyarrow.array(range(rows), pyarrow.int64())})
+
+
+def test_results_are_numbered_from_the_last():
+    buffer = ResultBuffer(max_results=3)
+    for query in ("select 1", "select 2", "select 3", "select 4"):
+        buffer.add(query, None, ["id"], table(1))
+
+    assert len(buffer) == 3
+    assert buffer.get().query == "select 4"
+    assert buffer.get(3).query == "select 2"
+    assert buffer.get(4) is None
+    assert buffer.get(0) is None
+
+
+def test_least_recently_used_results_are_dropped_past_the_budget():
+    buffer = ResultBuffer(max_bytes=table(10).nbytes * 2)
+    buffer.add("select 1", None, ["id"], table(10))
+    buffer.add("select 2", None, ["id"], table(10))
+    buffer.get(2)
+    buffer.add("select 3", None, ["id"], table(10))
+
+    assert [buffer.get(n).query for n in (1, 2)] == ["select 3", "select 1"]
+    assert buffer.size == table(10).nbytes * 2
+
+
+def test_result_over_budget_is_not_kept():
+    buffer = ResultBuffer(max_bytes=1)
+    buffer.add("select 1", None, ["id"], table(10))
+
+    assert len(buffer) == 0
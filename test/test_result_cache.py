@@ -0,0 +1,156 @@
+import os
+import time
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pyarrow
+import pytest
+
+from dbsqlcli.result_cache import ResultCache
+
+DESCRIPTION = [("id", "bigint", None, None, None, None, None)]
+
+
+def make_cursor(values):
+    cursor = MagicMock()
+    cursor.description = DESCRIPTION
+    cursor.fetchmany_arrow.side_effect = [
+        pyarrow.table({"id": values}),
+        pyarrow.table({"id": pyarrow.array([], pyarrow.int64())}),
+    ]
+    return cursor
+
+
+def fetch(cursor):
+    rows = []
+    while True:
+        batch = cursor.fetchmany_arrow(100)
+        if batch.num_rows == 0:
+            return rows
+        rows.extend(batch.column("id").to_pylist())
+
+
+@pytest.fixture
+def executor():
+    return SimpleNamespace(
+        hostname="host", http_path="/sql/1", database="default", session=[]
+    )
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(1024 * 1024, directory=str(tmp_path))
+
+
+def test_equivalent_statements_are_served_from_cache(cache, executor):
+    cursor = cache.cursor(make_cursor([1, 2]), executor)
+    cursor.execute("select id from t")
+    assert fetch(cursor) == [1, 2]
+
+    underlying = MagicMock()
+    cursor = cache.cursor(underlying, executor)
+    cursor.execute("SELECT id\n  FROM t -- again")
+
+    underlying.execute.assert_not_called()
+    assert cursor.cached_at is not None
+    assert cursor.description == DESCRIPTION
+    assert fetch(cursor) == [1, 2]
+    assert cursor.fetchall() == []
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_writes_invalidate_and_session_changes_the_key(cache, executor):
+    cursor = cache.cursor(make_cursor([1]), executor)
+    cursor.execute("select id from t")
+    fetch(cursor)
+    assert cache.stats()["entries"] == 1
+
+    cache.cursor(MagicMock(), executor).execute("use other")
+    assert executor.session == ["USE other"]
+    assert cache.stats()["entries"] == 1
+    assert cache.load(cache.path(executor, "SELECT id FROM t")) is None
+
+    cache.cursor(MagicMock(), executor).execute("insert into t values (2)")
+    assert cache.stats()["entries"] == 0
+
+
+def test_entries_are_not_shared_between_credentials(cache, executor):
+    executor.access_token = "token-a"
+    cursor = cache.cursor(make_cursor([1]), executor)
+    cursor.execute("select id from t")
+    fetch(cursor)
+
+    other = SimpleNamespace(**dict(vars(executor), access_token="token-b"))
+    cursor = cache.cursor(make_cursor([2]), other)
+    cursor.execute("select id from t")
+    assert cursor.cached_at is None
+    assert fetch(cursor) == [2]
+    assert cache.stats()["entries"] == 2
+
+    cache.cursor(MagicMock(), other).execute("insert into t values (3)")
+    assert cache.stats()["entries"] == 0
+
+
+def test_partially_fetched_results_are_not_saved(cache, executor):
+    cursor = cache.cursor(make_cursor([1]), executor)
+    cursor.execute("select id from t")
+    cursor.fetchmany_arrow(100)
+
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entries_are_evicted(cache, executor):
+    table = pyarrow.table({"id": list(range(100))})
+    first = cache.path(executor, "SELECT 1")
+    second = cache.path(executor, "SELECT 2")
+    cache.save(first, table, DESCRIPTION)
+    cache.save(second, table, DESCRIPTION)
+    os.utime(second, (0, 0))
+    cache.max_bytes = os.path.getsize(first) + 1
+
+    cache.evict()
+
+    assert os.path.exists(first)
+    assert not os.path.exists(second)
+
+
+def test_expired_entries_are_not_used(cache, executor):
+    path = cache.path(executor, "SELECT 1")
+    cache.save(path, pyarrow.table({"id": [1]}), DESCRIPTION)
+    cache.ttl = 0
+    time.sleep(0.01)
+
+    assert cache.load(path) is None
+    assert not os.path.exists(path)
+
+
+@pytest.mark.parametrize(
+    "statement",
+    [
+        "with a as (select 2 as id) insert into t select id from a",
+        "with a as (select 2 as id) merge into t using a on t.id = a.id "
+        "when not matched then insert *",
+    ],
+)
+def test_writes_with_common_table_expressions_are_not_cached(
+    cache, executor, statement
+):
+    cursor = cache.cursor(make_cursor([1]), executor)
+    cursor.execute("select id from t")
+    fetch(cursor)
+
+    for _ in range(2):
+        underlying = MagicMock()
+        cache.cursor(underlying, executor).execute(statement)
+        underlying.execute.assert_called_once_with(statement)
+    assert cache.stats()["entries"] == 0
+
+
+def test_entries_are_private(tmp_path, executor):
+    cache = ResultCache(1024 * 1024, directory=str(tmp_path / "cache"))
+    path = cache.path(executor, "SELECT 1")
+    cache.save(path, pyarrow.table({"id": [1]}), DESCRIPTION)
+
+    assert os.stat(cache.directory).st_mode & 0o777 == 0o700
+    assert os.stat(path).st_mode & 0o777 == 0o600
+    assert cache.load(path) is not None
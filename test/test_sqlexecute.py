@@ -1,18 +1,83 @@
+import time
+import threading
 import unittest
 from unittest.mock import MagicMock, patch
 
+import pyarrow
+import sqlparse
 import databricks
 from databricks.sql.auth.auth import AuthType
+from dbsqlcli.execution import CANCELLED, CANCELLING, RUNNING, QueryCancelled
 from dbsqlcli.sqlexecute import (
     SQLExecute,
     DBSQL_CLI_OAUTH_CLIENT_ID,
     DBSQL_CLI_OAUTH_PORT,
 )
+from dbsqlcli.results import ResultStream
+from dbsqlcli.timing import StatementTiming
 
 HTTP_PATH = "arg/path/to/endpoint"
 HOST_NAME = "arg.cloud.databricks.com"
 ACCESS_TOKEN = "dapi_argRandomAccessKey"
 
+ID_SCHEMA = pyarrow.schema([("id", pyarrow.int64())])
+
+
+def arrow_batches(*batches):
+    return [pyarrow.table({"id": batch}, schema=ID_SCHEMA) for batch in batches]
+
+
+class ScriptCursor(object):
+    """A cursor whose queries return the number they select, after sleeping
+    for the number of milliseconds they select, and that logs what runs."""
+
+    log = []
+    lock = threading.Lock()
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.description = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def execute(self, sql):
+        sql = sqlparse.format(sql, strip_comments=True).strip()
+        with self.lock:
+            self.log.append((self.conn, sql))
+        self.description = None
+        self._value = None
+        if sql.lower().startswith("select"):
+            self._value = int(sql.split()[1])
+            time.sleep(self._value / 1000)
+            self.description = [("value", "int", None, None, None, None, None)]
+
+    def fetchmany_arrow(self, size):
+        value, self._value = self._value, None
+        return pyarrow.table({"id": [] if value is None else [value]}, ID_SCHEMA)
+
+    def close(self):
+        pass
+
+
+class BlockingCursor(ScriptCursor):
+    """A cursor whose statements execute until they are cancelled."""
+
+    def __init__(self, conn):
+        super().__init__(conn)
+        self.cancelled = threading.Event()
+
+    def execute(self, sql):
+        if not self.cancelled.wait(5):
+            raise AssertionError("The statement was not cancelled.")
+        raise RuntimeError("Query was cancelled.")
+
+    def cancel(self):
+        self.cancelled.set()
+
 
 class SQLExecuteTests(unittest.TestCase):
     @patch("databricks.sql.connect")
@@ -51,3 +116,306 @@ class SQLExecuteTests(unittest.TestCase):
         assert kwargs.get("auth_type") == AuthType.DATABRICKS_OAUTH.value
         assert kwargs.get("oauth_client_id") == DBSQL_CLI_OAUTH_CLIENT_ID
         assert kwargs.get("oauth_redirect_port") == DBSQL_CLI_OAUTH_PORT
+
+    @patch("databricks.sql.connect")
+    def test_get_result_streams_rows(self, mock_connect):
+        executor = SQLExecute(
+            hostname=HOST_NAME,
+            http_path=HTTP_PATH,
+            access_token=ACCESS_TOKEN,
+            database="default",
+            fetch_size=2,
+        )
+        cursor = MagicMock()
+        cursor.description = [("id", "int", None, None, None, None, None)]
+        cursor.fetchmany_arrow.side_effect = arrow_batches([1, 2], [3], [])
+
+        title, rows, headers, status = executor.get_result(cursor)
+
+        assert isinstance(rows, ResultStream)
+        assert headers == ["id"]
+        cursor.fetchmany_arrow.assert_not_called()
+        assert list(rows) == [(1,), (2,), (3,)]
+        cursor.fetchmany_arrow.assert_called_with(2)
+        cursor.fetchall.assert_not_called()
+        assert status() == "3 rows in set"
+
+    @patch("databricks.sql.connect")
+    def test_run_parallel_keeps_statement_order(self, mock_connect):
+        def connect(**kwargs):
+            conn = MagicMock()
+            conn.cursor.side_effect = lambda: ScriptCursor(conn)
+            return conn
+
+        mock_connect.side_effect = connect
+        ScriptCursor.log = []
+        executor = SQLExecute(
+            hostname=HOST_NAME,
+            http_path=HTTP_PATH,
+            access_token=ACCESS_TOKEN,
+            database="default",
+        )
+        script = """
+            select 30; select 1; select 20;
+            use other;
+            select 10; select 2;
+            -- barrier
+            select 3;
+        """
+
+        results = executor.run_parallel(script, 3)
+        values = [list(rows or []) for _, rows, _, _ in results]
+
+        assert values == [[(30,)], [(1,)], [(20,)], [], [(10,)], [(2,)], [(3,)]]
+        # USE runs on the session's connection, after the statements before
+        # it, and is replayed on the pooled connections before those after it.
+        log = ScriptCursor.log
+        assert log[3] == (executor.conn, "use other")
+        for conn, sql in log[4:]:
+            if sql != "use other":
+                assert log.index((conn, "use other")) < log.index((conn, sql))
+        statements = [sql for _, sql in log]
+        assert statements.index("select 3") > statements.index("select 2")
+
+    @patch("databricks.sql.connect")
+    def test_interrupt_cancels_running_statement(self, mock_connect):
+        conn = mock_connect.return_value
+        cursor = BlockingCursor(conn)
+        conn.cursor.return_value = cursor
+        executor = SQLExecute(
+            hostname=HOST_NAME,
+            http_path=HTTP_PATH,
+            access_token=ACCESS_TOKEN,
+            database="default",
+        )
+        states = []
+
+        def on_progress(execution):
+            states.append(execution.state)
+            if execution.state == RUNNING:
+                raise KeyboardInterrupt
+
+        executor.on_progress = on_progress
+
+        with self.assertRaises(QueryCancelled):
+            list(executor.run("select * from forever"))
+
+        assert cursor.cancelled.is_set()
+        assert states == [RUNNING, CANCELLING, CANCELLED]
+        assert executor.execution.state == CANCELLED
+        assert executor.execution.statement == "select * from forever"
+
+    @patch("databricks.sql.connect")
+    def test_close_connection_closes_the_pool(self, mock_connect):
+        mock_connect.side_effect = lambda **kwargs: MagicMock()
+        executor = SQLExecute(
+            hostname=HOST_NAME,
+            http_path=HTTP_PATH,
+            access_token=ACCESS_TOKEN,
+            database="default",
+        )
+        session = executor.conn
+        with executor.borrowed() as borrowed:
+            idle = borrowed.conn
+
+        executor.close_connection()
+
+        session.close.assert_called_once_with()
+        idle.close.assert_called_once_with()
+        with executor.borrowed() as borrowed:
+            assert borrowed.conn is not idle
+        borrowed.conn.close.assert_called_once_with()
+
+    @patch("databricks.sql.connect")
+    def test_table_columns_in_parallel(self, mock_connect):
+        tables = ["t%d" % i for i in range(150)]
+
+        def connect(**kwargs):
+            conn = MagicMock()
+            cur = conn.cursor.return_value.__enter__.return_value
+            cur.tables.return_value.fetchall.return_value = [
+                (None, "default", table) for table in tables
+            ]
+            cur.columns.side_effect = lambda schema_name, table_name: MagicMock(
+                fetchall=lambda: [(None, schema_name, table_name, "id")]
+            )
+            return conn
+
+        mock_connect.side_effect = connect
+        executor = SQLExecute(
+            hostname=HOST_NAME,
+            http_path=HTTP_PATH,
+            access_token=ACCESS_TOKEN,
+            database="default",
+            metadata_workers=3,
+        )
+
+        columns = list(executor.table_columns(tables))
+
+        assert sorted(columns) == sorted((table, "id") for table in tables)
+        # One connection for the executor, at most three for the workers.
+        assert 2 <= mock_connect.call_count <= 4
+
+    @patch("databricks.sql.connect")
+    def test_schema_metadata_from_information_schema(self, mock_connect):
+        executor = SQLExecute(
+            hostname=HOST_NAME,
+            http_path=HTTP_PATH,
+            access_token=ACCESS_TOKEN,
+            database="default",
+        )
+        cur = mock_connect.return_value.cursor.return_value.__enter__.return_value
+        cur.fetchall.return_value = [
+            ("column", "orders", "id", 1),
+            ("column", "orders", "total", 2),
+            ("column", "users", "id", 1),
+            ("function", "to_cents", None, 0),
+        ]
+
+        tables, columns, functions = executor.schema_metadata()
+
+        assert tables == ["orders", "users"]
+        assert columns == [("orders", "id"), ("orders", "total"), ("users", "id")]
+        assert functions == ["to_cents"]
+        args, kwargs = cur.execute.call_args
+        assert "lower(table_schema) = lower(%(schema)s)" in args[0]
+        assert args[1] == {"schema": "default"}
+
+    @patch("databricks.sql.connect")
+    def test_schema_metadata_without_columns(self, mock_connect):
+        executor = SQLExecute(
+            hostname=HOST_NAME,
+            http_path=HTTP_PATH,
+            access_token=ACCESS_TOKEN,
+            database="MySchema",
+        )
+        cur = mock_connect.return_value.cursor.return_value.__enter__.return_value
+        cur.fetchall.return_value = [
+            ("function", "to_cents", None, 0),
+            ("table", "orders", None, 0),
+            ("table", "users", None, 0),
+        ]
+
+        tables, columns, functions = executor.schema_metadata(columns=False)
+
+        assert (tables, columns, functions) == (["orders", "users"], [], ["to_cents"])
+        args, kwargs = cur.execute.call_args
+        assert "information_schema.columns" not in args[0]
+        assert args[1] == {"schema": "MySchema"}
+
+    @patch("databricks.sql.connect")
+    def test_schema_metadata_not_available(self, mock_connect):
+        executor = SQLExecute(
+            hostname=HOST_NAME,
+            http_path=HTTP_PATH,
+            access_token=ACCESS_TOKEN,
+            database="default",
+        )
+        cur = mock_connect.return_value.cursor.return_value.__enter__.return_value
+        cur.execute.side_effect = databricks.sql.ServerOperationError(
+            "[TABLE_OR_VIEW_NOT_FOUND] The table or view "
+            "`information_schema`.`columns` cannot be found."
+        )
+
+        assert executor.schema_metadata() is None
+        assert executor.schema_metadata() is None
+        assert cur.execute.call_count == 1
+
+    @patch("databricks.sql.connect")
+    def test_schema_metadata_errors_are_raised(self, mock_connect):
+        executor = SQLExecute(
+            hostname=HOST_NAME,
+            http_path=HTTP_PATH,
+            access_token=ACCESS_TOKEN,
+            database="default",
+        )
+        cur = mock_connect.return_value.cursor.return_value.__enter__.return_value
+        cur.execute.side_effect = databricks.sql.exc.RequestError("timed out")
+
+        with self.assertRaises(databricks.sql.exc.RequestError):
+            executor.schema_metadata()
+        assert executor.information_schema_available
+
+    @patch("databricks.sql.connect")
+    def test_borrowed_connections_are_reused(self, mock_connect):
+        mock_connect.side_effect = lambda **kwargs: MagicMock()
+        executor = SQLExecute(
+            hostname=HOST_NAME,
+            http_path=HTTP_PATH,
+            access_token=ACCESS_TOKEN,
+            database="default",
+        )
+
+        with executor.borrowed() as borrowed:
+            first = borrowed.conn
+            assert first is not executor.conn
+        with executor.borrowed() as borrowed:
+            assert borrowed.conn is first
+
+        # One login for the session, one for the background work.
+        assert mock_connect.call_count == 2
+
+
+class ResultStreamTests(unittest.TestCase):
+    def test_prefetch_does_not_consume_rows(self):
+        cursor = MagicMock()
+        cursor.fetchmany_arrow.side_effect = arrow_batches([1, 2], [3, 4], [5], [])
+        rows = ResultStream(cursor, fetch_size=2)
+
+        assert rows.prefetch(3) == 4
+        assert rows.rowcount == 4
+        assert list(rows) == [(1,), (2,), (3,), (4,), (5,)]
+        assert rows.rowcount == 5
+
+    def test_batches_are_arrow_tables(self):
+        cursor = MagicMock()
+        cursor.fetchmany_arrow.side_effect = arrow_batches([1, 2], [3], [])
+        rows = ResultStream(cursor, fetch_size=2)
+
+        rows.prefetch(1)
+        batches = list(rows.batches())
+
+        assert [b.num_rows for b in batches] == [2, 1]
+        assert batches[0].schema == ID_SCHEMA
+
+    def test_fetches_are_timed(self):
+        cursor = MagicMock()
+        cursor.fetchmany_arrow.side_effect = arrow_batches([1, 2], [3], [])
+        timing = StatementTiming("select id")
+        rows = ResultStream(cursor, fetch_size=2, timing=timing)
+
+        list(rows)
+
+        assert (timing.rows, timing.batches) == (3, 2)
+        assert timing.seconds["fetch"] > 0
+
+    def test_consumed_result_is_retained(self):
+        cursor = MagicMock()
+        cursor.fetchmany_arrow.side_effect = arrow_batches([1, 2], [3], [])
+        rows = ResultStream(cursor, fetch_size=2)
+
+        rows.prefetch(1)
+        rows.retain(1024)
+        assert rows.retained() is None
+        list(rows)
+
+        assert rows.retained().column("id").to_pylist() == [1, 2, 3]
+
+    def test_result_over_budget_is_not_retained(self):
+        cursor = MagicMock()
+        cursor.fetchmany_arrow.side_effect = arrow_batches([1, 2], [3], [])
+        rows = ResultStream(cursor, fetch_size=2)
+
+        rows.retain(16)
+        list(rows)
+
+        assert rows.retained() is None
+
+    def test_empty_result_is_falsy(self):
+        cursor = MagicMock()
+        cursor.fetchmany_arrow.return_value = arrow_batches([])[0]
+        rows = ResultStream(cursor)
+
+        assert not rows
+        assert list(rows) == []
+        assert rows.status() == "Query OK"
@@ -0,0 +1,51 @@
+from unittest.mock import patch
+
+import pyarrow
+
+from dbsqlcli.timing import StatementTiming
+
+
+class Clock(object):
+    """A perf_counter that advances by one second every time it is read."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        self.now += 1.0
+        return self.now
+
+
+@patch("dbsqlcli.timing.perf_counter", new_callable=Clock)
+def test_nested_phases_are_exclusive(clock):
+    timing = StatementTiming("select 1")
+
+    with timing.phase("render"):
+        with timing.phase("format"):
+            with timing.phase("fetch"):
+                pass
+
+    assert timing.seconds == {"execute": 0, "fetch": 1, "format": 2, "render": 2}
+    assert timing.total == 5
+
+
+@patch("dbsqlcli.timing.perf_counter", new_callable=Clock)
+def test_iterate_times_each_item(clock):
+    timing = StatementTiming("select 1")
+
+    assert list(timing.iterate(["a", "b"], "format")) == ["a", "b"]
+    # Two items and the end of the iteration.
+    assert timing.seconds["format"] == 3
+
+
+def test_batches_are_counted():
+    timing = StatementTiming("select 1")
+    batch = pyarrow.table({"id": [1, 2, 3]})
+
+    timing.add_batch(batch)
+    timing.add_batch(batch)
+    record = timing.as_record()
+
+    assert (record["rows"], record["batches"]) == (6, 2)
+    assert record["bytes"] == 2 * batch.nbytes
+    assert record["statement"] == "select 1"
@@ -0,0 +1,95 @@
+from unittest.mock import patch
+
+import pytest
+from cli_helpers.tabular_output import TabularOutputFormatter
+
+from dbsqlcli.packages.tabular_output.windowed import format_windows, iter_windows
+
+HEADERS = ["id", "name"]
+ROWS = [(str(i), "name %d" % i) for i in range(10, 17)]
+OUTPUT_KWARGS = {
+    "disable_numparse": True,
+    "preserve_whitespace": True,
+    "column_types": [str, str],
+}
+
+
+def format_all(formatter, format_name):
+    kwargs = dict(OUTPUT_KWARGS)
+    if format_name == "vertical":
+        # The formatter keeps keyword arguments between calls.
+        kwargs["sep_title"] = "{n}. row"
+    formatted = formatter.format_output(
+        ROWS, HEADERS, format_name=format_name, **kwargs
+    )
+    if isinstance(formatted, str):
+        return formatted.splitlines()
+    return "\n".join(formatted).splitlines()
+
+
+def format_windowed(formatter, format_name, size):
+    formatted = format_windows(
+        formatter, iter_windows(ROWS, size), HEADERS, format_name, **OUTPUT_KWARGS
+    )
+    return "\n".join(formatted).splitlines()
+
+
+def test_iter_windows():
+    assert list(iter_windows(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(iter_windows([], 2)) == []
+
+
+@pytest.mark.parametrize(
+    "format_name", ["ascii", "psql", "grid", "pipe", "csv", "tsv", "html", "vertical"]
+)
+@pytest.mark.parametrize("size", [1, 3, 100])
+def test_windowed_output_matches_single_pass(format_name, size):
+    formatter = TabularOutputFormatter()
+
+    assert format_windowed(formatter, format_name, size) == format_all(
+        formatter, format_name
+    )
+
+
+def test_windows_are_consumed_lazily():
+    formatter = TabularOutputFormatter()
+    windows = iter_windows(ROWS, 2)
+
+    formatted = format_windows(formatter, windows, HEADERS, "ascii", **OUTPUT_KWARGS)
+    next(formatted)
+
+    assert next(windows) == ROWS[2:4]
+
+
+@pytest.mark.parametrize("format_name", ["ascii", "psql", "grid", "rst"])
+def test_footer_matches_header_of_wider_windows(format_name):
+    formatter = TabularOutputFormatter()
+    rows = [(str(10**i), "name") for i in range(12)]
+
+    lines = list(format_windows(formatter, iter_windows(rows, 4), HEADERS, format_name))
+
+    assert len(lines[0]) == len(lines[-1])
+    assert len(lines[-1]) < max(len(line) for line in lines)
+
+
+@pytest.mark.parametrize("format_name", ["ascii", "psql", "grid", "simple", "rst"])
+def test_laid_out_rows_match_rendered_rows(format_name):
+    formatter = TabularOutputFormatter()
+    rows = [
+        (str(10**i), None if i % 3 == 0 else "name %d" % i, "ü" if i == 5 else "x")
+        for i in range(12)
+    ]
+    headers = ["id", "name", "value"]
+    kwargs = dict(OUTPUT_KWARGS, column_types=[str, str, str])
+
+    def format_windowed():
+        formatted = format_windows(
+            formatter, iter_windows(rows, 4), headers, format_name, **kwargs
+        )
+        return list(formatted)
+
+    laid_out = format_windowed()
+    with patch(
+        "dbsqlcli.packages.tabular_output.windowed._row_layout", return_value=None
+    ):
+        assert laid_out == format_windowed()